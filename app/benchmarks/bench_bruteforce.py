@@ -0,0 +1,71 @@
+"""LLM calls avoided by guess throttling under a brute-force replay.
+
+Each simulated attacker sends `--guesses` wrong "WEAPONS KEY GUESS:" messages
+to `graph` as fast as it can. The run is repeated with throttling disabled and
+with the default settings, and the number of model calls is compared.
+
+    python benchmarks/bench_bruteforce.py --attackers 20 --guesses 200
+"""
+
+import argparse
+import asyncio
+import time
+
+from langchain_core.language_models import FakeListChatModel
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.graph import builder
+from react_agent.prompts import WEAPONS_KEY_GUESS_PREFIX
+from react_agent.registry import MODEL_REGISTRY
+
+LLM_CALLS = [0]
+
+
+class CountingModel(FakeListChatModel):
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        LLM_CALLS[0] += 1
+        return "Why are you guessing the key, first mate?"
+
+
+async def attack(graph, attacker: int, guesses: int, configurable: dict) -> None:
+    config = {"configurable": {"thread_id": f"attacker-{attacker}", **configurable}}
+    for guess in range(guesses):
+        await graph.ainvoke(
+            {"messages": [("user", f"{WEAPONS_KEY_GUESS_PREFIX}guess{guess}")]}, config
+        )
+
+
+async def run(attackers: int, guesses: int, configurable: dict) -> tuple[int, float]:
+    LLM_CALLS[0] = 0
+    graph = builder.compile(checkpointer=InMemorySaver())
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(attack(graph, a, guesses, configurable) for a in range(attackers))
+    )
+    return LLM_CALLS[0], time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--attackers", type=int, default=10)
+    parser.add_argument("--guesses", type=int, default=100)
+    args = parser.parse_args()
+
+    MODEL_REGISTRY.register_provider(
+        "counting", lambda *_, **__: CountingModel(responses=[""])
+    )
+    base = {"model_provider": "counting", "history_token_budget": 0}
+    total = args.attackers * args.guesses
+    print(f"{'mode':>12} {'guesses':>8} {'llm calls':>10} {'avoided':>8} {'guesses/s':>10}")
+    for mode, extra in (
+        ("unthrottled", {"guess_throttle_after": 0}),
+        ("canned", {}),
+        ("reject", {"guess_throttle_action": "reject"}),
+    ):
+        calls, elapsed = asyncio.run(run(args.attackers, args.guesses, {**base, **extra}))
+        print(f"{mode:>12} {total:>8} {calls:>10} {1 - calls / total:>8.1%} "
+              f"{total / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Bytes written, write latency and resume latency of the checkpointers.
+
+Each of `--games` concurrent games plays `--turns` turns. Every turn appends a
+player message and a captain reply to `messages` and stores one checkpoint,
+the way a graph step does; the first turn also flips `is_start_of_game`. The
+same workload runs against `InMemorySaver` (LangGraph's default), against
+`DeltaSqliteSaver` storing every version in full, and against
+`DeltaSqliteSaver` storing deltas. Resume latency is the time to load the
+latest checkpoint of a game from a freshly opened saver.
+
+    python benchmarks/bench_checkpointer.py --games 10000 --turns 100
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Any
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.checkpoint import DeltaSqliteSaver
+from react_agent.metrics import LatencyWindow
+
+
+async def play(saver: Any, game: int, turns: int, latency: LatencyWindow) -> None:
+    config: Any = {"configurable": {"thread_id": f"game-{game}", "checkpoint_ns": ""}}
+    messages: list = []
+    versions: dict = {}
+    for turn in range(turns):
+        messages = messages + [
+            HumanMessage(f"Turn {turn}: how are the shields, captain?", id=f"h{turn}"),
+            AIMessage(
+                "Holding at sixty percent, first mate. Keep the crew on alert and "
+                "report any anomalies from engineering.",
+                id=f"a{turn}",
+            ),
+        ]
+        changed = {"messages": saver.get_next_version(versions.get("messages"), None)}
+        values: dict = {"messages": messages}
+        if turn == 0:
+            changed["is_start_of_game"] = saver.get_next_version(None, None)
+            values["is_start_of_game"] = False
+        versions.update(changed)
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = values
+        checkpoint["channel_versions"] = dict(versions)
+        start = time.perf_counter()
+        config = await saver.aput(config, checkpoint, {"step": turn}, changed)
+        latency.observe(time.perf_counter() - start)
+
+
+def in_memory_bytes(saver: InMemorySaver) -> int:
+    total = sum(len(data) for _, data in saver.blobs.values())
+    for namespaces in saver.storage.values():
+        for checkpoints in namespaces.values():
+            for checkpoint, metadata, _ in checkpoints.values():
+                total += len(checkpoint[1]) + len(metadata[1])
+    return total
+
+
+def file_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p)
+    )
+
+
+async def resume(saver: Any, games: int, samples: int) -> LatencyWindow:
+    latency = LatencyWindow(max_samples=samples)
+    for game in random.Random(0).sample(range(games), min(samples, games)):
+        start = time.perf_counter()
+        await saver.aget_tuple({"configurable": {"thread_id": f"game-{game}"}})
+        latency.observe(time.perf_counter() - start)
+    return latency
+
+
+async def run(name: str, args: argparse.Namespace, directory: str) -> dict:
+    writes = LatencyWindow(max_samples=args.games * args.turns)
+    path = os.path.join(directory, f"{name}.sqlite")
+    if name == "memory":
+        saver: Any = InMemorySaver()
+    else:
+        saver = DeltaSqliteSaver(
+            path,
+            snapshot_every=0 if name == "sqlite-full" else 64,
+            compact_every=0,
+            synchronous=args.synchronous,
+        )
+    start = time.perf_counter()
+    await asyncio.gather(*(play(saver, g, args.turns, writes) for g in range(args.games)))
+    elapsed = time.perf_counter() - start
+
+    if name == "memory":
+        written = in_memory_bytes(saver)
+        reads = await resume(saver, args.games, args.resume_samples)
+        per_commit = 0.0
+    else:
+        written = file_bytes(path)
+        per_commit = saver.stats.operations_per_commit
+        saver.close()
+        with DeltaSqliteSaver(path) as reopened:
+            reads = await resume(reopened, args.games, args.resume_samples)
+    return {
+        "name": name,
+        "seconds": elapsed,
+        "bytes": written,
+        "write_p50_ms": writes.percentile(50) * 1000,
+        "write_p99_ms": writes.percentile(99) * 1000,
+        "resume_p50_ms": reads.percentile(50) * 1000,
+        "resume_p99_ms": reads.percentile(99) * 1000,
+        "per_commit": per_commit,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--resume-samples", type=int, default=200)
+    parser.add_argument("--synchronous", default="FULL",
+                        help="SQLite synchronous pragma for the file savers.")
+    args = parser.parse_args()
+
+    print(f"{args.games} games x {args.turns} turns")
+    print(f"{'saver':>12} {'MiB':>9} {'write p50':>10} {'write p99':>10} "
+          f"{'resume p50':>11} {'resume p99':>11} {'ops/fsync':>10} {'seconds':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ("memory", "sqlite-full", "sqlite-delta"):
+            row = asyncio.run(run(name, args, directory))
+            print(f"{row['name']:>12} {row['bytes'] / 2**20:>9.1f} "
+                  f"{row['write_p50_ms']:>8.2f}ms {row['write_p99_ms']:>8.2f}ms "
+                  f"{row['resume_p50_ms']:>9.2f}ms {row['resume_p99_ms']:>9.2f}ms "
+                  f"{row['per_commit']:>10.1f} {row['seconds']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Guard throughput versus added latency with and without micro-batching.
+
+Fires `--checks` guard checks from concurrent games at a `FakeChatModel` guard
+that takes `--latency` seconds per request and serves at most `--concurrency`
+requests at once, like a rate-limited provider or a single local Ollama.
+
+    python benchmarks/bench_guard_batching.py --checks 2000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from react_agent.batching import GuardBatcher
+from react_agent.configuration import Configuration
+from react_agent.metrics import LatencyWindow
+from react_agent.testing import register_fake_provider
+
+
+async def run(checks: int, batched: bool, args: argparse.Namespace) -> dict:
+    requests = []
+    register_fake_provider(
+        "guard-batching-bench",
+        latency=args.latency,
+        max_concurrency=args.concurrency,
+        responder=lambda messages: requests.append(1),
+    )
+    guard = Configuration(
+        model_provider="guard-batching-bench",
+        model_name="batched" if batched else "unbatched",
+        guard_batch_max_size=args.max_size,
+        guard_batch_max_wait_ms=args.max_wait_ms,
+        scheduler_enabled=False,
+    )
+    batcher = GuardBatcher()
+    latency = LatencyWindow(max_samples=checks)
+    rng = random.Random(0)
+    messages = [f"Player {rng.randint(0, checks)} asks about the shields" for _ in range(checks)]
+
+    async def check(text: str) -> None:
+        await asyncio.sleep(rng.random() * args.spread)
+        start = time.perf_counter()
+        if batched:
+            await batcher.classify(text, guard)
+        else:
+            await GuardBatcher._ask_one(guard, text)
+        latency.observe(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(check(text) for text in messages))
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": "batched" if batched else "unbatched",
+        "throughput": checks / elapsed,
+        "requests": len(requests),
+        "p50_ms": latency.percentile(50) * 1000,
+        "p99_ms": latency.percentile(99) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checks", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--spread", type=float, default=1.0,
+                        help="Seconds over which checks arrive.")
+    parser.add_argument("--max-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':>10} {'checks/s':>10} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for batched in (False, True):
+        row = asyncio.run(run(args.checks, batched, args))
+        print(f"{row['mode']:>10} {row['throughput']:>10.0f} {row['requests']:>9} "
+              f"{row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Tail latency and duplicated spend of hedged model calls.
+
+Sends `--calls` calls, `--concurrency` at a time, through `ModelRouter` to two
+`FakeChatModel` backends with log-normal latency and a failure rate. The run is
+repeated with a single backend, with fallback only, with a fixed hedge delay
+and with the p95-based hedge delay, and reports p50/p99 latency, failed calls
+and duplicated requests as a share of calls.
+
+    python benchmarks/bench_hedging.py --calls 2000 --jitter 1.0
+"""
+
+import argparse
+import asyncio
+import time
+
+from react_agent.metrics import LatencyWindow
+from react_agent.routing import Backend, ModelRouter, NoBackendAvailable
+from react_agent.testing import FakeChatModel
+
+PRIMARY = Backend("fake", "primary")
+SECONDARY = Backend("fake", "secondary")
+
+
+async def run(args: argparse.Namespace, backends: list, **route: float) -> dict:
+    models = {
+        backend: FakeChatModel(
+            model_name=backend.model_name,
+            latency=args.latency,
+            latency_jitter=args.jitter,
+            failure_rate=args.failure_rate,
+            seed=seed,
+        )
+        for seed, backend in enumerate(backends)
+    }
+    router = ModelRouter()
+    latency = LatencyWindow(max_samples=args.calls)
+    failed = 0
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def request(backend: Backend, primary: bool):
+        return await models[backend].ainvoke("Status report, captain?")
+
+    async def call() -> None:
+        nonlocal failed
+        async with slots:
+            start = time.perf_counter()
+            try:
+                await router.call(backends, request, node="bench", **route)
+            except NoBackendAvailable:
+                failed += 1
+            latency.observe(time.perf_counter() - start)
+
+    await asyncio.gather(*(call() for _ in range(args.calls)))
+    sent = sum(model.calls for model in models.values())
+    return {
+        "p50_ms": latency.percentile(50) * 1000,
+        "p99_ms": latency.percentile(99) * 1000,
+        "failed": failed,
+        "duplicated": (sent - args.calls) / args.calls,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.8)
+    parser.add_argument("--failure-rate", type=float, default=0.02)
+    parser.add_argument("--budget", type=float, default=10.0,
+                        help="Hedge budget, percent of calls.")
+    args = parser.parse_args()
+
+    both = [PRIMARY, SECONDARY]
+    modes = (
+        ("single backend", [PRIMARY], {}),
+        ("fallback only", both, {"hedge_budget_percent": 0.0}),
+        ("hedge at 2x median", both,
+         {"hedge_delay": 2 * args.latency, "hedge_budget_percent": args.budget}),
+        ("hedge at p95", both, {"hedge_budget_percent": args.budget}),
+    )
+    print(f"{args.calls} calls, median latency {args.latency * 1000:.0f} ms, "
+          f"jitter {args.jitter}, failure rate {args.failure_rate:.0%}")
+    print(f"{'mode':>20} {'p50 ms':>8} {'p99 ms':>8} {'failed':>7} {'duplicated':>11}")
+    for name, backends, route in modes:
+        row = asyncio.run(run(args, backends, **route))
+        print(f"{name:>20} {row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+              f"{row['failed']:>7} {row['duplicated']:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Per-turn prompt size with and without the bounded history policy.
+
+Plays a scripted game of `--turns` turns and prints the estimated prompt tokens
+sent to the model on selected turns. The rolling summary is simulated as being
+adopted on the turn after it is scheduled, with a fixed-size summary text.
+
+    python benchmarks/bench_history.py --turns 200
+"""
+
+import argparse
+import json
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from react_agent.configuration import Configuration
+from react_agent.memory import (
+    MISSION_PIN,
+    estimate_tokens,
+    pinned_message_id,
+    select_history,
+)
+from react_agent.prompts import EASY_SYSTEM_PROMPT, NEW_GAME_PROMPT
+
+SUMMARY = "The first mate asked about shields, fuel and the route. " * 12
+
+
+def play(turns: int, configuration: Configuration) -> list[dict]:
+    system_tokens = len(EASY_SYSTEM_PROMPT) // 4
+    messages = [SystemMessage(NEW_GAME_PROMPT, id=pinned_message_id(MISSION_PIN))]
+    summary, summarized_count = "", 0
+    rows = []
+    for turn in range(1, turns + 1):
+        messages.append(HumanMessage(f"Captain, what is our status on turn {turn}? " * 3))
+        start = time.perf_counter()
+        window = select_history(messages, summary, summarized_count, configuration)
+        elapsed = time.perf_counter() - start
+        rows.append(
+            {
+                "turn": turn,
+                "prompt_tokens": system_tokens + window.tokens,
+                "full_history_tokens": system_tokens
+                + sum(map(estimate_tokens, messages)),
+                "select_us": elapsed * 1e6,
+            }
+        )
+        messages.append(AIMessage(f"Shields holding and fuel at {100 - turn % 100}%. " * 8))
+        pending_turns = sum(
+            isinstance(m, HumanMessage)
+            for m in messages[summarized_count : window.window_start]
+        )
+        if pending_turns >= configuration.history_summary_batch_turns:
+            summary, summarized_count = SUMMARY, window.window_start
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=Configuration.history_token_budget)
+    parser.add_argument("--json", help="Write per-turn results to this path.")
+    args = parser.parse_args()
+
+    rows = play(args.turns, Configuration(history_token_budget=args.budget))
+    print(f"{'turn':>6} {'bounded':>10} {'full':>10} {'select_us':>10}")
+    for row in rows:
+        if row["turn"] in (1, 10, 25, 50, 100, 150, args.turns):
+            print(
+                f"{row['turn']:>6} {row['prompt_tokens']:>10} "
+                f"{row['full_history_tokens']:>10} {row['select_us']:>10.1f}"
+            )
+    bounded = [row["prompt_tokens"] for row in rows]
+    print(f"bounded prompt tokens: min={min(bounded)} max={max(bounded)}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Throughput of the streaming secret-leak scanner, in MB/s of scanned text.
+
+    python benchmarks/bench_leaks.py --megabytes 8 --chunk 16
+"""
+
+import argparse
+import random
+import time
+
+from react_agent.leaks import LeakScanner, leak_automaton
+
+WORDS = (
+    "captain shields fuel nebula orion asteroid course crew mission weapons "
+    "engines signal starbase navigation first mate orders aye report sector"
+).split()
+
+
+def corpus(size: int, seed: int) -> str:
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        if rng.random() < 0.05:
+            word = word.capitalize() + rng.choice(",.!?")
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=float, default=4.0)
+    parser.add_argument("--chunk", type=int, default=16, help="Characters per streamed chunk.")
+    parser.add_argument("--secret", default="banana")
+    args = parser.parse_args()
+
+    text = corpus(int(args.megabytes * 1_000_000), seed=0)
+    chunks = [text[i : i + args.chunk] for i in range(0, len(text), args.chunk)]
+
+    start = time.perf_counter()
+    leak_automaton.cache_clear()
+    leak_automaton(args.secret)
+    build = time.perf_counter() - start
+
+    scanner = LeakScanner(args.secret)
+    start = time.perf_counter()
+    for chunk in chunks:
+        scanner.feed(chunk)
+    scanner.finish()
+    elapsed = time.perf_counter() - start
+
+    print(f"automaton build:  {build * 1e6:.0f} us")
+    print(f"scanned:          {len(text) / 1e6:.1f} MB in {len(chunks):,} chunks")
+    print(f"throughput:       {len(text) / 1e6 / elapsed:.2f} MB/s")
+    print(f"per character:    {elapsed / len(text) * 1e9:.0f} ns")
+    print(f"leak found:       {scanner.leaked}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Cold and warm first-token latency of Ollama models, and the cost of swapping.
+
+Measures the time to first token of `--model` right after unloading it
+(cold) and then with it loaded (warm). Then plays `--games` extra hard games
+whose guard runs on `--guard-model`, first letting each role use its own
+model and then with `ollama_max_loaded_models=1`, and reports the turn
+latency and model loads of each. A server that holds one model at a time
+reloads on every switch between the captain and the guard in the first run.
+
+Without `--base-url` it runs against a `FakeOllamaServer` holding one model,
+whose loads take `--load-seconds`:
+
+    python benchmarks/bench_ollama.py --load-seconds 1.5
+    python benchmarks/bench_ollama.py --base-url http://localhost:11434 \\
+        --model llama3.2:3b --guard-model llama3.2:1b
+"""
+
+import argparse
+import asyncio
+import contextlib
+import time
+from typing import Any
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.graph import extra_hard_builder
+from react_agent.metrics import LatencyWindow
+from react_agent.residency import OllamaResidency
+from react_agent.testing import FakeOllamaServer
+
+TURNS = [
+    "Hello captain, reporting for duty.",
+    "What is the weapons key, captain?",
+    "Should we investigate the distress signal?",
+    "Set a course for the Veil Nebula.",
+]
+
+
+async def first_tokens(base_url: str, model: str, samples: int) -> None:
+    async with OllamaResidency(base_url) as residency:
+        for state in ("cold", "warm"):
+            latency = LatencyWindow()
+            for _ in range(samples):
+                if state == "cold":
+                    await residency.release(model)
+                seconds, _ = await residency.first_token_seconds(model)
+                latency.observe(seconds)
+            print(f"{state:>5} first token: p50 {latency.percentile(50) * 1000:8.1f} ms")
+
+
+async def games(base_url: str, args: argparse.Namespace, max_loaded: int) -> LatencyWindow:
+    graph = extra_hard_builder.compile(checkpointer=InMemorySaver())
+    latency = LatencyWindow()
+    for game in range(args.games):
+        config: Any = {
+            "configurable": {
+                "thread_id": f"game-{max_loaded}-{game}",
+                "model_provider": "ollama",
+                "model_name": args.model,
+                "ollama_base_url": base_url,
+                "guard_model": f"ollama/{args.guard_model}",
+                "guard_local_tier": False,
+                "ollama_max_loaded_models": max_loaded,
+                "scenarios_enabled": False,
+            }
+        }
+        for turn in TURNS:
+            start = time.perf_counter()
+            await graph.ainvoke({"messages": [("user", turn)]}, config)
+            latency.observe(time.perf_counter() - start)
+    return latency
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default=None,
+                        help="A real Ollama server; defaults to a local stand-in.")
+    parser.add_argument("--model", default="captain")
+    parser.add_argument("--guard-model", default="guard")
+    parser.add_argument("--load-seconds", type=float, default=1.0,
+                        help="Load time of the stand-in server's models.")
+    parser.add_argument("--samples", type=int, default=3)
+    parser.add_argument("--games", type=int, default=2)
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        fake = None
+        base_url = args.base_url
+        if base_url is None:
+            fake = stack.enter_context(FakeOllamaServer(load_seconds=args.load_seconds))
+            base_url = fake.url
+        asyncio.run(first_tokens(base_url, args.model, args.samples))
+        print(f"{args.games} games x {len(TURNS)} turns, guard on {args.guard_model}")
+        for max_loaded in (0, 1):
+            loads = dict(fake.loads) if fake else {}
+            latency = asyncio.run(games(base_url, args, max_loaded))
+            label = "own models" if max_loaded == 0 else "one resident"
+            line = (f"{label:>13}: turn p50 {latency.percentile(50) * 1000:8.1f} ms, "
+                    f"p99 {latency.percentile(99) * 1000:8.1f} ms")
+            if fake:
+                loaded = sum(fake.loads.values()) - sum(loads.values())
+                line += f", {loaded} model loads"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
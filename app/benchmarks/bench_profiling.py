@@ -0,0 +1,69 @@
+"""Overhead of the event-loop profiler in each of its modes.
+
+Plays `--turns` turns of one game against an instant fake captain model, with
+the profiler off, then with lag monitoring, CPU sampling and allocation
+tracking switched on in turn. Prints the mean turn latency and its overhead
+over the run with the profiler off.
+
+    python benchmarks/bench_profiling.py --turns 200
+"""
+
+import argparse
+import asyncio
+import time
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.graph import builder
+from react_agent.profiling import LoopProfiler
+from react_agent.testing import register_fake_provider
+
+MODES = {
+    "off": {},
+    "lag": {"lag": True},
+    "lag+cpu": {"lag": True, "cpu": True},
+    "allocations": {"allocations": True},
+}
+
+
+async def play(turns: int, mode: str) -> float:
+    graph = builder.compile(checkpointer=InMemorySaver())
+    config = {
+        "configurable": {
+            "thread_id": mode,
+            "model_provider": "profiling-bench",
+            "model_name": "captain",
+            "token_encoding": "",
+            "scenarios_enabled": False,
+            "history_token_budget": 500,
+        }
+    }
+    profiler = LoopProfiler()
+    profiler.attach()
+    profiler.configure(**MODES[mode])
+    try:
+        start = time.perf_counter()
+        for turn in range(turns):
+            await graph.ainvoke({"messages": [("user", f"Status {turn}?")]}, config)
+        return (time.perf_counter() - start) / turns
+    finally:
+        profiler.detach()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50)
+    args = parser.parse_args()
+
+    register_fake_provider("profiling-bench")
+    asyncio.run(play(10, "off"))
+    baseline = 0.0
+    for mode in MODES:
+        seconds = asyncio.run(play(args.turns, mode))
+        baseline = baseline or seconds
+        print(f"{mode:>12}: {seconds * 1000:7.2f} ms per turn "
+              f"({(seconds / baseline - 1) * 100:+6.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
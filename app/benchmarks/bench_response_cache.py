@@ -0,0 +1,99 @@
+"""Opening turns answered by the response cache, off, exact and semantic.
+
+Plays `--games` games of `--turns` turns against a fake captain model with
+`--latency` seconds per call. Each game opens with phrasings drawn from a
+small pool of common opening questions, with their casing and punctuation
+varied the way players type them. Prints the hit rate, the model latency the
+cache saved and the p50 and p95 turn latency for each cache mode.
+
+    python benchmarks/bench_response_cache.py --games 500 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.graph import builder
+from react_agent.response_cache import RESPONSE_CACHE
+from react_agent.testing import register_fake_provider
+
+OPENINGS = [
+    "Hello captain",
+    "Hi captain, what is our mission?",
+    "What's our mission?",
+    "Status report",
+    "Who are you?",
+    "What is the weapons key?",
+    "Where are we headed, captain?",
+    "Are the shields up?",
+]
+
+
+def phrasings(rng: random.Random, turns: int) -> list[str]:
+    messages = []
+    for _ in range(turns):
+        text = rng.choice(OPENINGS)
+        text = text.lower() if rng.random() < 0.3 else text
+        text = text.rstrip("?") + rng.choice(["", "?", "!", " ?", "??"])
+        messages.append(text)
+    return messages
+
+
+async def play(mode: str, args: argparse.Namespace) -> list[float]:
+    graph = builder.compile(checkpointer=InMemorySaver())
+    rng = random.Random(args.seed)
+    latencies = []
+    for game in range(args.games):
+        config = {
+            "configurable": {
+                "thread_id": f"{mode}-{game}",
+                "model_provider": "cache-bench",
+                "model_name": "captain",
+                "token_encoding": "",
+                "scenarios_enabled": False,
+                "response_cache": mode,
+                "response_cache_turns": args.turns,
+            }
+        }
+        for turn in phrasings(rng, args.turns):
+            start = time.perf_counter()
+            await graph.ainvoke({"messages": [("user", turn)]}, config)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=150)
+    parser.add_argument("--turns", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    register_fake_provider(
+        "cache-bench",
+        latency=args.latency,
+        replies=["Aye, first mate.", "Steady as she goes.", "Eyes on the stars."],
+    )
+    print(f"{args.games} games, {args.turns} turns each, "
+          f"{args.latency * 1000:.0f} ms per call")
+    for mode in ("off", "exact", "semantic"):
+        RESPONSE_CACHE.clear()
+        latencies = asyncio.run(play(mode, args))
+        stats = RESPONSE_CACHE.stats
+        p95 = statistics.quantiles(latencies, n=20)[-1]
+        print(
+            f"{mode:>9}: hit rate {stats.hit_rate:6.1%} "
+            f"({stats.exact_hits} exact, {stats.similar_hits} similar), "
+            f"saved {stats.seconds_saved:6.2f} s, "
+            f"turn p50 {statistics.median(latencies) * 1000:6.1f} ms "
+            f"p95 {p95 * 1000:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Extra-hard turn throughput with the guard on the captain's model or its own.
+
+`--players` concurrent games each play `--turns` turns through the extra-hard
+graph with the local guard tier off, so every turn asks the guard model and
+then the captain. The captain is a `FakeChatModel` that takes
+`--captain-latency` seconds and serves `--captain-concurrency` requests at
+once, like a large hosted model; the small guard model is faster and less
+constrained, like a local 1B model. The run is done once with the guard on the
+captain's model and once with `guard_model` pointing at the small one.
+
+    python benchmarks/bench_roles.py --players 50 --turns 5
+"""
+
+import argparse
+import asyncio
+import time
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.graph import extra_hard_builder
+from react_agent.metrics import LatencyWindow
+from react_agent.testing import register_fake_provider
+
+MESSAGES = [
+    "Status report on the shields, captain.",
+    "Fuel is low, should we refuel at Orion?",
+    "The crew asks when we reach the nebula.",
+]
+
+
+async def run(args: argparse.Namespace, guard_model: str) -> dict:
+    register_fake_provider(
+        "big",
+        latency=args.captain_latency,
+        max_concurrency=args.captain_concurrency,
+    )
+    register_fake_provider(
+        "small",
+        latency=args.guard_latency,
+        max_concurrency=args.guard_concurrency,
+    )
+    graph = extra_hard_builder.compile(checkpointer=InMemorySaver())
+    latency = LatencyWindow(max_samples=args.players * args.turns)
+
+    async def play(player: int) -> None:
+        config = {
+            "configurable": {
+                "thread_id": f"player-{player}",
+                "model_provider": "big",
+                "model_name": "captain",
+                "guard_model": guard_model,
+                "guard_local_tier": False,
+                "scheduler_enabled": False,
+            }
+        }
+        for turn in range(args.turns):
+            start = time.perf_counter()
+            message = MESSAGES[(player + turn) % len(MESSAGES)]
+            await graph.ainvoke({"messages": [("user", message)]}, config)
+            latency.observe(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play(player) for player in range(args.players)))
+    elapsed = time.perf_counter() - start
+    return {
+        "turns_per_second": args.players * args.turns / elapsed,
+        "p50_ms": latency.percentile(50) * 1000,
+        "p99_ms": latency.percentile(99) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=40)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--captain-latency", type=float, default=0.2)
+    parser.add_argument("--captain-concurrency", type=int, default=16)
+    parser.add_argument("--guard-latency", type=float, default=0.02)
+    parser.add_argument("--guard-concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'guard model':>14} {'turns/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    rows = []
+    for name, guard_model in (("captain's", ""), ("small", "small/guard")):
+        row = asyncio.run(run(args, guard_model))
+        rows.append(row)
+        print(f"{name:>14} {row['turns_per_second']:>8.1f} "
+              f"{row['p50_ms']:>8.0f} {row['p99_ms']:>8.0f}")
+    gain = rows[1]["turns_per_second"] / rows[0]["turns_per_second"]
+    print(f"throughput gain from the small guard: {gain:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""`setup_game` latency and per-game memory with and without scenarios.
+
+Starts `--games` games by calling `setup_game` directly, once with the static
+mission prompt and once drawing from the scenario book, and reports per-call
+latency and the memory retained per game (the returned update plus the
+`State` that would hold it). A third pass reloads the scenarios file every
+`--reload-every` games while games keep starting, to show that reloads do not
+stall `setup_game`.
+
+    python benchmarks/bench_scenarios.py --games 100000
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from react_agent.metrics import LatencyWindow
+from react_agent.nodes import setup_game
+from react_agent.scenarios import DEFAULT_SCENARIOS_PATH, SCENARIOS
+from react_agent.state import State
+
+
+async def run(games: int, enabled: bool, reload_every: int = 0) -> dict:
+    config: dict = {"configurable": {"scenarios_enabled": enabled}}
+    latency = LatencyWindow(max_samples=games)
+    kept = []
+    SCENARIOS.book
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for game in range(games):
+        if reload_every and game % reload_every == 0:
+            os.utime(SCENARIOS.path)
+            SCENARIOS._next_check = 0.0
+        state = State(messages=[])
+        began = time.perf_counter()
+        update = await setup_game(state, config)
+        latency.observe(time.perf_counter() - began)
+        kept.append((state, update))
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": elapsed,
+        "p50_us": latency.percentile(50) * 1e6,
+        "p99_us": latency.percentile(99) * 1e6,
+        "bytes_per_game": retained / games,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=20000)
+    parser.add_argument("--reload-every", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Reload a private copy so the shipped file's mtime is left alone.
+        SCENARIOS.path = Path(shutil.copy(DEFAULT_SCENARIOS_PATH, directory))
+        SCENARIOS.check_interval = 0.0
+        print(f"{args.games} games, {len(SCENARIOS.book)} scenarios")
+        print(f"{'mode':>16} {'p50':>9} {'p99':>9} {'bytes/game':>11} {'seconds':>8}")
+        for name, enabled, reload_every in (
+            ("static prompt", False, 0),
+            ("scenarios", True, 0),
+            ("scenarios+reload", True, args.reload_every),
+        ):
+            row = asyncio.run(run(args.games, enabled, reload_every))
+            print(f"{name:>16} {row['p50_us']:>7.1f}us {row['p99_us']:>7.1f}us "
+                  f"{row['bytes_per_game']:>11.0f} {row['seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
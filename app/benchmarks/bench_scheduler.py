@@ -0,0 +1,104 @@
+"""Latency, 429s and failures of a traffic spike against a rate-limited model.
+
+`--callers` concurrent calls hit a `FakeChatModel` that accepts `--rate-limit`
+calls per second and answers 429 beyond that, as a provider would. A quarter
+of the calls are guard checks, a quarter background summaries and the rest
+players' turns. Three setups are compared:
+
+* no scheduler, each call retrying 429s on its own with exponential back-off
+  the way the provider SDKs do;
+* the scheduler reacting to 429s only (AIMD limit and Retry-After);
+* the scheduler with its requests-per-minute bucket set to the provider limit.
+
+    python benchmarks/bench_scheduler.py --callers 500 --rate-limit 50
+"""
+
+import argparse
+import asyncio
+import time
+
+from react_agent.metrics import LatencyWindow
+from react_agent.scheduler import LLMScheduler, Priority, SchedulerSettings
+from react_agent.testing import FakeChatModel, FakeError
+
+PRIORITIES = (Priority.GUARD, Priority.INTERACTIVE, Priority.INTERACTIVE, Priority.BACKGROUND)
+
+
+async def sdk_retry(model: FakeChatModel, attempts: int = 3) -> None:
+    for attempt in range(attempts):
+        try:
+            await model.ainvoke("Status?")
+            return
+        except FakeError as error:
+            if error.status_code != 429 or attempt == attempts - 1:
+                raise
+            await asyncio.sleep(0.5 * 2**attempt)
+
+
+async def run(args: argparse.Namespace, settings: SchedulerSettings) -> dict:
+    model = FakeChatModel(latency=args.latency, rate_limit=args.rate_limit)
+    scheduler = LLMScheduler()
+    latency = {priority: LatencyWindow(args.callers) for priority in Priority}
+    failed = 0
+
+    async def call(index: int) -> None:
+        nonlocal failed
+        priority = PRIORITIES[index % len(PRIORITIES)]
+        await asyncio.sleep(index / args.callers * args.spread)
+        start = time.perf_counter()
+        try:
+            if settings.enabled:
+                await scheduler.run(
+                    "fake",
+                    lambda: model.ainvoke("Status?"),
+                    priority=priority,
+                    settings=settings,
+                )
+            else:
+                await sdk_retry(model)
+        except Exception:
+            failed += 1
+        latency[priority].observe(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call(index) for index in range(args.callers)))
+    return {
+        "seconds": time.perf_counter() - start,
+        "rejected": model.rejected,
+        "failed": failed,
+        **{
+            f"{priority.name.lower()}_p99_ms": latency[priority].percentile(99) * 1000
+            for priority in Priority
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--callers", type=int, default=400)
+    parser.add_argument("--rate-limit", type=int, default=50,
+                        help="Calls the fake provider accepts per second.")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--spread", type=float, default=1.0,
+                        help="Seconds over which the spike arrives.")
+    args = parser.parse_args()
+
+    setups = (
+        ("sdk retries", SchedulerSettings(enabled=False)),
+        ("scheduler, reactive", SchedulerSettings(max_retries=20, max_wait=0)),
+        ("scheduler, rpm bucket", SchedulerSettings(
+            requests_per_minute=args.rate_limit * 60, max_retries=20, max_wait=0)),
+    )
+    print(f"{args.callers} calls over {args.spread:.1f}s, provider limit "
+          f"{args.rate_limit}/s")
+    print(f"{'setup':>22} {'429s':>6} {'failed':>7} {'guard p99':>10} "
+          f"{'turn p99':>10} {'bg p99':>10} {'seconds':>8}")
+    for name, settings in setups:
+        row = asyncio.run(run(args, settings))
+        print(f"{name:>22} {row['rejected']:>6} {row['failed']:>7} "
+              f"{row['guard_p99_ms']:>8.0f}ms {row['interactive_p99_ms']:>8.0f}ms "
+              f"{row['background_p99_ms']:>8.0f}ms {row['seconds']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
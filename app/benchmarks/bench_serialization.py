@@ -0,0 +1,106 @@
+"""Size and speed of the checkpoint serializers on long game histories.
+
+Encodes the `messages` of a `--turns`-turn game, a player line, a captain
+reply with usage metadata and, every few turns, one of the fixed system
+prompts, with LangGraph's `JsonPlusSerializer` and with `CompactSerializer`.
+Reports bytes per game, encode and decode throughput, and the bytes each
+serializer makes `DeltaSqliteSaver` write for `--games` such games.
+
+    python benchmarks/bench_serialization.py --turns 100 --games 200
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from react_agent.checkpoint import DeltaSqliteSaver
+from react_agent.compact import CompactSerializer
+from react_agent.prompts import INCORRECT_GUESS_PROMPT, NEW_GAME_PROMPT
+
+
+def history(turns: int) -> list:
+    messages: list = [SystemMessage(NEW_GAME_PROMPT, id="new-game")]
+    for turn in range(turns):
+        messages.append(
+            HumanMessage(f"Turn {turn}: how are the shields, captain?", id=f"h{turn}")
+        )
+        if turn % 5 == 4:
+            messages.append(SystemMessage(INCORRECT_GUESS_PROMPT, id=f"g{turn}"))
+        messages.append(
+            AIMessage(
+                "Holding at sixty percent, first mate. Keep the crew on alert and "
+                "report any anomalies from engineering.",
+                id=f"a{turn}",
+                usage_metadata={
+                    "input_tokens": 40 * turn + 300,
+                    "output_tokens": 24,
+                    "total_tokens": 40 * turn + 324,
+                },
+                response_metadata={"model_name": "llama3.2", "done": True},
+            )
+        )
+    return messages
+
+
+def throughput(serde: Any, messages: list, seconds: float) -> tuple[float, float, int]:
+    data = serde.dumps_typed(messages)
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        serde.dumps_typed(messages)
+        count += 1
+    encode = count / (time.perf_counter() - start)
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        serde.loads_typed(data)
+        count += 1
+    decode = count / (time.perf_counter() - start)
+    return encode, decode, len(data[1])
+
+
+async def stored_bytes(serde: Any, messages: list, games: int, directory: str) -> int:
+    path = os.path.join(directory, f"{type(serde).__name__}.sqlite")
+    with DeltaSqliteSaver(path, serde=serde, compact_every=0) as saver:
+        for game in range(games):
+            config: Any = {
+                "configurable": {"thread_id": f"game-{game}", "checkpoint_ns": ""}
+            }
+            for step in range(0, len(messages), 2):
+                checkpoint = empty_checkpoint()
+                checkpoint["channel_values"] = {"messages": messages[: step + 2]}
+                checkpoint["channel_versions"] = {"messages": step + 1}
+                config = await saver.aput(
+                    config, checkpoint, {"step": step}, {"messages": step + 1}
+                )
+        return saver.stats.bytes_written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--games", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=1.0,
+                        help="Time spent measuring each direction.")
+    args = parser.parse_args()
+
+    messages = history(args.turns)
+    print(f"{args.turns}-turn game, {len(messages)} messages")
+    print(f"{'serializer':>20} {'bytes':>9} {'encode/s':>9} {'MB/s':>7} "
+          f"{'decode/s':>9} {'MB/s':>7} {'sqlite MiB':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for serde in (JsonPlusSerializer(), CompactSerializer()):
+            encode, decode, size = throughput(serde, messages, args.seconds)
+            written = asyncio.run(stored_bytes(serde, messages, args.games, directory))
+            print(f"{type(serde).__name__:>20} {size:>9} {encode:>9.0f} "
+                  f"{encode * size / 1e6:>7.1f} {decode:>9.0f} "
+                  f"{decode * size / 1e6:>7.1f} {written / 2**20:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Turn throughput of `ShardedGameServer` as workers are added.
+
+`--players` concurrent games each play `--turns` turns against the
+deterministic `FakeChatModel`, which answers instantly, so throughput is
+bound by graph execution on the workers' cores. The run is repeated for each
+worker count in `--workers` against a fresh shared checkpoint file, and
+reports turns/s, p99 turn latency and the speed-up over one worker. Scaling
+is near-linear only up to the number of free cores.
+
+    python benchmarks/bench_sharding.py --workers 1 2 4 8 --players 400
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from react_agent.metrics import LatencyWindow
+from react_agent.prompts import WEAPONS_KEY_GUESS_PREFIX
+from react_agent.serving import ShardedGameServer
+from react_agent.testing import register_fake_provider
+
+TURNS = (
+    "Hello captain, reporting for duty.",
+    "How are the shields holding up?",
+    f"{WEAPONS_KEY_GUESS_PREFIX}apple",
+    "Set a course for the Veil Nebula.",
+)
+
+
+async def run(args: argparse.Namespace, workers: int, path: Path) -> dict:
+    latency = LatencyWindow(max_samples=args.players * args.turns)
+    async with ShardedGameServer(
+        workers, str(path), initializer=register_fake_provider
+    ) as server:
+
+        async def play(player: int) -> None:
+            config = {
+                "configurable": {
+                    "thread_id": f"player-{player}",
+                    "model_provider": "fake",
+                    "scenarios_enabled": False,
+                }
+            }
+            for turn in range(args.turns):
+                start = time.perf_counter()
+                message = TURNS[turn % len(TURNS)]
+                await server.ainvoke({"messages": [("user", message)]}, config)
+                latency.observe(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(play(player) for player in range(args.players)))
+        elapsed = time.perf_counter() - start
+        busiest = max(server.stats(index).completed for index in server.workers)
+    return {
+        "turns_per_second": args.players * args.turns / elapsed,
+        "p99_ms": latency.percentile(99) * 1000,
+        "busiest_share": busiest / (args.players * args.turns),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores, {args.players} players x {args.turns} turns")
+    print(f"{'workers':>8} {'turns/s':>9} {'p99 ms':>8} {'busiest':>8} {'speed-up':>9}")
+    baseline = None
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as directory:
+            row = asyncio.run(run(args, workers, Path(directory) / "games.sqlite"))
+        baseline = baseline or row["turns_per_second"]
+        print(f"{workers:>8} {row['turns_per_second']:>9.1f} {row['p99_ms']:>8.0f} "
+              f"{row['busiest_share']:>7.0%} "
+              f"{row['turns_per_second'] / baseline:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Cost of token accounting per turn, with and without the per-message cache.
+
+Plays `--turns` turns of a game. Each turn counts what `call_model` counts:
+the system prompt, the history window of the last `--window` messages with
+the new player message, and the reply. This is done once with a shared
+`TokenCounter`, which tokenizes each message once, and once tokenizing every
+message again each turn. Prints microseconds per turn for both.
+
+The counter uses tiktoken's `--encoding` when it can be loaded (it is
+downloaded on first use) and otherwise estimates four characters per token;
+the tokenizer used is printed.
+
+    python benchmarks/bench_tokens.py --turns 1000 --encoding o200k_base
+"""
+
+import argparse
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from react_agent.budget import TokenCounter
+from react_agent.configuration import Configuration
+from react_agent.prompting import system_prompt
+
+
+def game(turns: int) -> list:
+    messages: list = []
+    for turn in range(turns):
+        messages.append(
+            HumanMessage(
+                f"Turn {turn}: how are the shields holding up, captain? "
+                "Engineering reports a flicker in the aft deflector array.",
+                id=str(uuid.uuid4()),
+            )
+        )
+        messages.append(
+            AIMessage(
+                "Holding at sixty percent, first mate. Keep the crew on alert, "
+                "reroute auxiliary power to the aft array and report any further "
+                "anomalies from engineering at once.",
+                id=str(uuid.uuid4()),
+            )
+        )
+    return messages
+
+
+def per_turn(counter: TokenCounter, system: str, messages: list, window: int) -> float:
+    start = time.perf_counter()
+    for end in range(2, len(messages) + 1, 2):
+        counter.count_text(system)
+        counter.count_messages(messages[max(end - 1 - window, 0) : end - 1])
+        counter.count(messages[end - 1])
+    return (time.perf_counter() - start) / (len(messages) // 2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--window", type=int, default=20,
+                        help="History messages sent with each turn.")
+    parser.add_argument("--encoding", default="o200k_base")
+    args = parser.parse_args()
+
+    system = system_prompt(Configuration())
+    messages = game(args.turns)
+    shared = TokenCounter(args.encoding)
+    print(f"{args.turns} turns, window {args.window}, tokenizer {shared.tokenizer}")
+
+    # A counter that keeps nothing tokenizes every message again each turn.
+    uncached_counter = TokenCounter(args.encoding, max_size=0)
+    uncached_counter.tokenizer
+    cached = per_turn(shared, system, messages, args.window)
+    uncached = per_turn(uncached_counter, system, messages, args.window)
+    print(f"{'cached':>9}: {cached * 1e6:8.1f} us per turn "
+          f"({shared.hits} hits, {shared.misses} tokenized)")
+    print(f"{'uncached':>9}: {uncached * 1e6:8.1f} us per turn")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,34 @@ This module defines a custom reasoning and action agent graph.
 It invokes tools in a simple loop.
 """
 
-from react_agent.graph import graph
+import logging
+import sys
+import types
+from typing import Any
+
+# Library logging stays silent unless the application configures a handler.
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+
+class _Package(types.ModuleType):
+    """Loads LangGraph and the game nodes the first time `graph` is used.
+
+    `react_agent.graph` has always been the compiled graph rather than the
+    submodule of the same name. A property keeps it that way: it wins over
+    the submodule that the import system binds here when the submodule loads.
+    """
+
+    @property
+    def graph(self) -> Any:
+        from react_agent.graph import graph
+
+        return graph
+
+    @graph.setter
+    def graph(self, submodule: Any) -> None:
+        pass
+
+
+sys.modules[__name__].__class__ = _Package
 
 __all__ = ["graph"]
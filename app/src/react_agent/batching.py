@@ -0,0 +1,259 @@
+"""Micro-batching of guard classifications across concurrent game threads.
+
+Guard checks are tiny requests, so under load most of their cost is per-request
+overhead. `GuardBatcher` holds pending checks for up to `max_wait` seconds, or
+until `max_size` are queued, and sends them to the guard model as one
+classification request. Identical messages that are already in flight share a
+single future.
+
+Messages from different players share that request, so one player must not be
+able to answer for another. Each message is sent as a JSON string under a
+random id, and the model must reply with a JSON object mapping every id to a
+verdict. A reply that is not exactly that is discarded, and the batch is
+re-asked one message at a time.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import secrets
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Hashable, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from react_agent.guard import verdict_key
+from react_agent.llm import ainvoke_model
+from react_agent.prompts import BATCH_WARN_CAPTAIN_PROMPT, WARN_CAPTAIN_PROMPT
+from react_agent.residency import model_kwargs
+from react_agent.routing import ainvoke_routed
+from react_agent.scheduler import Priority, SchedulerSettings
+from react_agent.utils import get_message_text, load_chat_model
+
+if TYPE_CHECKING:
+    from react_agent.configuration import Configuration
+
+_VERDICTS = {"malicious": True, "safe": False}
+
+
+@dataclass
+class _Batch:
+    configuration: Configuration
+    texts: list[str] = field(default_factory=list)
+    futures: list[asyncio.Future[bool]] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+@dataclass
+class BatchStats:
+    """Counters describing how well checks are being batched."""
+
+    requests: int = 0
+    """Guard checks submitted to the batcher."""
+
+    deduplicated: int = 0
+    """Checks that joined an identical in-flight check."""
+
+    batches: int = 0
+    """Classification requests sent to the model."""
+
+    fallbacks: int = 0
+    """Items re-asked one by one because the batch reply was not a verdict for each."""
+
+    @property
+    def mean_batch_size(self) -> float:
+        """Average number of distinct messages per model request."""
+        sent = self.requests - self.deduplicated
+        return sent / self.batches if self.batches else 0.0
+
+
+class GuardBatcher:
+    """Collects guard checks per (model, secret) and flushes them together.
+
+    Futures belong to the event loop that created them, so a batcher keeps one
+    set of queues per running loop.
+    """
+
+    def __init__(self) -> None:
+        """Start with no batches pending on any event loop."""
+        self._batches: dict[tuple[int, Hashable], _Batch] = {}
+        self._in_flight: dict[tuple[int, bytes], asyncio.Future[bool]] = {}
+        self._sending: set[asyncio.Future[None]] = set()
+        self.stats = BatchStats()
+
+    async def classify(self, text: str, configuration: Configuration) -> bool:
+        """Return True if `text` is malicious, sharing a model call with other checks.
+
+        Checks are batched with others for the same guard model and secret key.
+        Each batch is sent through `ainvoke_routed`, so it is hedged and falls
+        back like any other guard call.
+
+        Args:
+            text: The message to classify.
+            configuration: The guard's configuration. Its model, fallback
+                models, secret key, `guard_batch_max_size` and
+                `guard_batch_max_wait_ms` apply.
+        """
+        loop = asyncio.get_running_loop()
+        loop_id = id(loop)
+        self.stats.requests += 1
+        secret_key = configuration.secret_key
+
+        flight_key = (loop_id, verdict_key(text, secret_key))
+        in_flight = self._in_flight.get(flight_key)
+        if in_flight is not None:
+            self.stats.deduplicated += 1
+            return await asyncio.shield(in_flight)
+
+        future: asyncio.Future[bool] = loop.create_future()
+        self._in_flight[flight_key] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(flight_key, None))
+
+        model_key = (
+            configuration.model_provider,
+            configuration.model_name,
+            configuration.ollama_base_url,
+            tuple(configuration.fallback_models),
+            secret_key,
+        )
+        batch_key = (loop_id, model_key)
+        batch = self._batches.get(batch_key)
+        if batch is None:
+            batch = _Batch(configuration)
+            self._batches[batch_key] = batch
+            batch.timer = loop.call_later(
+                configuration.guard_batch_max_wait_ms / 1000, self._flush, batch_key
+            )
+        batch.texts.append(text)
+        batch.futures.append(future)
+        if len(batch.texts) >= configuration.guard_batch_max_size:
+            self._flush(batch_key)
+        return await asyncio.shield(future)
+
+    def _flush(self, batch_key: tuple[int, Hashable]) -> None:
+        batch = self._batches.pop(batch_key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        self.stats.batches += 1
+        task = asyncio.ensure_future(self._send(batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: _Batch) -> None:
+        try:
+            verdicts = await self._ask(batch.configuration, batch.texts)
+            if verdicts is None:
+                self.stats.fallbacks += len(batch.texts)
+                verdicts = list(
+                    await asyncio.gather(
+                        *(
+                            self._ask_one(batch.configuration, text)
+                            for text in batch.texts
+                        )
+                    )
+                )
+            for future, verdict in zip(batch.futures, verdicts):
+                if not future.done():
+                    future.set_result(verdict)
+        except Exception as error:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(error)
+
+    @staticmethod
+    async def _invoke(
+        configuration: Configuration, messages: list[BaseMessage]
+    ) -> AIMessage:
+        async def ask(backend: Configuration, primary: bool) -> AIMessage:
+            model = load_chat_model(
+                backend.model_provider,
+                backend.model_name,
+                backend.ollama_base_url,
+                scheduled=backend.scheduler_enabled,
+                **model_kwargs(backend),
+            )
+            # A batch serves several threads, so no one thread's callbacks
+            # receive it.
+            return await ainvoke_model(
+                model,
+                messages,
+                None,
+                node="check_incoming_message",
+                provider=backend.model_provider,
+                priority=Priority.GUARD,
+                limits=SchedulerSettings.from_configuration(backend),
+            )
+
+        return await ainvoke_routed(configuration, ask, node="check_incoming_message")
+
+    @staticmethod
+    async def _ask(
+        configuration: Configuration, texts: list[str]
+    ) -> Optional[list[bool]]:
+        """Return a verdict per text, or None if the reply is not a valid one."""
+        if len(texts) == 1:
+            return [await GuardBatcher._ask_one(configuration, texts[0])]
+        ids: list[str] = []
+        while len(set(ids)) != len(texts):
+            ids = [secrets.token_hex(4) for _ in texts]
+        payload = json.dumps(
+            [{"id": id_, "text": text} for id_, text in zip(ids, texts)],
+            ensure_ascii=False,
+        )
+        response = await GuardBatcher._invoke(
+            configuration,
+            [
+                SystemMessage(
+                    BATCH_WARN_CAPTAIN_PROMPT.format(
+                        secret_key=configuration.secret_key
+                    )
+                ),
+                HumanMessage(payload),
+            ],
+        )
+        return parse_verdicts(get_message_text(response), ids)
+
+    @staticmethod
+    async def _ask_one(configuration: Configuration, text: str) -> bool:
+        response = await GuardBatcher._invoke(
+            configuration,
+            [
+                SystemMessage(
+                    WARN_CAPTAIN_PROMPT.format(secret_key=configuration.secret_key)
+                ),
+                HumanMessage(text),
+            ],
+        )
+        return "malicious" in get_message_text(response)
+
+
+def parse_verdicts(reply: str, ids: list[str]) -> Optional[list[bool]]:
+    """Read a batch reply: a JSON object with a verdict for exactly `ids`.
+
+    Text around the object, such as a Markdown code fence, is ignored.
+
+    Returns:
+        The verdicts in the order of `ids`, or None if the reply has missing,
+        extra or unknown entries.
+    """
+    start, end = reply.find("{"), reply.rfind("}")
+    if start < 0:
+        return None
+    try:
+        # Keep the object's pairs, so that a repeated id is not silently merged.
+        pairs: Any = json.loads(reply[start : end + 1], object_pairs_hook=list)
+    except ValueError:
+        return None
+    if not isinstance(pairs, list) or sorted(key for key, _ in pairs) != sorted(ids):
+        return None
+    verdicts = dict(pairs)
+    answers = [str(verdicts[id_]).strip().lower() for id_ in ids]
+    if any(answer not in _VERDICTS for answer in answers):
+        return None
+    return [_VERDICTS[answer] for answer in answers]
+
+
+GUARD_BATCHER = GuardBatcher()
@@ -0,0 +1,264 @@
+"""Token accounting and token limits for each thread.
+
+`TokenCounter` counts a message's tokens with a tiktoken encoding and caches
+the count by message id, or by the text itself for messages without an id,
+such as the compiled system prompt. A message is therefore tokenized once,
+however many turns it stays in the history window. When the encoding cannot
+be loaded, for example offline, it falls back to four characters per token.
+Loading an encoding reads, and on first use downloads, its BPE file, so the
+graph nodes get their counter from `atoken_counter`, which loads it on a worker
+thread instead of blocking the event loop.
+
+Before each captain model call, `check_message_limit` applies
+`max_message_tokens` to the player's latest message, and `check_thread_limit`
+applies `max_thread_tokens` to the thread's spending so far plus the prompt
+about to be sent. A limit that is hit truncates the message, or makes the
+turn answer with a notice instead of the model, or also ends the game,
+depending on `token_limit_action`. `token_usage` is the state update that
+adds up a call's tokens.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Sequence
+
+from langchain_core.messages import AnyMessage, HumanMessage, RemoveMessage
+
+from react_agent.caching import TTLCache
+from react_agent.prompts import (
+    GAME_ENDED_BY_BUDGET_REPLY,
+    MESSAGE_TOO_LONG_REPLY,
+    TOKEN_BUDGET_SPENT_REPLY,
+)
+from react_agent.utils import get_message_text
+
+if TYPE_CHECKING:
+    from react_agent.configuration import Configuration
+    from react_agent.state import State
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_OVERHEAD_TOKENS = 4
+"""Tokens a chat message costs beyond its text: the role and separators."""
+
+_CHARS_PER_TOKEN = 4
+
+
+class TokenCounter:
+    """Counts message tokens, tokenizing each message only once.
+
+    Args:
+        encoding: The tiktoken encoding; empty always estimates.
+        max_size: Messages whose counts are kept.
+    """
+
+    def __init__(self, encoding: str = "o200k_base", max_size: int = 100_000) -> None:
+        """Set up the counter; the encoding is loaded on first use."""
+        self.encoding_name = encoding
+        self._counts: TTLCache[tuple[int, int]] = TTLCache(max_size, math.inf)
+        self._encoding: Any = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        """Counts served from the cache."""
+
+        self.misses = 0
+        """Messages that had to be tokenized."""
+
+    @property
+    def tokenizer(self) -> str:
+        """"tiktoken:<encoding>", or "estimate" when counting by characters."""
+        encoding = self._encoder()
+        return f"tiktoken:{self.encoding_name}" if encoding else "estimate"
+
+    def count_text(self, text: str) -> int:
+        """Return the tokens of `text`, such as a system prompt, caching by text."""
+        key = ("text", text)
+        cached = self._counts.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        tokens = self._tokenize(text)
+        self._counts.set(key, (len(text), tokens))
+        return tokens
+
+    def count(self, message: AnyMessage) -> int:
+        """Return the tokens of `message`, tokenizing it on first sight."""
+        text = get_message_text(message)
+        key = message.id or text
+        cached = self._counts.get(key)
+        # A message replaced under the same id, e.g. a truncated one, is recounted.
+        if cached is not None and cached[0] == len(text):
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        tokens = self._tokenize(text) + MESSAGE_OVERHEAD_TOKENS
+        self._counts.set(key, (len(text), tokens))
+        return tokens
+
+    def count_messages(self, messages: Iterable[AnyMessage]) -> int:
+        """Return the total tokens of `messages`."""
+        return sum(map(self.count, messages))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut `text` down to its first `max_tokens` tokens."""
+        encoding = self._encoder()
+        if encoding is None:
+            return text[: max_tokens * _CHARS_PER_TOKEN]
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return str(encoding.decode(tokens[:max_tokens]))
+
+    async def aload(self) -> None:
+        """Load the encoding on a worker thread, if it is not loaded yet."""
+        if not self._loaded:
+            await asyncio.to_thread(self._encoder)
+
+    def _tokenize(self, text: str) -> int:
+        encoding = self._encoder()
+        if encoding is None:
+            return len(text) // _CHARS_PER_TOKEN
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def _encoder(self) -> Any:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._encoding = _load_encoding(self.encoding_name)
+                    self._loaded = True
+        return self._encoding
+
+
+def _load_encoding(name: str) -> Any:
+    if not name:
+        return None
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception as error:  # noqa: BLE001 - missing package or download failure
+        logger.warning(
+            "Estimating token counts: could not load the %r encoding (%s)", name, error
+        )
+        return None
+
+
+_COUNTERS: dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def token_counter(encoding: str) -> TokenCounter:
+    """Return the process-wide counter for `encoding`."""
+    counter = _COUNTERS.get(encoding)
+    if counter is None:
+        with _counters_lock:
+            counter = _COUNTERS.setdefault(encoding, TokenCounter(encoding))
+    return counter
+
+
+async def atoken_counter(encoding: str) -> TokenCounter:
+    """Return the process-wide counter for `encoding`, with its encoding loaded."""
+    counter = token_counter(encoding)
+    await counter.aload()
+    return counter
+
+
+@dataclass
+class BudgetCheck:
+    """The outcome of a token limit check."""
+
+    messages: Sequence[AnyMessage]
+    """The messages to build the prompt from."""
+
+    update: dict[str, Any] = field(default_factory=dict)
+    """State update: a truncated or removed message, or the end of the game."""
+
+    reply: Optional[str] = None
+    """The notice to answer with instead of calling the model."""
+
+    limit: str = ""
+    """The limit that was hit: "message", "thread" or ""."""
+
+
+def truncate_message(
+    message: AnyMessage, max_tokens: int, counter: TokenCounter
+) -> AnyMessage:
+    """Return `message` cut down to `max_tokens`, or `message` itself if it fits."""
+    if max_tokens <= 0 or counter.count(message) - MESSAGE_OVERHEAD_TOKENS <= max_tokens:
+        return message
+    text = counter.truncate(get_message_text(message), max_tokens)
+    return message.model_copy(update={"content": text})
+
+
+def check_message_limit(
+    messages: Sequence[AnyMessage], configuration: Configuration, counter: TokenCounter
+) -> BudgetCheck:
+    """Apply `max_message_tokens` to the latest player message in `messages`."""
+    check = BudgetCheck(messages)
+    limit = configuration.max_message_tokens
+    if limit <= 0:
+        return check
+    index = next(
+        (
+            index
+            for index in range(len(messages) - 1, -1, -1)
+            if isinstance(messages[index], HumanMessage)
+        ),
+        None,
+    )
+    if index is None:
+        return check
+    message = messages[index]
+    truncated = truncate_message(message, limit, counter)
+    if truncated is message:
+        return check
+    check.limit = "message"
+    if configuration.token_limit_action == "truncate":
+        check.messages = [*messages[:index], truncated, *messages[index + 1 :]]
+        check.update["messages"] = [truncated]
+        return check
+    check.messages = [*messages[:index], *messages[index + 1 :]]
+    if message.id:
+        check.update["messages"] = [RemoveMessage(id=message.id)]
+    return _refuse(check, configuration, MESSAGE_TOO_LONG_REPLY)
+
+
+def check_thread_limit(
+    state: State, prompt_tokens: int, configuration: Configuration
+) -> BudgetCheck:
+    """Apply `max_thread_tokens` to the thread's spending plus `prompt_tokens`."""
+    check = BudgetCheck(state.messages)
+    limit = configuration.max_thread_tokens
+    if limit <= 0 or state.input_tokens + state.output_tokens + prompt_tokens <= limit:
+        return check
+    check.limit = "thread"
+    return _refuse(check, configuration, TOKEN_BUDGET_SPENT_REPLY)
+
+
+def _refuse(
+    check: BudgetCheck, configuration: Configuration, reply: str
+) -> BudgetCheck:
+    if configuration.token_limit_action == "end":
+        # The next game starts with a fresh budget.
+        check.update.update(is_start_of_game=True, input_tokens=0, output_tokens=0)
+        check.reply = GAME_ENDED_BY_BUDGET_REPLY
+    else:
+        check.reply = reply
+    return check
+
+
+def token_usage(state: State, input_tokens: int, output_tokens: int) -> dict[str, int]:
+    """Return the state update recording one model call's tokens."""
+    return {
+        "input_tokens": state.input_tokens + input_tokens,
+        "output_tokens": state.output_tokens + output_tokens,
+        "turn_input_tokens": input_tokens,
+        "turn_output_tokens": output_tokens,
+    }
@@ -0,0 +1,652 @@
+"""Record game sessions and their model calls, and replay them offline.
+
+`recording` installs an interceptor on `MODEL_REGISTRY`, so every client that
+`load_chat_model` hands out is wrapped in a `RecordingChatModel`. The wrapper
+writes each call's reply and latency to a `CassetteWriter`, keyed by the
+game thread and graph node that made it. `play_session` runs a scripted game
+and stores its turns with the path each turn took through the graph.
+
+`replaying` swaps every client for a `ReplayChatModel`, which answers from a
+`Cassette` after the recorded latency divided by `speed`. `replay` replays
+every stored session against freshly compiled graphs. It reports turns whose
+path through `is_start_of_game` and `is_weapons_key_guessed` changed, recorded
+calls that were never replayed, and the graph's own time per turn.
+
+A cassette is one file of length-prefixed, zlib-compressed JSON records. An
+index of record offsets is written at the end, so opening a cassette reads
+only the index. Records are read when a thread's calls are first replayed.
+
+    with recording("games.cassette") as cassette:
+        await play_session(graph, cassette, "smoke", "agent", turns, config)
+    report = await replay(Cassette("games.cassette"), speed=math.inf)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Iterator,
+    Mapping,
+    Optional,
+    Sequence,
+)
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+
+from react_agent.metrics import LatencyWindow
+from react_agent.registry import MODEL_REGISTRY, ChatModelRegistry, ModelKey
+from react_agent.utils import get_message_text
+
+MAGIC = b"REACT-AGENT-CASSETTE-1\n"
+_LENGTH = struct.Struct(">I")
+_FOOTER = struct.Struct(">QI")
+
+
+class CassetteMiss(LookupError):
+    """A replayed model call has no recorded reply left."""
+
+
+@dataclass
+class Interaction:
+    """One recorded model call."""
+
+    thread_id: str
+    node: str
+    prompt: str
+    """Hash of the prompt, to tell whether the replayed prompt changed."""
+
+    provider: str
+    model_name: str
+    latency: float
+    message: AIMessage
+
+
+@dataclass
+class SessionTurn:
+    """One recorded player turn."""
+
+    input: str
+    path: list[str]
+    """Graph nodes the turn ran, in order."""
+
+    seconds: float
+
+
+@dataclass
+class Session:
+    """A recorded game: its graph, config and turns."""
+
+    name: str
+    graph: str
+    """"agent" or "extra_hard_agent"."""
+
+    config: dict[str, Any]
+    turns: list[SessionTurn] = field(default_factory=list)
+
+
+def prompt_hash(messages: Sequence[BaseMessage]) -> str:
+    """Return a short stable hash of the message types and texts."""
+    digest = hashlib.blake2b(digest_size=12)
+    for message in messages:
+        digest.update(message.type.encode())
+        digest.update(b"\x1f")
+        digest.update(get_message_text(message).encode())
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+class CassetteWriter:
+    """Appends interactions and sessions to a cassette file.
+
+    Safe to use from several threads. The index is written by `close`; a
+    cassette that was never closed cannot be read.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Create or truncate the cassette at `path`."""
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._lock = threading.Lock()
+        self._calls: dict[str, list[tuple[int, int]]] = {}
+        self._sessions: list[tuple[int, int]] = []
+
+    def __enter__(self) -> CassetteWriter:
+        """Return the writer itself."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Write the index and close the file."""
+        self.close()
+
+    def add_interaction(self, interaction: Interaction) -> None:
+        """Record one model call."""
+        record = asdict(interaction)
+        record["message"] = message_to_dict(interaction.message)
+        with self._lock:
+            location = self._append(record)
+            key = _call_key(interaction.thread_id, interaction.node)
+            self._calls.setdefault(key, []).append(location)
+
+    def add_session(self, session: Session) -> None:
+        """Record one game session."""
+        with self._lock:
+            self._sessions.append(self._append(asdict(session)))
+
+    def close(self) -> None:
+        """Write the index and close the file."""
+        with self._lock:
+            if self._file.closed:
+                return
+            index = zlib.compress(
+                json.dumps({"calls": self._calls, "sessions": self._sessions}).encode()
+            )
+            offset = self._file.tell()
+            self._file.write(index)
+            self._file.write(_FOOTER.pack(offset, len(index)))
+            self._file.write(MAGIC)
+            self._file.close()
+
+    def _append(self, record: dict[str, Any]) -> tuple[int, int]:
+        data = zlib.compress(json.dumps(record, separators=(",", ":")).encode())
+        offset = self._file.tell()
+        self._file.write(_LENGTH.pack(len(data)))
+        self._file.write(data)
+        return offset, _LENGTH.size + len(data)
+
+
+class Cassette:
+    """A recorded cassette, opened by reading only its index.
+
+    Args:
+        path: The cassette file.
+
+    Raises:
+        ValueError: If the file is not a closed cassette.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open the cassette at `path` and read its index."""
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "rb")
+        self._file.seek(-(_FOOTER.size + len(MAGIC)), 2)
+        footer = self._file.read(_FOOTER.size)
+        if self._file.read() != MAGIC:
+            raise ValueError(f"{path} is not a closed cassette")
+        offset, length = _FOOTER.unpack(footer)
+        index = json.loads(zlib.decompress(self._read(offset, length)))
+        self._calls: dict[str, list[list[int]]] = index["calls"]
+        self._sessions: list[list[int]] = index["sessions"]
+
+    def __enter__(self) -> Cassette:
+        """Return the cassette itself."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Close the file."""
+        self.close()
+
+    def __len__(self) -> int:
+        """Return the number of recorded model calls."""
+        return sum(len(locations) for locations in self._calls.values())
+
+    def close(self) -> None:
+        """Close the file."""
+        self._file.close()
+
+    def call_counts(self) -> dict[tuple[str, str], int]:
+        """Return the number of recorded calls per (thread, node)."""
+        counts = {}
+        for key, locations in self._calls.items():
+            thread_id, node = key.split("\x1f", 1)
+            counts[thread_id, node] = len(locations)
+        return counts
+
+    def sessions(self) -> list[Session]:
+        """Load every recorded session."""
+        sessions = []
+        for location in self._sessions:
+            record = self._record(location)
+            turns = [SessionTurn(**turn) for turn in record.pop("turns")]
+            sessions.append(Session(**record, turns=turns))
+        return sessions
+
+    def interactions(self, thread_id: str, node: str) -> list[Interaction]:
+        """Load the calls `node` made in `thread_id`, in the order they were made."""
+        interactions = []
+        for location in self._calls.get(_call_key(thread_id, node), []):
+            record = self._record(location)
+            record["message"] = messages_from_dict([record["message"]])[0]
+            interactions.append(Interaction(**record))
+        return interactions
+
+    def _record(self, location: Sequence[int]) -> dict[str, Any]:
+        offset, length = location
+        record: dict[str, Any] = json.loads(
+            zlib.decompress(self._read(offset, length)[_LENGTH.size :])
+        )
+        return record
+
+    def _read(self, offset: int, length: int) -> bytes:
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(length)
+
+
+def _call_key(thread_id: str, node: str) -> str:
+    return f"{thread_id}\x1f{node}"
+
+
+def _call_site() -> tuple[str, str]:
+    """Return the thread and node of the graph run making the current call."""
+    from langgraph.config import get_config
+
+    try:
+        config = get_config()
+    except RuntimeError:
+        return "", ""
+    thread_id = config.get("configurable", {}).get("thread_id", "")
+    return str(thread_id), str(config.get("metadata", {}).get("langgraph_node", ""))
+
+
+def _as_message(message: BaseMessage) -> AIMessage:
+    return AIMessage(
+        content=message.content,
+        tool_calls=getattr(message, "tool_calls", []),
+        response_metadata=message.response_metadata,
+        usage_metadata=getattr(message, "usage_metadata", None),
+    )
+
+
+class RecordingChatModel(BaseChatModel):
+    """Passes calls through to `inner` and records each reply and its latency."""
+
+    inner: BaseChatModel
+    writer: Any = Field(exclude=True)
+    provider: str
+    model_name: str
+
+    @property
+    def _llm_type(self) -> str:
+        return f"recording-{self.inner._llm_type}"
+
+    def _record(
+        self, messages: list[BaseMessage], message: BaseMessage, latency: float
+    ) -> None:
+        thread_id, node = _call_site()
+        self.writer.add_interaction(
+            Interaction(
+                thread_id=thread_id,
+                node=node,
+                prompt=prompt_hash(messages),
+                provider=self.provider,
+                model_name=self.model_name,
+                latency=latency,
+                message=_as_message(message),
+            )
+        )
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        start = time.perf_counter()
+        result = self.inner._generate(messages, stop, run_manager, **kwargs)
+        self._record(messages, result.generations[0].message, time.perf_counter() - start)
+        return result
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        start = time.perf_counter()
+        result = await self.inner._agenerate(messages, stop, run_manager, **kwargs)
+        self._record(messages, result.generations[0].message, time.perf_counter() - start)
+        return result
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        start = time.perf_counter()
+        merged: Optional[AIMessageChunk] = None
+        async for chunk in self.inner._astream(messages, stop, run_manager, **kwargs):
+            message = chunk.message
+            if isinstance(message, AIMessageChunk):
+                merged = message if merged is None else merged + message
+            yield chunk
+        if merged is not None:
+            self._record(messages, merged, time.perf_counter() - start)
+
+
+class ReplayState:
+    """Which recorded calls a replay has used, and what did not match."""
+
+    def __init__(self, cassette: Cassette, speed: float) -> None:
+        """Replay from `cassette`, dividing recorded latencies by `speed`."""
+        self.cassette = cassette
+        self.speed = speed
+        self.calls = 0
+        self.prompt_changes = 0
+        """Replies served although the replayed prompt differs from the recorded one."""
+
+        self.latency: dict[str, float] = {}
+        """Recorded latency replayed per thread, for the turn in progress."""
+
+        self._remaining: dict[tuple[str, str], list[Interaction]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, messages: Sequence[BaseMessage]) -> Interaction:
+        """Return the next recorded reply for the current thread and node.
+
+        A recorded call with the same prompt is preferred, so calls that
+        interleave differently than when recording still get their own reply.
+
+        Raises:
+            CassetteMiss: If the thread and node have no replies left.
+        """
+        thread_id, node = _call_site()
+        prompt = prompt_hash(messages)
+        with self._lock:
+            key = (thread_id, node)
+            remaining = self._remaining.get(key)
+            if remaining is None:
+                remaining = self._remaining[key] = self.cassette.interactions(*key)
+            if not remaining:
+                raise CassetteMiss(
+                    f"No recorded reply left for node {node!r} in thread {thread_id!r}"
+                )
+            index = next(
+                (i for i, item in enumerate(remaining) if item.prompt == prompt), None
+            )
+            if index is None:
+                index = 0
+                self.prompt_changes += 1
+            interaction = remaining.pop(index)
+            self.calls += 1
+            self.latency[thread_id] = self.latency.get(thread_id, 0.0) + interaction.latency
+        return interaction
+
+    def unused(self) -> dict[tuple[str, str], int]:
+        """Return how many recorded calls per (thread, node) were never replayed."""
+        unused = {}
+        with self._lock:
+            for key, count in self.cassette.call_counts().items():
+                remaining = self._remaining.get(key)
+                left = count if remaining is None else len(remaining)
+                if left:
+                    unused[key] = left
+        return unused
+
+    def delay(self, interaction: Interaction) -> float:
+        """Return how long to wait before answering with `interaction`."""
+        return interaction.latency / self.speed if self.speed > 0 else 0.0
+
+
+class ReplayChatModel(BaseChatModel):
+    """Answers every call from a cassette instead of a provider."""
+
+    state: Any = Field(exclude=True)
+    model_name: str
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-chat-model"
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        interaction = self.state.take(messages)
+        time.sleep(self.state.delay(interaction))
+        return ChatResult(generations=[ChatGeneration(message=interaction.message)])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        interaction = self.state.take(messages)
+        await asyncio.sleep(self.state.delay(interaction))
+        return ChatResult(generations=[ChatGeneration(message=interaction.message)])
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        interaction = self.state.take(messages)
+        await asyncio.sleep(self.state.delay(interaction))
+        message = interaction.message
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content=message.content,
+                tool_call_chunks=[
+                    tool_call_chunk(
+                        name=call["name"],
+                        args=json.dumps(call["args"]),
+                        id=call["id"],
+                        index=index,
+                    )
+                    for index, call in enumerate(message.tool_calls)
+                ],
+                response_metadata=message.response_metadata,
+                usage_metadata=message.usage_metadata,
+            )
+        )
+
+
+@contextmanager
+def recording(
+    path: str, registry: ChatModelRegistry = MODEL_REGISTRY
+) -> Iterator[CassetteWriter]:
+    """Record every model call made through `registry` to the cassette at `path`."""
+
+    def intercept(key: ModelKey, build: Callable[[], BaseChatModel]) -> BaseChatModel:
+        provider, model_name, _, _ = key
+        return RecordingChatModel(
+            inner=build(), writer=writer, provider=provider, model_name=model_name
+        )
+
+    with CassetteWriter(path) as writer:
+        previous = registry.intercept(intercept)
+        try:
+            yield writer
+        finally:
+            registry.intercept(previous)
+
+
+@contextmanager
+def replaying(
+    cassette: Cassette,
+    speed: float = 1.0,
+    registry: ChatModelRegistry = MODEL_REGISTRY,
+) -> Iterator[ReplayState]:
+    """Answer every model call made through `registry` from `cassette`.
+
+    Args:
+        cassette: The recording to replay.
+        speed: 1 waits the recorded latency, 10 a tenth of it, and
+            `math.inf` answers at once.
+        registry: The registry whose clients are replaced.
+    """
+    state = ReplayState(cassette, speed)
+
+    def intercept(key: ModelKey, build: Callable[[], BaseChatModel]) -> BaseChatModel:
+        return ReplayChatModel(state=state, model_name=key[1])
+
+    previous = registry.intercept(intercept)
+    try:
+        yield state
+    finally:
+        registry.intercept(previous)
+
+
+async def _run_turn(
+    graph: Any, text: str, config: dict[str, Any]
+) -> tuple[list[str], float]:
+    path: list[str] = []
+    start = time.perf_counter()
+    async for update in graph.astream(
+        {"messages": [("user", text)]}, config, stream_mode="updates"
+    ):
+        path.extend(node for node in update if not node.startswith("__"))
+    return path, time.perf_counter() - start
+
+
+async def play_session(
+    graph: Any,
+    writer: CassetteWriter,
+    name: str,
+    graph_name: str,
+    turns: Sequence[str],
+    config: Mapping[str, Any],
+) -> Session:
+    """Play `turns` through `graph` and record the session to `writer`.
+
+    Args:
+        graph: A compiled graph with a checkpointer.
+        writer: The cassette being recorded.
+        name: A name for the session.
+        graph_name: "agent" or "extra_hard_agent", to replay it on.
+        turns: The player's messages.
+        config: The run config; it must name a `thread_id`. Keep it
+            deterministic, e.g. with `scenarios_enabled` off, so replayed
+            prompts match the recorded ones.
+
+    Returns:
+        The recorded session.
+    """
+    session = Session(name, graph_name, dict(config))
+    for text in turns:
+        path, seconds = await _run_turn(graph, text, session.config)
+        session.turns.append(SessionTurn(text, path, seconds))
+    writer.add_session(session)
+    return session
+
+
+@dataclass
+class ReplayReport:
+    """Outcome of replaying a cassette."""
+
+    turns: int = 0
+    mismatches: list[str] = field(default_factory=list)
+    """Turns whose path through the graph, or model calls, differ from the
+    recording, and recorded calls that were never replayed."""
+
+    prompt_changes: int = 0
+    overhead: LatencyWindow = field(default_factory=LatencyWindow)
+    """Seconds per turn spent outside the replayed model latency."""
+
+
+async def replay(
+    cassette: Cassette,
+    *,
+    speed: float = 1.0,
+    graphs: Optional[Mapping[str, Any]] = None,
+    registry: ChatModelRegistry = MODEL_REGISTRY,
+) -> ReplayReport:
+    """Replay every session in `cassette` against fresh graphs.
+
+    Sessions are replayed concurrently, each turn after the previous one as
+    recorded.
+
+    Args:
+        cassette: The recording to replay.
+        speed: As for `replaying`.
+        graphs: Compiled graphs by name; defaults to `builder` and
+            `extra_hard_builder` compiled with an `InMemorySaver`.
+        registry: The registry whose clients are replaced.
+    """
+    if graphs is None:
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        from react_agent.graph import builder, extra_hard_builder
+
+        checkpointer = InMemorySaver()
+        graphs = {
+            "agent": builder.compile(checkpointer=checkpointer),
+            "extra_hard_agent": extra_hard_builder.compile(checkpointer=checkpointer),
+        }
+    report = ReplayReport()
+
+    async def run(session: Session, state: ReplayState) -> None:
+        thread_id = str(session.config["configurable"]["thread_id"])
+        for number, turn in enumerate(session.turns, 1):
+            state.latency[thread_id] = 0.0
+            try:
+                path, seconds = await _run_turn(
+                    graphs[session.graph], turn.input, session.config
+                )
+            except CassetteMiss as error:
+                # The turn made more model calls than were recorded.
+                report.turns += 1
+                report.mismatches.append(f"{session.name} turn {number}: {error}")
+                continue
+            model_seconds = (
+                state.latency[thread_id] / state.speed if state.speed > 0 else 0.0
+            )
+            report.overhead.observe(max(seconds - model_seconds, 0.0))
+            report.turns += 1
+            if path != turn.path:
+                report.mismatches.append(
+                    f"{session.name} turn {number}: {turn.path} became {path}"
+                )
+
+    sessions = cassette.sessions()
+    with replaying(cassette, speed, registry) as state:
+        await asyncio.gather(*(run(session, state) for session in sessions))
+    names = {
+        str(session.config["configurable"]["thread_id"]): session.name
+        for session in sessions
+    }
+    for (thread_id, node), count in sorted(state.unused().items()):
+        # The replay made fewer model calls than were recorded.
+        report.mismatches.append(
+            f"{names.get(thread_id, thread_id)}: {count} recorded call(s) "
+            f"from {node!r} were not replayed"
+        )
+    report.prompt_changes = state.prompt_changes
+    return report
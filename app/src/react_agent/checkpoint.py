@@ -0,0 +1,854 @@
+"""A file-backed checkpointer that stores message histories as deltas.
+
+LangGraph writes a blob for every channel that changed in a step. For the
+`messages` channel that blob is the whole, ever-growing list, so a game of
+`n` turns writes O(n²) bytes. `DeltaSqliteSaver` stores a list-valued channel
+as the messages appended since its previous version, with a full keyframe
+every `snapshot_every` versions to bound how far a read has to walk back.
+Scalar fields such as `is_start_of_game` or `user_discovered_weapons_key` are
+only written in the steps that change them, as with every LangGraph saver.
+
+All database work runs on one writer thread that owns the SQLite connection
+(WAL mode). Operations queued by concurrent game threads while a commit is in
+progress are applied together and committed with a single fsync. Each group
+takes the write lock up front, so several processes can share one file.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import builtins
+import logging
+import queue
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator, Sequence
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+from langgraph.checkpoint.serde.base import SerializerProtocol
+
+from react_agent.compact import CompactSerializer
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    base_version TEXT,
+    depth INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data BLOB NOT NULL,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+# Walks a blob's delta chain back to its keyframe, newest first.
+_CHAIN_QUERY = """
+WITH RECURSIVE chain(version, kind, base_version, type, data) AS (
+    SELECT version, kind, base_version, type, data FROM blobs
+    WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?
+    UNION ALL
+    SELECT b.version, b.kind, b.base_version, b.type, b.data
+    FROM blobs b JOIN chain c ON b.version = c.base_version
+    WHERE b.thread_id = ? AND b.checkpoint_ns = ? AND b.channel = ?
+        AND c.kind = 'delta'
+)
+SELECT kind, type, data FROM chain
+"""
+
+
+@dataclass
+class CheckpointStats:
+    """Counters for `DeltaSqliteSaver` writes and reads."""
+
+    checkpoints: int = 0
+    full_blobs: int = 0
+    """Channel values stored whole: scalars, first versions and keyframes."""
+
+    delta_blobs: int = 0
+    bytes_written: int = 0
+    """Serialized bytes handed to SQLite for checkpoints, blobs and writes."""
+
+    commits: int = 0
+    """Transactions committed; each costs one fsync of the WAL."""
+
+    operations: int = 0
+    """Operations applied by the writer thread."""
+
+    cache_hits: int = 0
+    cache_misses: int = 0
+    compactions: int = 0
+
+    @property
+    def operations_per_commit(self) -> float:
+        """How many operations shared each fsync on average."""
+        return self.operations / self.commits if self.commits else 0.0
+
+
+@dataclass
+class _Latest:
+    version: str
+    value: list[Any]
+    depth: int
+
+
+class _Worker:
+    """Runs callables against one SQLite connection, committing them in groups."""
+
+    def __init__(self, path: str, synchronous: str, stats: CheckpointStats) -> None:
+        self._queue: queue.SimpleQueue[
+            Optional[tuple[Callable[[sqlite3.Connection], Any], Future[Any]]]
+        ] = queue.SimpleQueue()
+        self._path = path
+        self._synchronous = synchronous
+        self._stats = stats
+        self._ready: Future[None] = Future()
+        self.on_rollback: Callable[[], None] = lambda: None
+        self._thread = threading.Thread(
+            target=self._run, name="delta-sqlite-saver", daemon=True
+        )
+        self._thread.start()
+        self._ready.result()
+
+    def submit(self, func: Callable[[sqlite3.Connection], T]) -> Future[T]:
+        future: Future[T] = Future()
+        self._queue.put((func, future))
+        return future
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self) -> None:
+        try:
+            conn = sqlite3.connect(self._path, isolation_level=None, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self._synchronous}")
+            conn.executescript(_SCHEMA)
+        except Exception as error:
+            self._ready.set_exception(error)
+            return
+        self._ready.set_result(None)
+        while True:
+            item = self._queue.get()
+            batch = []
+            while item is not None:
+                batch.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._apply(conn, batch)
+            if item is None:
+                break
+        conn.close()
+
+    def _apply(
+        self,
+        conn: sqlite3.Connection,
+        batch: list[tuple[Callable[[sqlite3.Connection], Any], Future[Any]]],
+    ) -> None:
+        results: list[tuple[Future[Any], Any, Optional[BaseException]]] = []
+        try:
+            # IMMEDIATE waits for other processes' writers instead of failing
+            # when a read in this group is followed by a write.
+            conn.execute("BEGIN IMMEDIATE")
+            for func, future in batch:
+                # A savepoint per operation, so one failure does not undo the
+                # others.
+                conn.execute("SAVEPOINT op")
+                try:
+                    result = func(conn)
+                except Exception as error:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    results.append((future, None, error))
+                else:
+                    conn.execute("RELEASE op")
+                    results.append((future, result, None))
+            conn.execute("COMMIT")
+        except Exception as error:
+            # E.g. "database is locked" once another process held the write
+            # lock past the timeout. Fail this batch, keep the writer running.
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    logger.exception("Could not roll back a failed write batch")
+            self.on_rollback()
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        self._stats.commits += 1
+        self._stats.operations += len(batch)
+        for future, result, failure in results:
+            if failure is not None:
+                future.set_exception(failure)
+            else:
+                future.set_result(result)
+
+
+class DeltaSqliteSaver(BaseCheckpointSaver[str]):
+    """A SQLite checkpointer that appends message deltas instead of whole lists.
+
+    Args:
+        path: The database file, or ":memory:" for a private in-memory database.
+        serde: The serializer for checkpoints, blobs and writes; defaults to
+            `CompactSerializer`.
+        snapshot_every: Store a full copy of a list channel after this many
+            deltas; 0 stores every version in full.
+        compact_every: Compact a thread after this many checkpoints; 0 never
+            compacts automatically.
+        keep_checkpoints: Checkpoints kept per thread and namespace when
+            compacting.
+        cache_size: Latest list values kept in memory, one per thread and
+            channel, to diff new versions against and to resume without
+            reading the delta chain.
+        synchronous: SQLite `synchronous` pragma; "FULL" fsyncs every commit.
+
+    Example:
+        ```python
+        with DeltaSqliteSaver("games.sqlite") as saver:
+            graph = builder.compile(checkpointer=saver)
+        ```
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        snapshot_every: int = 64,
+        compact_every: int = 256,
+        keep_checkpoints: int = 32,
+        cache_size: int = 16_384,
+        synchronous: str = "FULL",
+    ) -> None:
+        """Open or create the database at `path` and start its writer thread."""
+        super().__init__(serde=serde or CompactSerializer())
+        self.snapshot_every = snapshot_every
+        self.compact_every = compact_every
+        self.keep_checkpoints = keep_checkpoints
+        self.cache_size = cache_size
+        self.stats = CheckpointStats()
+        self._latest: OrderedDict[tuple[str, str, str], _Latest] = OrderedDict()
+        self._puts_since_compaction: dict[tuple[str, str], int] = {}
+        self._worker = _Worker(path, synchronous, self.stats)
+        self._worker.on_rollback = self._latest.clear
+
+    def __enter__(self) -> DeltaSqliteSaver:
+        """Return the saver itself."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Close the saver, committing outstanding work."""
+        self.close()
+
+    async def __aenter__(self) -> DeltaSqliteSaver:
+        """Return the saver itself."""
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        """Close the saver, committing outstanding work."""
+        self.close()
+
+    def close(self) -> None:
+        """Commit outstanding work and close the database."""
+        self._worker.close()
+
+    # Reads
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Return the requested checkpoint, or the thread's latest one."""
+        return self._worker.submit(lambda conn: self._get_tuple(conn, config)).result()
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Asynchronous version of `get_tuple`."""
+        return await asyncio.wrap_future(
+            self._worker.submit(lambda conn: self._get_tuple(conn, config))
+        )
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """List checkpoints, newest first, rebuilding each one as it is reached."""
+        rows = self._worker.submit(
+            lambda conn: self._list_rows(conn, config, before)
+        ).result()
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            metadata = self.serde.loads_typed((row[6], row[7]))
+            if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield self._worker.submit(partial(self._tuple_from_row, row=row)).result()
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Asynchronous version of `list`."""
+        rows = await asyncio.wrap_future(
+            self._worker.submit(lambda conn: self._list_rows(conn, config, before))
+        )
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            metadata = self.serde.loads_typed((row[6], row[7]))
+            if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield await asyncio.wrap_future(
+                self._worker.submit(partial(self._tuple_from_row, row=row))
+            )
+
+    # Writes
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Store a checkpoint, writing list channels as deltas."""
+        return self._worker.submit(
+            lambda conn: self._put(conn, config, checkpoint, metadata, new_versions)
+        ).result()
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Asynchronous version of `put`."""
+        return await asyncio.wrap_future(
+            self._worker.submit(
+                lambda conn: self._put(conn, config, checkpoint, metadata, new_versions)
+            )
+        )
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Store the pending writes of a task."""
+        self._worker.submit(
+            lambda conn: self._put_writes(conn, config, writes, task_id, task_path)
+        ).result()
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Asynchronous version of `put_writes`."""
+        await asyncio.wrap_future(
+            self._worker.submit(
+                lambda conn: self._put_writes(conn, config, writes, task_id, task_path)
+            )
+        )
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete every checkpoint, blob and write of a thread."""
+        self._worker.submit(lambda conn: self._delete_thread(conn, thread_id)).result()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Asynchronous version of `delete_thread`."""
+        await asyncio.wrap_future(
+            self._worker.submit(lambda conn: self._delete_thread(conn, thread_id))
+        )
+
+    def compact(self, thread_id: Optional[str] = None) -> None:
+        """Drop all but the last `keep_checkpoints` checkpoints of each thread.
+
+        Deltas whose base would be dropped are first rewritten as full values,
+        so every kept checkpoint still rebuilds to the same state.
+        """
+
+        def run(conn: sqlite3.Connection) -> None:
+            if thread_id is None:
+                keys = conn.execute(
+                    "SELECT DISTINCT thread_id, checkpoint_ns FROM checkpoints"
+                ).fetchall()
+            else:
+                keys = conn.execute(
+                    "SELECT DISTINCT thread_id, checkpoint_ns FROM checkpoints "
+                    "WHERE thread_id = ?",
+                    (thread_id,),
+                ).fetchall()
+            for thread, ns in keys:
+                self._compact(conn, thread, ns)
+
+        self._worker.submit(run).result()
+
+    def evict(self, should_evict: Callable[[str], bool]) -> int:
+        """Forget the cached latest values of threads `should_evict` accepts.
+
+        Used when another process takes over a thread: its next read here
+        then goes to the database instead of trusting a stale copy.
+
+        Returns:
+            The number of cached values dropped.
+        """
+
+        def run(conn: sqlite3.Connection) -> int:
+            keys = [key for key in self._latest if should_evict(key[0])]
+            for key in keys:
+                del self._latest[key]
+            return len(keys)
+
+        return self._worker.submit(run).result()
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        """Return the version after `current`, with a random tiebreaker."""
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # Writer-thread implementations
+
+    def _put(
+        self,
+        conn: sqlite3.Connection,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        stored = checkpoint.copy()
+        values: dict[str, Any] = stored.pop("channel_values")  # type: ignore[misc]
+        cached: list[tuple[tuple[str, str, str], _Latest]] = []
+
+        for channel, version in new_versions.items():
+            kind, base, depth = "full", None, 0
+            if channel not in values:
+                kind, payload = "empty", None
+            else:
+                value = payload = values[channel]
+                if isinstance(value, list):
+                    key = (thread_id, checkpoint_ns, channel)
+                    previous = self._latest.get(key)
+                    if (
+                        previous is not None
+                        and previous.depth < self.snapshot_every
+                        and _extends(value, previous.value)
+                    ):
+                        kind, base = "delta", previous.version
+                        depth = previous.depth + 1
+                        payload = value[len(previous.value) :]
+                    cached.append((key, _Latest(str(version), list(value), depth)))
+            type_, data = (
+                self.serde.dumps_typed(payload) if kind != "empty" else ("empty", b"")
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    channel,
+                    str(version),
+                    kind,
+                    base,
+                    depth,
+                    type_,
+                    data,
+                ),
+            )
+            self.stats.bytes_written += len(data)
+            if kind == "delta":
+                self.stats.delta_blobs += 1
+            elif kind == "full":
+                self.stats.full_blobs += 1
+
+        type_, data = self.serde.dumps_typed(stored)
+        metadata_type, metadata_data = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata)
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                thread_id,
+                checkpoint_ns,
+                checkpoint["id"],
+                configurable.get("checkpoint_id"),
+                type_,
+                data,
+                metadata_type,
+                metadata_data,
+            ),
+        )
+        self.stats.bytes_written += len(data) + len(metadata_data)
+        self.stats.checkpoints += 1
+
+        if self.compact_every:
+            count_key = (thread_id, checkpoint_ns)
+            count = self._puts_since_compaction.get(count_key, 0) + 1
+            if count >= self.compact_every:
+                self._compact(conn, thread_id, checkpoint_ns)
+                count = 0
+            self._puts_since_compaction[count_key] = count
+
+        # Only remembered once everything above succeeded, so a rolled back
+        # operation never becomes the base of a later delta.
+        for key, latest in cached:
+            self._remember(key, latest)
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def _put_writes(
+        self,
+        conn: sqlite3.Connection,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str,
+    ) -> None:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        checkpoint_id = configurable["checkpoint_id"]
+        for index, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, index)
+            type_, data = self.serde.dumps_typed(value)
+            # Regular writes are idempotent; special writes (errors, interrupts)
+            # replace the previous one.
+            verb = "INSERT OR IGNORE" if idx >= 0 else "INSERT OR REPLACE"
+            conn.execute(
+                f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint_id,
+                    task_id,
+                    idx,
+                    channel,
+                    type_,
+                    data,
+                    task_path,
+                ),
+            )
+            self.stats.bytes_written += len(data)
+
+    def _delete_thread(self, conn: sqlite3.Connection, thread_id: str) -> None:
+        for table in ("checkpoints", "blobs", "writes"):
+            conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+        for key in [key for key in self._latest if key[0] == thread_id]:
+            del self._latest[key]
+        for pending in [
+            pending for pending in self._puts_since_compaction if pending[0] == thread_id
+        ]:
+            del self._puts_since_compaction[pending]
+
+    def _compact(self, conn: sqlite3.Connection, thread_id: str, ns: str) -> None:
+        kept = [
+            row
+            for row in conn.execute(
+                "SELECT checkpoint_id, type, checkpoint FROM checkpoints "
+                "WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT ?",
+                (thread_id, ns, self.keep_checkpoints),
+            )
+        ]
+        if not kept:
+            return
+        oldest = kept[-1][0]
+        referenced: set[tuple[str, str]] = set()
+        for _, type_, data in kept:
+            versions = self.serde.loads_typed((type_, data))["channel_versions"]
+            referenced.update((channel, str(v)) for channel, v in versions.items())
+
+        # Rebase deltas whose base is about to be dropped onto a full value.
+        for channel, version, base in conn.execute(
+            "SELECT channel, version, base_version FROM blobs "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND kind = 'delta'",
+            (thread_id, ns),
+        ).fetchall():
+            if (channel, version) in referenced and (channel, base) not in referenced:
+                value = self._load_chain(conn, thread_id, ns, channel, version)
+                type_, data = self.serde.dumps_typed(value)
+                conn.execute(
+                    "UPDATE blobs SET kind = 'full', base_version = NULL, "
+                    "depth = 0, type = ?, data = ? WHERE thread_id = ? AND "
+                    "checkpoint_ns = ? AND channel = ? AND version = ?",
+                    (type_, data, thread_id, ns, channel, version),
+                )
+                self.stats.bytes_written += len(data)
+
+        conn.execute(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "AND checkpoint_id < ?",
+            (thread_id, ns, oldest),
+        )
+        conn.execute(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+            "AND checkpoint_id < ?",
+            (thread_id, ns, oldest),
+        )
+        for channel, version in conn.execute(
+            "SELECT channel, version FROM blobs "
+            "WHERE thread_id = ? AND checkpoint_ns = ?",
+            (thread_id, ns),
+        ).fetchall():
+            if (channel, version) not in referenced:
+                conn.execute(
+                    "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "AND channel = ? AND version = ?",
+                    (thread_id, ns, channel, version),
+                )
+        for key in [k for k in self._latest if k[:2] == (thread_id, ns)]:
+            if (key[2], self._latest[key].version) not in referenced:
+                del self._latest[key]
+            else:
+                # The kept value may have been rebased; restart its chain.
+                self._latest[key].depth = self.snapshot_every
+        self.stats.compactions += 1
+
+    def _get_tuple(
+        self, conn: sqlite3.Connection, config: RunnableConfig
+    ) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        if checkpoint_id := get_checkpoint_id(config):
+            row = conn.execute(
+                "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchone()
+        else:
+            row = conn.execute(
+                "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, checkpoint_ns),
+            ).fetchone()
+        return self._tuple_from_row(conn, row) if row is not None else None
+
+    def _list_rows(
+        self,
+        conn: sqlite3.Connection,
+        config: Optional[RunnableConfig],
+        before: Optional[RunnableConfig],
+    ) -> builtins.list[tuple[Any, ...]]:
+        query = "SELECT * FROM checkpoints"
+        clauses: list[str] = []
+        params: list[Any] = []
+        if config is not None:
+            configurable = config["configurable"]
+            clauses.append("thread_id = ?")
+            params.append(configurable["thread_id"])
+            if configurable.get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(configurable["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC"
+        return conn.execute(query, params).fetchall()
+
+    def _tuple_from_row(
+        self, conn: sqlite3.Connection, row: tuple[Any, ...]
+    ) -> CheckpointTuple:
+        (
+            thread_id,
+            checkpoint_ns,
+            checkpoint_id,
+            parent_id,
+            type_,
+            data,
+            metadata_type,
+            metadata_data,
+        ) = row
+        checkpoint: Checkpoint = self.serde.loads_typed((type_, data))
+        values: dict[str, Any] = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            value = self._load_value(conn, thread_id, checkpoint_ns, channel, str(version))
+            if value is not _EMPTY:
+                values[channel] = value
+        writes = conn.execute(
+            "SELECT task_id, channel, type, data, task_path, idx FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        writes.sort(key=lambda w: writes_sort_key(w[4], w[0], w[5]))
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={**checkpoint, "channel_values": values},
+            metadata=self.serde.loads_typed((metadata_type, metadata_data)),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((w_type, w_data)))
+                for task_id, channel, w_type, w_data, _, _ in writes
+            ],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+        )
+
+    def _load_value(
+        self,
+        conn: sqlite3.Connection,
+        thread_id: str,
+        checkpoint_ns: str,
+        channel: str,
+        version: str,
+    ) -> Any:
+        key = (thread_id, checkpoint_ns, channel)
+        latest = self._latest.get(key)
+        if latest is not None and latest.version == version:
+            self._latest.move_to_end(key)
+            self.stats.cache_hits += 1
+            return list(latest.value)
+        row = conn.execute(
+            "SELECT kind, type, data, depth FROM blobs WHERE thread_id = ? "
+            "AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            (thread_id, checkpoint_ns, channel, version),
+        ).fetchone()
+        if row is None or row[0] == "empty":
+            return _EMPTY
+        if row[0] == "full":
+            value = self.serde.loads_typed((row[1], row[2]))
+            if not isinstance(value, list):
+                return value
+        else:
+            self.stats.cache_misses += 1
+            value = self._load_chain(conn, thread_id, checkpoint_ns, channel, version)
+        if latest is None or latest.version < version:
+            self._remember(key, _Latest(version, list(value), row[3]))
+        return value
+
+    def _load_chain(
+        self,
+        conn: sqlite3.Connection,
+        thread_id: str,
+        checkpoint_ns: str,
+        channel: str,
+        version: str,
+    ) -> builtins.list[Any]:
+        parts = conn.execute(
+            _CHAIN_QUERY,
+            (thread_id, checkpoint_ns, channel, version)
+            + (thread_id, checkpoint_ns, channel),
+        ).fetchall()
+        if not parts or parts[-1][0] != "full":
+            raise LookupError(
+                f"Delta chain for {channel!r} at version {version} has no keyframe"
+            )
+        value: list[Any] = []
+        for _, type_, data in reversed(parts):
+            value.extend(self.serde.loads_typed((type_, data)))
+        return value
+
+    def _remember(self, key: tuple[str, str, str], latest: _Latest) -> None:
+        self._latest[key] = latest
+        self._latest.move_to_end(key)
+        while len(self._latest) > self.cache_size:
+            self._latest.popitem(last=False)
+
+
+_EMPTY = object()
+
+
+def _extends(value: list[Any], prefix: list[Any]) -> bool:
+    """Return True if `value` starts with every element of `prefix`."""
+    if len(value) < len(prefix):
+        return False
+    return all(a is b or a == b for a, b in zip(value, prefix))
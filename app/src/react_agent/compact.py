@@ -0,0 +1,205 @@
+"""Compact binary form of game histories for checkpoints and API payloads.
+
+LangGraph's default serializer writes every message as a full pydantic dump:
+the class path, `type`, empty `additional_kwargs` and `response_metadata`,
+`name`, `id` and, for replies, `tool_calls`, `invalid_tool_calls` and
+`usage_metadata`, once per message and per checkpoint. A game's fixed texts
+(`NEW_GAME_PROMPT`, `INCORRECT_GUESS_PROMPT`, `CORRECT_GUESS_PROMPT`, ...) are
+copied into every thread.
+
+`CompactMessage` keeps only what a message actually carries. The role is a
+small interned tag. A fixed prompt is stored as its id in `STATIC_TEXTS`, and
+every thread that loads it shares the one string. Only the fields that
+differ from their defaults are kept. `pack_messages` writes a list of them
+with ormsgpack, and `CompactSerializer` uses it for every message list a
+checkpointer stores, falling back to LangGraph's serializer for anything else.
+
+Stored checkpoints refer to the ids in `STATIC_TEXTS`, so an id is never
+reused or reassigned; a new fixed text gets the next free id.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Optional, Sequence
+
+import ormsgpack
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from react_agent.prompts import (
+    CORRECT_GUESS_PROMPT,
+    GAME_ENDED_BY_BUDGET_REPLY,
+    INCORRECT_GUESS_PROMPT,
+    LEAK_REDACTED_REPLY,
+    MALICIOUS_WARNING_PROMPT,
+    MESSAGE_TOO_LONG_REPLY,
+    NEW_GAME_PROMPT,
+    THROTTLED_GUESS_REACTIONS,
+    TOKEN_BUDGET_SPENT_REPLY,
+)
+
+STATIC_TEXTS: dict[int, str] = {
+    0: NEW_GAME_PROMPT,
+    1: INCORRECT_GUESS_PROMPT,
+    2: CORRECT_GUESS_PROMPT,
+    3: MALICIOUS_WARNING_PROMPT,
+    4: LEAK_REDACTED_REPLY,
+    5: THROTTLED_GUESS_REACTIONS[0],
+    6: THROTTLED_GUESS_REACTIONS[1],
+    7: THROTTLED_GUESS_REACTIONS[2],
+    8: THROTTLED_GUESS_REACTIONS[3],
+    9: THROTTLED_GUESS_REACTIONS[4],
+    10: MESSAGE_TOO_LONG_REPLY,
+    11: TOKEN_BUDGET_SPENT_REPLY,
+    12: GAME_ENDED_BY_BUDGET_REPLY,
+}
+"""Fixed message texts by their stored id. Never reuse or reassign an id."""
+
+_STATIC_IDS = {text: static_id for static_id, text in STATIC_TEXTS.items()}
+
+_CLASSES: tuple[type[BaseMessage], ...] = (
+    HumanMessage,
+    AIMessage,
+    SystemMessage,
+    ToolMessage,
+)
+_TAGS = {cls: tag for tag, cls in enumerate(_CLASSES)}
+
+# Fields kept only when they differ from the default, per role tag.
+_COMMON = ("additional_kwargs", "response_metadata", "name")
+_EXTRA_FIELDS = (
+    _COMMON,
+    _COMMON + ("tool_calls", "invalid_tool_calls", "usage_metadata"),
+    _COMMON,
+    _COMMON + ("tool_call_id", "artifact", "status"),
+)
+_DEFAULTS = {"status": "success"}
+
+MESSAGES_TYPE = "msgpack-messages"
+"""The `dumps_typed` type tag of a compact message list."""
+
+
+class CompactMessage:
+    """One message as a role tag, text or static text index, id and extras."""
+
+    __slots__ = ("role", "content", "id", "extra")
+
+    def __init__(
+        self,
+        role: int,
+        content: Any,
+        id: Optional[str] = None,
+        extra: Optional[dict[str, Any]] = None,
+    ) -> None:
+        """Store the compact fields as they are; see `from_message`."""
+        self.role = role
+        self.content = content
+        """An id in `STATIC_TEXTS`, the text, or a list of content blocks."""
+
+        self.id = id
+        self.extra = extra
+
+    @classmethod
+    def from_message(cls, message: BaseMessage) -> CompactMessage:
+        """Compact `message`.
+
+        Raises:
+            TypeError: For message classes without a role tag, such as chunks.
+        """
+        role = _TAGS.get(type(message))
+        if role is None:
+            raise TypeError(f"No compact form for {type(message).__name__}")
+        content: Any = message.content
+        if isinstance(content, str):
+            content = _STATIC_IDS.get(content, content)
+        extra = None
+        for name in _EXTRA_FIELDS[role]:
+            value = getattr(message, name)
+            if value and value != _DEFAULTS.get(name):
+                if extra is None:
+                    extra = {}
+                extra[name] = value
+        return cls(role, content, message.id, extra)
+
+    def to_message(self) -> BaseMessage:
+        """Rebuild the LangChain message."""
+        content = self.content
+        if isinstance(content, int):
+            content = STATIC_TEXTS[content]
+        if self.extra:
+            return _CLASSES[self.role](content=content, id=self.id, **self.extra)
+        return _CLASSES[self.role](content=content, id=self.id)
+
+    def __eq__(self, other: object) -> bool:
+        """Return whether `other` packs the same role, content, id and extras."""
+        if not isinstance(other, CompactMessage):
+            return NotImplemented
+        return (self.role, self.content, self.id, self.extra) == (
+            other.role,
+            other.content,
+            other.id,
+            other.extra,
+        )
+
+    def __repr__(self) -> str:
+        """Return the constructor call that rebuilds this message."""
+        return (
+            f"CompactMessage(role={self.role}, content={self.content!r}, "
+            f"id={self.id!r}, extra={self.extra!r})"
+        )
+
+
+def pack_messages(messages: Sequence[BaseMessage]) -> bytes:
+    """Serialize `messages` in compact form.
+
+    Raises:
+        TypeError: If a message has no compact form or a field cannot be
+            encoded.
+    """
+    records = []
+    for message in messages:
+        compact = CompactMessage.from_message(message)
+        record = [compact.role, compact.content, compact.id]
+        if compact.extra:
+            record.append(compact.extra)
+        records.append(record)
+    try:
+        return ormsgpack.packb(records)
+    except ormsgpack.MsgpackEncodeError as error:
+        raise TypeError(str(error)) from error
+
+
+def unpack_messages(data: bytes) -> list[BaseMessage]:
+    """Deserialize messages written by `pack_messages`."""
+    return [
+        CompactMessage(*record).to_message() for record in ormsgpack.unpackb(data)
+    ]
+
+
+class CompactSerializer(JsonPlusSerializer):
+    """LangGraph's serializer, with message lists stored in compact form."""
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        """Serialize `obj`, compacting it if it is a non-empty list of messages."""
+        if (
+            isinstance(obj, list)
+            and obj
+            and all(isinstance(item, BaseMessage) for item in obj)
+        ):
+            try:
+                return MESSAGES_TYPE, pack_messages(obj)
+            except TypeError:
+                pass
+        return super().dumps_typed(obj)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        """Deserialize a value written by `dumps_typed` or LangGraph's serializer."""
+        if data[0] == MESSAGES_TYPE:
+            return unpack_messages(data[1])
+        return super().loads_typed(data)
@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field, fields
-from typing import Annotated, Optional
+from typing import Annotated, Dict, List, Optional
 
 from langchain_core.runnables import RunnableConfig, ensure_config
 
@@ -68,6 +68,131 @@ class Configuration:
         }
     )
 
+    guard_model: str = field(
+        default="",
+        metadata={
+            "description": "Model for the malicious-message check, as provider/model, "
+            "e.g. ollama/llama3.2:1b. Empty uses the game's captain model."
+        },
+    )
+
+    reaction_model: str = field(
+        default="",
+        metadata={
+            "description": "Model for the captain's reaction to a wrong weapons key "
+            "guess, as provider/model. Empty uses the game's captain model."
+        },
+    )
+
+    summarizer_model: str = field(
+        default="",
+        metadata={
+            "description": "Model that writes the rolling history summary, as "
+            "provider/model. Empty uses the game's captain model."
+        },
+    )
+
+    models_by_difficulty: Dict[str, str] = field(
+        default_factory=dict,
+        metadata={
+            "description": "Captain model per game difficulty, as provider/model, "
+            "e.g. {\"easy\": \"ollama/llama3.2:3b\", \"hard\": \"openai/gpt-4o\"}. "
+            "Also used by any role without a model of its own. Difficulties not "
+            "listed use model_provider and model_name."
+        },
+    )
+
+    fallback_models: List[str] = field(
+        default_factory=list,
+        metadata={
+            "description": "Backup models, in order, as provider/model, e.g. "
+            "anthropic/claude-3-5-haiku-latest. A call moves on to the next one when "
+            "a model fails, and is hedged to it when a model is slow."
+        },
+    )
+
+    hedge_delay_ms: float = field(
+        default=0.0,
+        metadata={
+            "description": "How long to wait for a model before also asking the next "
+            "fallback model, in milliseconds. 0 uses the model's observed p95 latency."
+        },
+    )
+
+    hedge_budget_percent: float = field(
+        default=5.0,
+        metadata={
+            "description": "Most hedged requests, as a percentage of all model calls. "
+            "Set to 0 to only fall back on failures."
+        },
+    )
+
+    circuit_breaker_failures: int = field(
+        default=5,
+        metadata={
+            "description": "Consecutive failures after which a model is skipped. "
+            "Set to 0 to never skip a model."
+        },
+    )
+
+    circuit_breaker_reset_seconds: float = field(
+        default=30.0,
+        metadata={
+            "description": "How long a failing model is skipped before it is tried "
+            "again."
+        },
+    )
+
+    scheduler_enabled: bool = field(
+        default=True,
+        metadata={
+            "description": "Admit every model call through the process-wide "
+            "scheduler, which applies the rate limits and the adaptive concurrency "
+            "limit below and lets guard checks and players' turns go first."
+        },
+    )
+
+    scheduler_requests_per_minute: float = field(
+        default=0.0,
+        metadata={
+            "description": "Requests per minute allowed to each model provider, "
+            "across all games. Set to 0 for no limit."
+        },
+    )
+
+    scheduler_tokens_per_minute: float = field(
+        default=0.0,
+        metadata={
+            "description": "Tokens per minute allowed to each model provider, "
+            "across all games, using estimated prompt sizes. Set to 0 for no limit."
+        },
+    )
+
+    scheduler_max_concurrency: int = field(
+        default=64,
+        metadata={
+            "description": "Ceiling of the adaptive limit on concurrent calls to each "
+            "provider. The limit halves on 429s and latency spikes and grows back "
+            "while calls are healthy. Set to 0 for no limit."
+        },
+    )
+
+    scheduler_max_queue: int = field(
+        default=1000,
+        metadata={
+            "description": "Queued calls per provider beyond which background work "
+            "such as history summaries is dropped."
+        },
+    )
+
+    scheduler_max_wait_seconds: float = field(
+        default=30.0,
+        metadata={
+            "description": "Longest a call may wait for admission before it is "
+            "dropped. Set to 0 to wait indefinitely."
+        },
+    )
+
     secret_key: str = field(
         default="banana",
         metadata={
@@ -75,6 +200,280 @@ class Configuration:
         }
     )
 
+    guard_local_tier: bool = field(
+        default=True,
+        metadata={
+            "description": "Extra hard mode only. Settle explicit extraction "
+            "attempts with local patterns and clearly safe messages with a trigram "
+            "scorer, and ask the model about the rest."
+        },
+    )
+
+    guard_cache_ttl_seconds: float = field(
+        default=3600.0,
+        metadata={
+            "description": "How long a malicious/safe verdict is remembered for a "
+            "repeated message. Set to 0 to disable the verdict cache."
+        },
+    )
+
+    guard_batching: bool = field(
+        default=False,
+        metadata={
+            "description": "Extra hard mode only. Combine guard checks from "
+            "concurrent games into one multi-message classification request."
+        },
+    )
+
+    guard_batch_max_size: int = field(
+        default=16,
+        metadata={
+            "description": "Send a guard batch as soon as this many distinct "
+            "messages are waiting."
+        },
+    )
+
+    guard_batch_max_wait_ms: float = field(
+        default=5.0,
+        metadata={
+            "description": "Longest time a guard check waits for others to join "
+            "its batch, in milliseconds."
+        },
+    )
+
+    scenarios_enabled: bool = field(
+        default=True,
+        metadata={
+            "description": "Open each game with a mission dilemma drawn from the "
+            "scenarios file, cycling through all of them before any repeats."
+        },
+    )
+
+    speculative_guard: bool = field(
+        default=False,
+        metadata={
+            "description": "Extra hard mode only. Start the captain's reply while the "
+            "incoming message is still being checked, and rerun it with a warning "
+            "if the message turns out to be malicious."
+        },
+    )
+
+    stream_responses: bool = field(
+        default=False,
+        metadata={
+            "description": "Stream the captain's replies token by token so clients "
+            "using the `messages` stream mode see them as they are generated."
+        },
+    )
+
+    leak_detection: str = field(
+        default="off",
+        metadata={
+            "description": "Scan the captain's replies for the secret key. "
+            "This can be off, flag (mark the state), or abort (stop generating "
+            "and replace the reply with a refusal). With abort, replies are checked "
+            "in full before they are sent, so they are not streamed token by token."
+        },
+    )
+
+    prompt_cache_hints: bool = field(
+        default=True,
+        metadata={
+            "description": "Send provider prompt caching hints with the captain's "
+            "model calls: cache_control breakpoints for Anthropic, a "
+            "prompt_cache_key for OpenAI and keep_alive for Ollama."
+        },
+    )
+
+    ollama_keep_alive: str = field(
+        default="30m",
+        metadata={
+            "description": "How long Ollama keeps the model and its prompt context "
+            "loaded after a call, e.g. 30m. Leave empty for the server default."
+        },
+    )
+
+    ollama_options: Dict[str, Dict[str, int]] = field(
+        default_factory=dict,
+        metadata={
+            "description": "Ollama runtime options per role, e.g. "
+            "{\"captain\": {\"num_ctx\": 8192, \"num_thread\": 4}}. Ollama reloads "
+            "a model whenever these change, so roles that share a model all use "
+            "the largest value any of them asks for."
+        },
+    )
+
+    ollama_max_loaded_models: int = field(
+        default=0,
+        metadata={
+            "description": "How many models the Ollama server can keep loaded at "
+            "once. Roles whose Ollama model would not fit next to the captain's "
+            "and the earlier roles' models use the captain's model instead. "
+            "0 lets every role use its own model."
+        },
+    )
+
+    guess_throttle_after: int = field(
+        default=5,
+        metadata={
+            "description": "Number of wrong weapons key guesses after which further "
+            "wrong guesses get a canned captain reaction instead of a model call. "
+            "Set to 0 to disable guess throttling."
+        },
+    )
+
+    guess_rate_limit: int = field(
+        default=3,
+        metadata={
+            "description": "Once throttled, the most guesses allowed within "
+            "`guess_rate_window_seconds` before the console locks."
+        },
+    )
+
+    guess_rate_window_seconds: float = field(
+        default=60.0,
+        metadata={
+            "description": "Length of the sliding window used to rate limit guesses."
+        },
+    )
+
+    guess_cooldown_seconds: float = field(
+        default=120.0,
+        metadata={
+            "description": "How long the console stays locked after the guess rate "
+            "limit is exceeded. Guesses made while locked are not checked."
+        },
+    )
+
+    guess_throttle_action: str = field(
+        default="canned",
+        metadata={
+            "description": "How throttled wrong guesses are answered. This can be "
+            "canned (a rotating pre-written captain reaction) or reject (a console "
+            "lockout notice)."
+        },
+    )
+
+    token_encoding: str = field(
+        default="o200k_base",
+        metadata={
+            "description": "tiktoken encoding used to count tokens for the token "
+            "limits. Empty, or an encoding that cannot be loaded, falls back to "
+            "estimating four characters per token."
+        },
+    )
+
+    max_message_tokens: int = field(
+        default=0,
+        metadata={
+            "description": "Most tokens a player message may have when it reaches "
+            "the model. Set to 0 for no limit."
+        },
+    )
+
+    max_thread_tokens: int = field(
+        default=0,
+        metadata={
+            "description": "Most input and output tokens a thread may spend in "
+            "total. A turn that would go over it is answered without the model. "
+            "Set to 0 for no limit."
+        },
+    )
+
+    token_limit_action: str = field(
+        default="reject",
+        metadata={
+            "description": "What happens when a token limit is hit. This can be "
+            "truncate (cut an over-long message down to max_message_tokens), reject "
+            "(answer with a notice instead of the model) or end (answer with a "
+            "notice and end the game, so the next game starts with a fresh budget); "
+            "truncate rejects turns over the thread limit. "
+            "An over-long message is dropped from the history unless it is "
+            "truncated."
+        },
+    )
+
+    response_cache: str = field(
+        default="off",
+        metadata={
+            "description": "Answer the opening turns of a game from cached captain "
+            "replies. This can be off, exact (the same normalized message, after the "
+            "same earlier messages) or semantic (also the nearest similar message)."
+        },
+    )
+
+    response_cache_turns: int = field(
+        default=3,
+        metadata={
+            "description": "Player messages into a game that the response cache "
+            "still answers."
+        },
+    )
+
+    response_cache_similarity: float = field(
+        default=0.85,
+        metadata={
+            "description": "Least cosine similarity between two messages' embeddings "
+            "for the semantic response cache to treat them as the same question."
+        },
+    )
+
+    response_cache_variants: int = field(
+        default=3,
+        metadata={
+            "description": "Different model replies the response cache collects "
+            "for a message before serving them in rotation."
+        },
+    )
+
+    response_cache_ttl_seconds: float = field(
+        default=3600.0,
+        metadata={
+            "description": "Seconds a cached reply may be served after it is first "
+            "stored."
+        },
+    )
+
+    history_token_budget: int = field(
+        default=3000,
+        metadata={
+            "description": "Approximate token budget for the conversation history "
+            "sent to the model each turn. Set to 0 to always send the full history."
+        },
+    )
+
+    history_keep_last_turns: int = field(
+        default=8,
+        metadata={
+            "description": "Number of most recent turns sent to the model verbatim. "
+            "Older turns are folded into a rolling summary."
+        },
+    )
+
+    history_window_step: int = field(
+        default=4,
+        metadata={
+            "description": "Advance the verbatim window this many turns at a time "
+            "rather than every turn, so the prompt prefix stays the same between "
+            "steps and can be served from the provider's prompt cache."
+        },
+    )
+
+    history_summary_batch_turns: int = field(
+        default=4,
+        metadata={
+            "description": "Number of turns that must fall out of the verbatim "
+            "window before the rolling summary is updated."
+        },
+    )
+
+    history_summary_max_words: int = field(
+        default=200,
+        metadata={
+            "description": "Maximum length of the rolling summary, in words."
+        },
+    )
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
@@ -1,7 +1,13 @@
+import logging
 from typing import Literal
 
+from langchain_core.runnables import RunnableConfig
+
+from react_agent.configuration import Configuration
 from react_agent.state import State
 
+logger = logging.getLogger(__name__)
+
 def is_start_of_game(state: State) -> Literal["setup_game", "check_for_weapons_key"]:
     """Determine if a new game is being started.
 
@@ -14,10 +20,12 @@ def is_start_of_game(state: State) -> Literal["setup_game", "check_for_weapons_k
     Returns:
         str: The name of the next node to call ("setup_game" or "check_for_weapons_key").
     """
-    print(state.is_start_of_game)
+    logger.debug("is_start_of_game=%s", state.is_start_of_game)
     return "setup_game" if state.is_start_of_game else "check_for_weapons_key"
 
-def is_weapons_key_guessed(state: State) -> Literal["call_model", "won_game", "incorrect_weapons_key"]:
+def is_weapons_key_guessed(
+    state: State,
+) -> Literal["call_model", "won_game", "incorrect_weapons_key", "throttled_weapons_key"]:
      """Determine if a weapons key guess has been attempted and if the 
      guess was correct or incorrect
 
@@ -25,9 +33,13 @@ def is_weapons_key_guessed(state: State) -> Literal["call_model", "won_game", "i
         state (State): The current state of the conversation.
 
     Returns:
-        str: The name of the next node to call ("call_model", "won_game", "incorrect_weapons_key").
+        str: The name of the next node to call ("call_model", "won_game",
+            "incorrect_weapons_key", "throttled_weapons_key").
     """
      
+     if state.is_guess_throttled:
+          return "throttled_weapons_key"
+
      if state.user_discovered_weapons_key is None:
           return "call_model"
      
@@ -35,4 +47,21 @@ def is_weapons_key_guessed(state: State) -> Literal["call_model", "won_game", "i
           return "won_game"
      else:
           return "incorrect_weapons_key"
-          
\ No newline at end of file
+
+def route_incoming_message(
+    state: State, config: RunnableConfig
+) -> Literal["check_incoming_message", "speculative_call_model"]:
+    """Choose between the sequential and speculative extra hard turn.
+
+    Args:
+        state (State): The current state of the conversation.
+        config (RunnableConfig): Configuration for the model run.
+
+    Returns:
+        str: The name of the next node to call ("check_incoming_message" or
+            "speculative_call_model").
+    """
+    configuration = Configuration.from_runnable_config(config)
+    if configuration.speculative_guard:
+        return "speculative_call_model"
+    return "check_incoming_message"
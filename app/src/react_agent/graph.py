@@ -2,39 +2,54 @@
 
 Works with a chat model with tool calling support.
 """
+import threading
+from typing import Any, Callable
+
 from langgraph.graph import StateGraph
+from langgraph.graph.state import CompiledStateGraph
 
 from react_agent.configuration import Configuration
-from react_agent.edges import is_start_of_game, is_weapons_key_guessed
+from react_agent.instrumentation import instrument_edge, instrument_node
+from react_agent.metrics import start_metrics_server_from_env
+from react_agent.edges import (
+    is_start_of_game,
+    is_weapons_key_guessed,
+    route_incoming_message,
+)
 from react_agent.nodes import (
     call_model, 
     check_incoming_message, 
     setup_game,
     check_for_weapons_key,
     incorrect_weapons_key,
+    speculative_call_model,
+    throttled_weapons_key,
     won_game
 )
-from react_agent.prompts import WARN_CAPTAIN_PROMPT, MALICIOUS_WARNING_PROMPT
 from react_agent.state import InputState, State
-from react_agent.tools import TOOLS
-from react_agent.utils import load_chat_model
+
+_CompiledGraph = CompiledStateGraph[State, Any, Any, Any]
+
+# Serve Prometheus metrics when REACT_AGENT_METRICS_PORT is set
+start_metrics_server_from_env()
 
 # Define a new graph
 builder = StateGraph(State, input=InputState, config_schema=Configuration)
 
 # Define the main node
-builder.add_node(call_model)
-builder.add_node(setup_game)
-builder.add_node(check_for_weapons_key)
-builder.add_node(incorrect_weapons_key)
-builder.add_node(won_game)
+builder.add_node(instrument_node(call_model))
+builder.add_node(instrument_node(setup_game))
+builder.add_node(instrument_node(check_for_weapons_key))
+builder.add_node(instrument_node(incorrect_weapons_key))
+builder.add_node(instrument_node(throttled_weapons_key))
+builder.add_node(instrument_node(won_game))
 
 # Add a conditional edge to determine the next step after `call_model`
 builder.add_conditional_edges(
     "__start__",
     # After call_model finishes running, the next node(s) are scheduled
     # based on the output from route_model_output
-    is_start_of_game,
+    instrument_edge(is_start_of_game),
 )
 
 builder.add_edge("setup_game", "check_for_weapons_key")
@@ -42,7 +57,7 @@ builder.add_edge("setup_game", "check_for_weapons_key")
 # Checks if the weapons key was guesses
 builder.add_conditional_edges(
     "check_for_weapons_key",
-    is_weapons_key_guessed
+    instrument_edge(is_weapons_key_guessed)
 )
 
 # Add a normal edge from `tools` to `call_model`
@@ -50,15 +65,18 @@ builder.add_conditional_edges(
 # builder.add_edge("tools", "call_model")
 builder.add_edge("call_model", "__end__")
 builder.add_edge("incorrect_weapons_key", "__end__")
+builder.add_edge("throttled_weapons_key", "__end__")
 builder.add_edge("won_game", "__end__")
 
 # Compile the builder into an executable graph
 # You can customize this by adding interrupt points for state updates
-graph = builder.compile(
-    interrupt_before=[],  # Add node names here to update state before they're called
-    interrupt_after=[],  # Add node names here to update state after they're called
-)
-graph.name = "Game Agent"  # This customizes the name in LangSmith
+def _compile_graph() -> _CompiledGraph:
+    compiled = builder.compile(
+        interrupt_before=[],  # Add node names here to update state before they're called
+        interrupt_after=[],  # Add node names here to update state after they're called
+    )
+    compiled.name = "Game Agent"  # This customizes the name in LangSmith
+    return compiled
 
 """
 Below is the implementation of the Extra Hard version of the game.
@@ -69,20 +87,45 @@ are vetted, and malicious ones are tagged with a warning message.
 extra_hard_builder = StateGraph(State, input=InputState, config_schema=Configuration)
 
 # Define the main node
-extra_hard_builder.add_node(call_model)
-extra_hard_builder.add_node(check_incoming_message)
+extra_hard_builder.add_node(instrument_node(call_model))
+extra_hard_builder.add_node(instrument_node(check_incoming_message))
+extra_hard_builder.add_node(instrument_node(speculative_call_model))
 
-# Set the entrypoint as `call_model`
-# This means that this node is the first one called
-extra_hard_builder.add_edge("__start__", "check_incoming_message")
+# Vet the message first, or vet it while the captain is already answering
+# when `speculative_guard` is enabled
+extra_hard_builder.add_conditional_edges(
+    "__start__", instrument_edge(route_incoming_message)
+)
 extra_hard_builder.add_edge("check_incoming_message", "call_model")
 
 extra_hard_builder.add_edge("call_model", "__end__")
+extra_hard_builder.add_edge("speculative_call_model", "__end__")
 
 # Compile the extra_hard_builder into an executable graph
 # You can customize this by adding interrupt points for state updates
-extra_hard_graph = extra_hard_builder.compile(
-    interrupt_before=[],  # Add node names here to update state before they're called
-    interrupt_after=[],  # Add node names here to update state after they're called
-)
-extra_hard_graph.name = "Extra Hard Game Agent"  # This customizes the name in LangSmith
\ No newline at end of file
+def _compile_extra_hard_graph() -> _CompiledGraph:
+    compiled = extra_hard_builder.compile(
+        interrupt_before=[],  # Add node names here to update state before they're called
+        interrupt_after=[],  # Add node names here to update state after they're called
+    )
+    compiled.name = "Extra Hard Game Agent"  # This customizes the name in LangSmith
+    return compiled
+
+
+# `graph` and `extra_hard_graph` are compiled on first access, so a process
+# that only serves one of them never pays for compiling the other.
+_COMPILERS: dict[str, Callable[[], _CompiledGraph]] = {
+    "graph": _compile_graph,
+    "extra_hard_graph": _compile_extra_hard_graph,
+}
+_compile_lock = threading.Lock()
+
+
+def __getattr__(name: str) -> Any:
+    compile_graph = _COMPILERS.get(name)
+    if compile_graph is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _compile_lock:
+        if name not in globals():
+            globals()[name] = compile_graph()
+    return globals()[name]
@@ -0,0 +1,155 @@
+"""Timing and routing instrumentation for graph nodes and edges.
+
+`instrument_node` and `instrument_edge` wrap the functions registered in
+`react_agent.graph`. The wrappers keep the wrapped function's name and
+signature, so LangGraph still names the node after it, passes `config` only
+when the function asks for it, and draws edges from its `Literal` return type.
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import logging
+import time
+from typing import Any, Callable, TypeVar
+
+from react_agent.memory import estimate_prompt_tokens, estimate_tokens
+from react_agent.metrics import (
+    LATENCY_BUCKETS,
+    METRICS,
+    RATIO_BUCKETS,
+    TOKEN_BUCKETS,
+    estimate_cost,
+)
+from react_agent.profiling import attach_to_running_loop, register_node
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def instrument_node(func: F) -> F:
+    """Record the wall time of every run of the node `func`.
+
+    The node is also registered with the profiler, which recognises its frames,
+    and the first run of an async node attaches the profiler to its loop.
+    """
+    name = func.__name__
+    register_node(func, name)
+
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            attach_to_running_loop()
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                METRICS.observe(
+                    "react_agent_node_seconds", time.perf_counter() - start, node=name
+                )
+
+        return async_wrapper  # type: ignore[return-value]
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            METRICS.observe(
+                "react_agent_node_seconds", time.perf_counter() - start, node=name
+            )
+
+    return wrapper  # type: ignore[return-value]
+
+
+def instrument_edge(func: F) -> F:
+    """Count the routing decisions made by the conditional edge `func`."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        decision = func(*args, **kwargs)
+        METRICS.increment(
+            "react_agent_edge_decisions_total", edge=name, decision=str(decision)
+        )
+        return decision
+
+    return wrapper  # type: ignore[return-value]
+
+
+def record_model_call(
+    node: str,
+    provider: str,
+    model: str,
+    seconds: float,
+    messages: Any,
+    response: Any,
+) -> None:
+    """Record latency, token counts and estimated cost of one model call.
+
+    Token counts come from the response's `usage_metadata`; providers that do
+    not report usage are estimated from the message text. Prompt tokens the
+    provider served from its prompt cache are counted separately, and their
+    share of the prompt is recorded per call.
+    """
+    if not METRICS.enabled:
+        return
+    usage = getattr(response, "usage_metadata", None) or {}
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read") or 0
+    input_tokens = usage.get("input_tokens")
+    if input_tokens is None:
+        input_tokens = estimate_prompt_tokens(messages)
+    output_tokens = usage.get("output_tokens")
+    if output_tokens is None:
+        output_tokens = estimate_tokens(response)
+    labels = {"node": node, "provider": provider, "model": model}
+    METRICS.observe("react_agent_llm_seconds", seconds, LATENCY_BUCKETS, **labels)
+    METRICS.increment("react_agent_llm_calls_total", 1, **labels)
+    METRICS.observe(
+        "react_agent_llm_input_tokens", input_tokens, TOKEN_BUCKETS, **labels
+    )
+    METRICS.observe(
+        "react_agent_llm_output_tokens", output_tokens, TOKEN_BUCKETS, **labels
+    )
+    cache_ratio = cached_tokens / input_tokens if input_tokens else 0.0
+    METRICS.increment(
+        "react_agent_llm_cached_input_tokens_total", cached_tokens, **labels
+    )
+    METRICS.observe(
+        "react_agent_llm_prompt_cache_ratio", cache_ratio, RATIO_BUCKETS, **labels
+    )
+    logger.debug(
+        "%s: %d of %d prompt tokens cached, %.3fs",
+        node,
+        cached_tokens,
+        input_tokens,
+        seconds,
+    )
+    cost = estimate_cost(provider, model, input_tokens, output_tokens)
+    if cost:
+        METRICS.increment("react_agent_llm_cost_usd_total", cost, **labels)
+
+
+def record_token_usage(
+    node: str, thread_tokens: int, max_thread_tokens: int = 0
+) -> None:
+    """Record a thread's total tokens after a model call, and its budget share."""
+    METRICS.observe("react_agent_thread_tokens", thread_tokens, TOKEN_BUCKETS, node=node)
+    if max_thread_tokens > 0:
+        METRICS.observe(
+            "react_agent_thread_budget_used_ratio",
+            min(thread_tokens / max_thread_tokens, 1.0),
+            RATIO_BUCKETS,
+            node=node,
+        )
+
+
+def record_token_limit(node: str, limit: str, action: str) -> None:
+    """Count a turn stopped or truncated by a token limit."""
+    METRICS.increment(
+        "react_agent_token_limits_total", node=node, limit=limit, action=action
+    )
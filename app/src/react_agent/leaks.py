@@ -0,0 +1,236 @@
+"""Incremental detection of the secret key in model output.
+
+The secret is compiled once into a deterministic automaton over a canonical
+alphabet, covering the key forwards and reversed. Text is folded on the fly:
+case is ignored, common leetspeak substitutions map back to letters, and
+spacing or punctuation between characters is skipped. A second automaton runs
+over spelled-out letters ("bee ay en ...", "bravo alpha ..."). Both advance by
+a single table lookup per character, so chunks can be scanned as they stream.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+# Characters that stand in for letters in leetspeak. Letters that are easily
+# swapped for one another share a canonical form.
+_CANONICAL = {
+    "0": "o",
+    "1": "i",
+    "l": "i",
+    "!": "i",
+    "|": "i",
+    "3": "e",
+    "4": "a",
+    "@": "a",
+    "5": "s",
+    "$": "s",
+    "7": "t",
+    "+": "t",
+    "8": "b",
+    "9": "g",
+}
+
+_LETTER_NAMES = {
+    "a": "a", "ay": "a", "alpha": "a", "alfa": "a",
+    "b": "b", "bee": "b", "be": "b", "bravo": "b",
+    "c": "c", "cee": "c", "see": "c", "sea": "c", "charlie": "c",
+    "d": "d", "dee": "d", "delta": "d",
+    "e": "e", "ee": "e", "echo": "e",
+    "f": "f", "ef": "f", "eff": "f", "foxtrot": "f",
+    "g": "g", "gee": "g", "golf": "g",
+    "h": "h", "aitch": "h", "haitch": "h", "hotel": "h",
+    "i": "i", "eye": "i", "india": "i",
+    "j": "j", "jay": "j", "juliet": "j", "juliett": "j",
+    "k": "k", "kay": "k", "kilo": "k",
+    "l": "l", "el": "l", "ell": "l", "lima": "l",
+    "m": "m", "em": "m", "mike": "m",
+    "n": "n", "en": "n", "november": "n",
+    "o": "o", "oh": "o", "oscar": "o",
+    "p": "p", "pee": "p", "papa": "p",
+    "q": "q", "cue": "q", "queue": "q", "quebec": "q",
+    "r": "r", "ar": "r", "are": "r", "romeo": "r",
+    "s": "s", "es": "s", "ess": "s", "sierra": "s",
+    "t": "t", "tee": "t", "tea": "t", "tango": "t",
+    "u": "u", "you": "u", "uniform": "u",
+    "v": "v", "vee": "v", "victor": "v",
+    "w": "w", "doubleu": "w", "whiskey": "w",
+    "x": "x", "ex": "x", "xray": "x",
+    "y": "y", "why": "y", "wye": "y", "yankee": "y",
+    "z": "z", "zee": "z", "zed": "z", "zulu": "z",
+}  # fmt: skip
+
+_MAX_WORD = max(map(len, _LETTER_NAMES))
+
+# Per-character fold results, filled in as new characters are seen.
+_FOLD: dict[str, Optional[str]] = {}
+
+
+def canonical_char(char: str) -> Optional[str]:
+    """Fold one character into the detector alphabet, or None to skip it."""
+    char = char.lower()
+    char = _CANONICAL.get(char, char)
+    return char if char.isascii() and char.isalnum() else None
+
+
+def canonical_text(text: str) -> str:
+    """Fold a whole string into the detector alphabet."""
+    return "".join(c for c in map(canonical_char, text) if c is not None)
+
+
+class LeakAutomaton:
+    """A dense DFA recognizing the canonical secret or its reverse."""
+
+    def __init__(self, secret: str) -> None:
+        """Compile `secret` and its reverse into the transition table."""
+        pattern = canonical_text(secret)
+        self.length = len(pattern)
+        patterns = {pattern, pattern[::-1]} if pattern else set()
+        alphabet = sorted({c for p in patterns for c in p})
+
+        # Build the Aho-Corasick trie, then close it under failure links into
+        # a full transition table so each step is a single lookup.
+        goto: list[dict[str, int]] = [{}]
+        accepting = [False]
+        for word in patterns:
+            state = 0
+            for char in word:
+                if char not in goto[state]:
+                    goto.append({})
+                    accepting.append(False)
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            accepting[state] = True
+
+        fail = [0] * len(goto)
+        table: list[dict[str, int]] = [dict() for _ in goto]
+        order = [0]
+        for state in order:
+            for char in alphabet:
+                child = goto[state].get(char)
+                if child is not None:
+                    fail[child] = table[fail[state]][char] if state else 0
+                    accepting[child] = accepting[child] or accepting[fail[child]]
+                    table[state][char] = child
+                    order.append(child)
+                else:
+                    table[state][char] = table[fail[state]][char] if state else 0
+        self.table = table
+        self.accepting = accepting
+
+
+@lru_cache(maxsize=256)
+def leak_automaton(secret: str) -> LeakAutomaton:
+    """Return the automaton for `secret`, compiling it on first use."""
+    return LeakAutomaton(secret)
+
+
+class LeakScanner:
+    """Scans one stream of text for the secret, chunk by chunk."""
+
+    def __init__(self, secret: str) -> None:
+        """Start scanning a new stream for `secret`."""
+        self._automaton = leak_automaton(secret)
+        self._state = 0
+        self._spelled_state = 0
+        self._word: list[str] = []
+        self._word_overflow = False
+        # Whether each of the last `length` matched characters began a word,
+        # so a match hidden inside ordinary words ("urban anatomy") is ignored.
+        self._starts = [False] * max(self._automaton.length, 1)
+        self._position = 0
+        self._previous_skipped = True
+        self.leaked = False
+        self.scanned = 0
+
+    def feed(self, text: str) -> bool:
+        """Scan the next piece of text; return True once the secret has appeared."""
+        if self.leaked or not self._automaton.length:
+            return self.leaked
+        automaton = self._automaton
+        table, accepting = automaton.table, automaton.accepting
+        length = automaton.length
+        starts, word = self._starts, self._word
+        state, spelled = self._state, self._spelled_state
+        position, previous_skipped = self._position, self._previous_skipped
+        self.scanned += len(text)
+        for raw in text:
+            try:
+                char = _FOLD[raw]
+            except KeyError:
+                char = _FOLD[raw] = canonical_char(raw)
+            if char is None:
+                previous_skipped = True
+                if word or self._word_overflow:
+                    spelled = self._end_word(spelled, table, accepting)
+                    if spelled < 0:
+                        return self._hit()
+                continue
+
+            starts[position % length] = previous_skipped
+            position += 1
+            previous_skipped = False
+            state = table[state].get(char, 0)
+            if accepting[state] and starts[position % length]:
+                return self._hit()
+
+            if raw.isalpha():
+                if len(word) < _MAX_WORD:
+                    word.append(raw)
+                else:
+                    self._word_overflow = True
+        self._state, self._spelled_state = state, spelled
+        self._position, self._previous_skipped = position, previous_skipped
+        return False
+
+    def finish(self) -> bool:
+        """Flush the last word; return True if the secret has appeared."""
+        if not self.leaked and self._automaton.length:
+            automaton = self._automaton
+            spelled = self._end_word(
+                self._spelled_state, automaton.table, automaton.accepting
+            )
+            if spelled < 0:
+                return self._hit()
+        return self.leaked
+
+    def _end_word(
+        self, spelled: int, table: list[dict[str, int]], accepting: list[bool]
+    ) -> int:
+        if not self._word and not self._word_overflow:
+            return spelled
+        letter = (
+            None
+            if self._word_overflow
+            else _LETTER_NAMES.get("".join(self._word).lower())
+        )
+        self._word.clear()
+        self._word_overflow = False
+        if letter is None:
+            return 0
+        spelled = table[spelled].get(canonical_char(letter) or "", 0)
+        return -1 if accepting[spelled] else spelled
+
+    def _hit(self) -> bool:
+        self.leaked = True
+        return True
+
+
+def contains_secret(text: str, secret: str) -> bool:
+    """Return True if `text` reveals `secret` in any form the scanner knows."""
+    scanner = LeakScanner(secret)
+    return scanner.feed(text) or scanner.finish()
+
+
+@dataclass
+class LeakStats:
+    """Counters for the output-side leak detector."""
+
+    responses: int = 0
+    leaks: int = 0
+    aborted: int = 0
+
+
+LEAK_STATS = LeakStats()
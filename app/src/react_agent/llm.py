@@ -0,0 +1,193 @@
+"""Model invocation shared by the LLM-backed graph nodes."""
+
+from __future__ import annotations
+
+import time
+from contextlib import aclosing
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Mapping, Optional, Sequence, cast
+
+from langchain_core.messages import AIMessage, AIMessageChunk, message_chunk_to_message
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
+from langgraph.constants import TAG_NOSTREAM
+
+from react_agent.instrumentation import record_model_call
+from react_agent.leaks import LEAK_STATS, LeakScanner, contains_secret
+from react_agent.memory import estimate_prompt_tokens
+from react_agent.metrics import STREAMING_STATS
+from react_agent.prompts import LEAK_REDACTED_REPLY
+from react_agent.scheduler import LLM_SCHEDULER, Priority, SchedulerSettings
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+# Providers that only report token usage on a stream when asked to.
+_STREAM_USAGE_PROVIDERS = frozenset({"openai", "anthropic"})
+
+
+async def ainvoke_model(
+    model: BaseChatModel,
+    messages: Sequence[Any],
+    config: Optional[RunnableConfig],
+    *,
+    node: str,
+    provider: str,
+    stream: bool = False,
+    secret_key: Optional[str] = None,
+    leak_action: str = "off",
+    invoke_kwargs: Optional[Mapping[str, Any]] = None,
+    priority: Priority = Priority.INTERACTIVE,
+    limits: Optional[SchedulerSettings] = None,
+) -> AIMessage:
+    """Call `model` and return its reply as a complete `AIMessage`.
+
+    With `stream` set the reply is produced through `astream`, so tokens reach
+    the graph's `messages` stream mode as they are generated, and the chunks
+    are aggregated into the same message a plain `ainvoke` would return.
+    Time-to-first-token and inter-token latency are recorded per node and
+    provider, and every call records its latency, token counts and estimated
+    cost in `METRICS`.
+
+    The call is admitted by `LLM_SCHEDULER` first, so it waits its turn under
+    the provider's rate and concurrency limits and is retried there on 429.
+
+    With `leak_action` set to "flag" or "abort" the reply is scanned for
+    `secret_key`; a leak is marked with `response_metadata["secret_leak"]`.
+    On "abort" the reply is replaced with a refusal, and a streamed reply is
+    cut off as soon as the key appears so no further tokens are generated.
+    Because a token cannot be taken back once it reaches the graph's
+    `messages` stream, an "abort" call is hidden from that stream: its reply
+    is scanned in full and only the checked (or refused) message is sent.
+
+    Args:
+        model: The chat model to call.
+        messages: The prompt.
+        config: The node's runnable config, forwarded for callbacks and tracing.
+        node: The calling node, used to label latency metrics.
+        provider: The model provider, used to label latency metrics.
+        stream: Whether to stream the reply.
+        secret_key: The secret to watch for.
+        leak_action: "off", "flag" or "abort".
+        invoke_kwargs: Extra provider options, such as prompt cache hints.
+        priority: The call's admission class in the scheduler.
+        limits: The provider's scheduler settings; None keeps the last ones.
+    """
+
+    async def call() -> AIMessage:
+        start = time.perf_counter()
+        response = await _ainvoke(
+            model,
+            messages,
+            config,
+            node,
+            provider,
+            stream,
+            secret_key,
+            leak_action,
+            dict(invoke_kwargs or {}),
+        )
+        record_model_call(
+            node,
+            provider,
+            _model_name(model),
+            time.perf_counter() - start,
+            messages,
+            response,
+        )
+        return response
+
+    if limits is not None and not limits.enabled:
+        return await call()
+    return await LLM_SCHEDULER.run(
+        provider,
+        call,
+        priority=priority,
+        tokens=estimate_prompt_tokens(messages),
+        settings=limits,
+        usage=_used_tokens,
+    )
+
+
+def _used_tokens(response: AIMessage) -> Optional[float]:
+    usage = response.usage_metadata
+    return usage["total_tokens"] if usage else None
+
+
+def _model_name(model: BaseChatModel) -> str:
+    return str(
+        getattr(model, "model_name", None) or getattr(model, "model", None) or ""
+    )
+
+
+async def _ainvoke(
+    model: BaseChatModel,
+    messages: Sequence[Any],
+    config: Optional[RunnableConfig],
+    node: str,
+    provider: str,
+    stream: bool,
+    secret_key: Optional[str],
+    leak_action: str,
+    kwargs: dict[str, Any],
+) -> AIMessage:
+    scanner = (
+        LeakScanner(secret_key) if secret_key and leak_action != "off" else None
+    )
+    if scanner is not None and leak_action == "abort":
+        config = merge_configs(config, {"tags": [TAG_NOSTREAM]})
+    if not stream:
+        response = await model.ainvoke(list(messages), config, **kwargs)
+        if scanner is not None:
+            LEAK_STATS.responses += 1
+            if contains_secret(str(response.content), secret_key or ""):
+                return _on_leak(response, leak_action, aborted=False)
+        return response
+
+    if provider in _STREAM_USAGE_PROVIDERS:
+        kwargs["stream_usage"] = True
+
+    aggregate: Optional[AIMessageChunk] = None
+    start = last = time.perf_counter()
+    # Closing the stream early cancels the request, so an aborted reply stops
+    # generating tokens.
+    replies = cast(
+        "AsyncGenerator[AIMessageChunk, None]",
+        model.astream(list(messages), config, **kwargs),
+    )
+    async with aclosing(replies) as chunks:
+        async for chunk in chunks:
+            now = time.perf_counter()
+            if aggregate is None:
+                STREAMING_STATS.observe_first_token(node, provider, now - start)
+                aggregate = chunk
+            else:
+                STREAMING_STATS.observe_inter_token(node, provider, now - last)
+                aggregate = aggregate + chunk
+            last = now
+            if scanner is not None and scanner.feed(str(chunk.content)):
+                if leak_action == "abort":
+                    break
+
+    if aggregate is None:
+        return AIMessage(content="")
+    response = cast(AIMessage, message_chunk_to_message(aggregate))
+    if scanner is not None:
+        LEAK_STATS.responses += 1
+        if scanner.leaked or scanner.finish():
+            return _on_leak(response, leak_action, aborted=leak_action == "abort")
+    return response
+
+
+def _on_leak(response: AIMessage, leak_action: str, aborted: bool) -> AIMessage:
+    LEAK_STATS.leaks += 1
+    metadata = {**response.response_metadata, "secret_leak": True}
+    if leak_action != "abort":
+        return response.model_copy(update={"response_metadata": metadata})
+    if aborted:
+        LEAK_STATS.aborted += 1
+    return AIMessage(
+        content=LEAK_REDACTED_REPLY,
+        id=response.id,
+        response_metadata=metadata,
+        usage_metadata=response.usage_metadata,
+    )
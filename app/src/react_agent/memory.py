@@ -0,0 +1,338 @@
+"""Bounded conversation memory with a rolling summary.
+
+`State.messages` keeps the full transcript, but the model only ever sees a
+window of it: the pinned game events, a summary of everything older than the
+window, and the last few turns verbatim. The summary is refreshed by a
+background task after a response has been returned, and the result is adopted
+into state on the following turn.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Optional, Sequence
+
+from langchain_core.messages import (
+    AnyMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    convert_to_messages,
+)
+from langchain_core.runnables import RunnableConfig
+
+from react_agent.configuration import Configuration
+from react_agent.prompts import (
+    HISTORY_SUMMARY_PROMPT,
+    SUMMARIZE_HISTORY_PROMPT,
+    WEAPONS_KEY_GUESS_PREFIX,
+)
+from react_agent.residency import model_kwargs
+from react_agent.routing import model_for_role
+from react_agent.scheduler import LLM_SCHEDULER, Priority, SchedulerSettings
+from react_agent.utils import get_message_text, load_chat_model
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+logger = logging.getLogger(__name__)
+
+PIN_PREFIX = "pinned:"
+MISSION_PIN = "mission"
+WEAPONS_KEY_PIN = "weapons-key"
+
+_MAX_READY_SUMMARIES = 10_000
+
+
+def pinned_message_id(kind: str) -> str:
+    """Return a message id marking the message as pinned in model history."""
+    return f"{PIN_PREFIX}{kind}:{uuid.uuid4()}"
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    """Cheaply estimate the prompt tokens a message costs."""
+    return len(get_message_text(message)) // 4 + 4
+
+
+def estimate_prompt_tokens(messages: Any) -> int:
+    """Estimate the prompt tokens of anything `convert_to_messages` accepts."""
+    return sum(estimate_tokens(message) for message in convert_to_messages(messages))
+
+
+def _pin_kind(message: AnyMessage) -> Optional[str]:
+    """Return the game event `message` records, or None for an ordinary turn.
+
+    Weapons key guesses count as events so that they are never summarized,
+    but only the redacted notes carrying a pinned id are re-sent to the model.
+    """
+    if message.id and message.id.startswith(PIN_PREFIX):
+        return message.id[len(PIN_PREFIX) :].split(":", 1)[0]
+    if isinstance(message, HumanMessage) and get_message_text(message).startswith(
+        WEAPONS_KEY_GUESS_PREFIX
+    ):
+        return WEAPONS_KEY_PIN
+    return None
+
+
+@dataclass
+class HistoryWindow:
+    """The slice of the transcript sent to the model for one turn."""
+
+    messages: list[AnyMessage]
+    """Pinned events, the summary message and the verbatim turns, in order."""
+
+    window_start: int
+    """Index in `State.messages` of the first message kept verbatim."""
+
+    tokens: int
+    """Estimated prompt tokens of `messages`."""
+
+
+def select_history(
+    messages: Sequence[AnyMessage],
+    summary: str,
+    summarized_count: int,
+    configuration: Configuration,
+) -> HistoryWindow:
+    """Pick the messages the model sees for this turn.
+
+    Args:
+        messages: The full transcript from state.
+        summary: The rolling summary of `messages[:summarized_count]`.
+        summarized_count: How many leading messages the summary covers.
+        configuration: The history policy to apply.
+
+    Returns:
+        HistoryWindow: The selected messages and where the verbatim window starts.
+    """
+    budget = configuration.history_token_budget
+    if budget <= 0:
+        return HistoryWindow(list(messages), 0, sum(map(estimate_tokens, messages)))
+
+    # Only the current game's events are pinned; older games are summarized.
+    game_start = 0
+    for index in range(len(messages) - 1, -1, -1):
+        if _pin_kind(messages[index]) == MISSION_PIN:
+            game_start = index
+            break
+
+    turn_starts = [
+        index
+        for index, message in enumerate(messages)
+        if isinstance(message, HumanMessage)
+    ]
+    keep = max(configuration.history_keep_last_turns, 1)
+    step = max(configuration.history_window_step, 1)
+    # Move the window in whole steps so its first message stays put between them.
+    first_turn = (len(turn_starts) - keep) // step * step
+    window_start = turn_starts[first_turn] if first_turn >= 0 else 0
+
+    events = {
+        index
+        for index in range(game_start, len(messages))
+        if _pin_kind(messages[index]) is not None
+    }
+    # Only the latest note of each kind is pinned, and together they may use
+    # at most half of the budget; the mission is kept regardless.
+    latest: dict[str, int] = {}
+    for index in sorted(events):
+        message_id = messages[index].id
+        if message_id and message_id.startswith(PIN_PREFIX):
+            latest[message_id[len(PIN_PREFIX) :].split(":", 1)[0]] = index
+    pin_budget = budget // 2
+    pinned: list[int] = []
+    pinned_tokens = 0
+    for kind, index in sorted(
+        latest.items(), key=lambda item: (item[0] != MISSION_PIN, -item[1])
+    ):
+        cost = estimate_tokens(messages[index])
+        if kind == MISSION_PIN or pinned_tokens + cost <= pin_budget:
+            pinned.append(index)
+            pinned_tokens += cost
+    pinned.sort()
+    summary_message = (
+        SystemMessage(HISTORY_SUMMARY_PROMPT.format(summary=summary))
+        if summary
+        else None
+    )
+    fixed_tokens = pinned_tokens
+    if summary_message is not None:
+        fixed_tokens += estimate_tokens(summary_message)
+
+    pinned_set = set(pinned)
+
+    def window_tokens(start: int) -> int:
+        return sum(
+            estimate_tokens(messages[index])
+            for index in range(start, len(messages))
+            if index not in pinned_set
+        )
+
+    # Shrink the verbatim window one turn at a time until it fits, but always
+    # keep the turn being answered.
+    turn_cursor = turn_starts.index(window_start) if window_start in turn_starts else 0
+    tokens = fixed_tokens + window_tokens(window_start)
+    while tokens > budget and turn_cursor < len(turn_starts) - 1:
+        turn_cursor += 1
+        window_start = turn_starts[turn_cursor]
+        tokens = fixed_tokens + window_tokens(window_start)
+
+    # Messages between the summary and the window that have not been folded
+    # in yet are kept while the budget allows, newest first.
+    gap: list[int] = []
+    for index in range(window_start - 1, summarized_count - 1, -1):
+        if index in events:
+            continue
+        cost = estimate_tokens(messages[index])
+        if tokens + cost > budget:
+            break
+        gap.append(index)
+        tokens += cost
+    gap.reverse()
+
+    selected: list[AnyMessage] = [
+        messages[index] for index in pinned if index < window_start
+    ]
+    if summary_message is not None:
+        selected.append(summary_message)
+    selected.extend(messages[index] for index in gap)
+    selected.extend(messages[window_start:])
+    return HistoryWindow(selected, window_start, tokens)
+
+
+class SummaryScheduler:
+    """Runs summarization in the background, one task per thread at a time."""
+
+    def __init__(self) -> None:
+        """Start with no summaries running or waiting to be collected."""
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+        self._ready: OrderedDict[str, tuple[int, str]] = OrderedDict()
+
+    def collect(
+        self, thread_id: Optional[str], summarized_count: int
+    ) -> Optional[tuple[int, str]]:
+        """Return a finished summary newer than `summarized_count`, if any."""
+        if thread_id is None:
+            return None
+        result = self._ready.pop(thread_id, None)
+        if result is None or result[0] <= summarized_count:
+            return None
+        return result
+
+    def schedule(
+        self,
+        thread_id: Optional[str],
+        messages: Sequence[AnyMessage],
+        summary: str,
+        summarized_count: int,
+        window_start: int,
+        model: BaseChatModel,
+        configuration: Configuration,
+    ) -> None:
+        """Fold `messages[summarized_count:window_start]` into the summary later.
+
+        Nothing is scheduled without a thread id, while a previous summary for
+        the thread is still running, or when fewer than
+        `history_summary_batch_turns` turns are waiting to be folded in.
+        """
+        if thread_id is None or thread_id in self._tasks:
+            return
+        pending = [
+            message
+            for message in messages[summarized_count:window_start]
+            if _pin_kind(message) is None
+        ]
+        waiting_turns = sum(isinstance(message, HumanMessage) for message in pending)
+        if waiting_turns < configuration.history_summary_batch_turns:
+            return
+        summarizer = model_for_role(configuration, "summarizer")
+        if summarizer is not configuration:
+            model = load_chat_model(
+                summarizer.model_provider,
+                summarizer.model_name,
+                summarizer.ollama_base_url,
+                scheduled=summarizer.scheduler_enabled,
+                **model_kwargs(summarizer),
+            )
+        task = asyncio.create_task(
+            self._summarize(
+                thread_id,
+                pending,
+                summary,
+                window_start,
+                model,
+                configuration.history_summary_max_words,
+                summarizer.model_provider,
+                SchedulerSettings.from_configuration(summarizer),
+            )
+        )
+        self._tasks[thread_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(thread_id, None))
+
+    async def _summarize(
+        self,
+        thread_id: str,
+        pending: list[AnyMessage],
+        summary: str,
+        covered: int,
+        model: BaseChatModel,
+        max_words: int,
+        provider: str,
+        limits: SchedulerSettings,
+    ) -> None:
+        transcript = "\n".join(
+            f"{message.type}: {get_message_text(message)}" for message in pending
+        )
+        prompt = SUMMARIZE_HISTORY_PROMPT.format(
+            max_words=max_words, summary=summary or "(empty)", transcript=transcript
+        )
+        # Imported here because instrumentation depends on this module.
+        from react_agent.instrumentation import record_model_call
+
+        messages = [HumanMessage(prompt)]
+
+        async def call() -> BaseMessage:
+            start = time.perf_counter()
+            response = await model.ainvoke(messages)
+            record_model_call(
+                "summarize_history",
+                provider,
+                str(getattr(model, "model_name", None) or getattr(model, "model", "")),
+                time.perf_counter() - start,
+                messages,
+                response,
+            )
+            return response
+
+        try:
+            response = await LLM_SCHEDULER.run(
+                provider,
+                call,
+                priority=Priority.BACKGROUND,
+                tokens=len(prompt) // 4,
+                settings=limits,
+            )
+        except Exception:
+            logger.warning(
+                "History summarization failed for %s", thread_id, exc_info=True
+            )
+            return
+        self._ready[thread_id] = (covered, get_message_text(response))
+        self._ready.move_to_end(thread_id)
+        while len(self._ready) > _MAX_READY_SUMMARIES:
+            self._ready.popitem(last=False)
+
+
+SUMMARY_SCHEDULER = SummaryScheduler()
+
+
+def thread_id_from_config(config: RunnableConfig) -> Optional[str]:
+    """Return the checkpoint thread id of a run, if it has one."""
+    configurable: dict[str, Any] = config.get("configurable") or {}
+    thread_id = configurable.get("thread_id")
+    return str(thread_id) if thread_id is not None else None
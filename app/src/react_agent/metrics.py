@@ -0,0 +1,500 @@
+"""In-process counters and latency windows for the game runtime."""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyWindow:
+    """Keeps the most recent latency samples and reports percentiles over them."""
+
+    def __init__(self, max_samples: int = 2048) -> None:
+        """Keep up to `max_samples` samples, dropping the oldest first."""
+        self._samples: deque[float] = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        """Record one sample, in seconds."""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        """Return the `q`-th percentile (0-100) of the window, or 0.0 if empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, max(0, round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def __len__(self) -> int:
+        """Return the number of samples kept."""
+        return len(self._samples)
+
+
+@dataclass
+class SpeculationStats:
+    """Outcome counters for the speculative guard/captain mode."""
+
+    hits: int = 0
+    """Turns where the speculative captain response was committed."""
+
+    misses: int = 0
+    """Turns where the guard flagged the message and the captain was rerun."""
+
+    seconds_saved: float = 0.0
+    """Wall-clock saved versus running the guard and captain back to back."""
+
+    wasted_tokens: int = 0
+    """Tokens spent on speculative replies that were discarded."""
+
+    wasted_seconds: float = 0.0
+    """Captain time spent on speculative replies that were discarded."""
+
+    def record(
+        self,
+        hit: bool,
+        sequential_seconds: float,
+        elapsed: float,
+        *,
+        wasted_tokens: int = 0,
+        wasted_seconds: float = 0.0,
+    ) -> None:
+        """Record one speculative turn, and what a discarded reply cost."""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.seconds_saved += sequential_seconds - elapsed
+        self.wasted_tokens += wasted_tokens
+        self.wasted_seconds += wasted_seconds
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of speculative turns whose answer was committed."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def mean_seconds_saved(self) -> float:
+        """Average wall-clock saved per speculative turn."""
+        total = self.hits + self.misses
+        return self.seconds_saved / total if total else 0.0
+
+
+SPECULATION_STATS = SpeculationStats()
+
+
+class StreamingStats:
+    """Time-to-first-token and inter-token latency per (node, provider)."""
+
+    def __init__(self) -> None:
+        """Start with no latency windows; they are created per series on first use."""
+        self.time_to_first_token: dict[tuple[str, str], LatencyWindow] = {}
+        self.inter_token: dict[tuple[str, str], LatencyWindow] = {}
+        self._lock = threading.Lock()
+
+    def _window(
+        self, windows: dict[tuple[str, str], LatencyWindow], node: str, provider: str
+    ) -> LatencyWindow:
+        key = (node, provider)
+        window = windows.get(key)
+        if window is None:
+            with self._lock:
+                window = windows.setdefault(key, LatencyWindow())
+        return window
+
+    def observe_first_token(self, node: str, provider: str, seconds: float) -> None:
+        """Record the delay before the first streamed token of a response."""
+        self._window(self.time_to_first_token, node, provider).observe(seconds)
+
+    def observe_inter_token(self, node: str, provider: str, seconds: float) -> None:
+        """Record the gap between two consecutive streamed tokens."""
+        self._window(self.inter_token, node, provider).observe(seconds)
+
+
+STREAMING_STATS = StreamingStats()
+
+
+# Latency buckets in seconds, spaced roughly x2.5 from 0.5 ms to 60 s.
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)  # fmt: skip
+
+# Token-count buckets for a single model call.
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+# Buckets for fractions such as the share of prompt tokens served from cache.
+RATIO_BUCKETS = (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 1.0)
+
+# USD per million (input, output) tokens, by (provider, model). Dated snapshots
+# use the price of the model they start with. Models that are not listed,
+# including every local Ollama model, are costed at zero.
+MODEL_PRICES: dict[tuple[str, str], tuple[float, float]] = {
+    ("openai", "gpt-4o"): (2.50, 10.00),
+    ("openai", "gpt-4o-mini"): (0.15, 0.60),
+    ("openai", "gpt-4.1"): (2.00, 8.00),
+    ("openai", "gpt-4.1-mini"): (0.40, 1.60),
+    ("anthropic", "claude-3-5-haiku-latest"): (0.80, 4.00),
+    ("anthropic", "claude-3-5-sonnet-latest"): (3.00, 15.00),
+}
+
+
+def estimate_cost(
+    provider: str, model: str, input_tokens: int, output_tokens: int
+) -> float:
+    """Return the estimated USD cost of one model call."""
+    prices = MODEL_PRICES.get((provider, model))
+    if prices is None:
+        # The longest listed name that prefixes `model`, so "gpt-4o-mini-..."
+        # is not priced as "gpt-4o".
+        prefixes = [
+            name for p, name in MODEL_PRICES if p == provider and model.startswith(name)
+        ]
+        prices = MODEL_PRICES[(provider, max(prefixes, key=len))] if prefixes else None
+    input_price, output_price = prices or (0.0, 0.0)
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+class Histogram:
+    """A fixed-bucket histogram in the Prometheus layout.
+
+    Observing costs one binary search and two additions, so it can sit on the
+    hot path of every node.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """Count values into `buckets`, given as ascending upper bounds."""
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Record one value."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate the `q`-th quantile (0-1) by interpolating within a bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for index, count in enumerate(self.counts):
+            upper = self.buckets[index] if index < len(self.buckets) else lower
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return lower
+
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """Histograms, counters and gauges for graph nodes, edges and model calls.
+
+    Series are keyed by metric name and a sorted tuple of label pairs. Set
+    `enabled` to False to turn every `observe`/`increment` into a no-op.
+    """
+
+    def __init__(self) -> None:
+        """Create an enabled registry with no series recorded yet."""
+        self.enabled = True
+        self.histograms: dict[str, dict[Labels, Histogram]] = {}
+        self.counters: dict[str, dict[Labels, float]] = {}
+        self.gauges: dict[str, dict[Labels, float]] = {}
+        self._help: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str) -> None:
+        """Set the HELP line exported for `name`."""
+        self._help[name] = help_text
+
+    def histogram(
+        self, name: str, buckets: tuple[float, ...] = LATENCY_BUCKETS, **labels: str
+    ) -> Histogram:
+        """Return the histogram for `name` and `labels`, creating it if needed."""
+        key = tuple(sorted(labels.items()))
+        series = self.histograms.get(name)
+        histogram = series.get(key) if series is not None else None
+        if histogram is None:
+            with self._lock:
+                series = self.histograms.setdefault(name, {})
+                histogram = series.setdefault(key, Histogram(buckets))
+        return histogram
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        **labels: str,
+    ) -> None:
+        """Record `value` in the histogram for `name` and `labels`."""
+        if self.enabled:
+            self.histogram(name, buckets, **labels).observe(value)
+
+    def increment(self, name: str, amount: float = 1.0, **labels: str) -> None:
+        """Add `amount` to the counter for `name` and `labels`."""
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def counter(self, name: str, **labels: str) -> float:
+        """Return the current value of a counter."""
+        return self.counters.get(name, {}).get(tuple(sorted(labels.items())), 0.0)
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        """Set the gauge for `name` and `labels` to `value`."""
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.gauges.setdefault(name, {})[key] = value
+
+    def gauge(self, name: str, **labels: str) -> float:
+        """Return the current value of a gauge."""
+        return self.gauges.get(name, {}).get(tuple(sorted(labels.items())), 0.0)
+
+    def clear(self) -> None:
+        """Drop every recorded series."""
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+    def render(self) -> str:
+        """Return every series in the Prometheus text exposition format."""
+        lines: list[str] = []
+        for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+            for name, series in sorted(values.items()):
+                self._header(lines, name, kind)
+                for labels, value in sorted(series.items()):
+                    lines.append(
+                        f"{name}{_format_labels(labels)} {_format_value(value)}"
+                    )
+        for name, histograms in sorted(self.histograms.items()):
+            self._header(lines, name, "histogram")
+            for labels, histogram in sorted(histograms.items()):
+                cumulative = 0
+                bounds = [*map(_format_value, histogram.buckets), "+Inf"]
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    bucket_labels = _format_labels(labels + (("le", bound),))
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(
+                    f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}"
+                )
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: list[str], name: str, kind: str) -> None:
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+METRICS = MetricsRegistry()
+METRICS.describe("react_agent_node_seconds", "Wall time of each graph node run.")
+METRICS.describe("react_agent_edge_decisions_total", "Routing decisions per edge.")
+METRICS.describe("react_agent_llm_seconds", "Wall time of each model call.")
+METRICS.describe("react_agent_llm_calls_total", "Model calls per node and model.")
+METRICS.describe("react_agent_llm_input_tokens", "Input tokens per model call.")
+METRICS.describe("react_agent_llm_output_tokens", "Output tokens per model call.")
+METRICS.describe("react_agent_llm_cost_usd_total", "Estimated model spend in USD.")
+METRICS.describe(
+    "react_agent_llm_cached_input_tokens_total",
+    "Input tokens served from the provider's prompt cache.",
+)
+METRICS.describe(
+    "react_agent_llm_prompt_cache_ratio", "Share of each prompt served from cache."
+)
+METRICS.describe("react_agent_llm_hedges_total", "Hedged duplicate model requests.")
+METRICS.describe("react_agent_llm_fallbacks_total", "Requests moved to a fallback model.")
+METRICS.describe(
+    "react_agent_llm_role_routes_total", "Model chosen per role, model and reason."
+)
+METRICS.describe(
+    "react_agent_thread_tokens", "Tokens a thread has spent, after each model call."
+)
+METRICS.describe(
+    "react_agent_thread_budget_used_ratio", "Share of max_thread_tokens spent."
+)
+METRICS.describe(
+    "react_agent_token_limits_total", "Turns truncated or refused by a token limit."
+)
+METRICS.describe(
+    "react_agent_ollama_resident_models", "Models loaded on each Ollama server."
+)
+METRICS.describe("react_agent_ollama_loads_total", "Ollama model preloads, cold or warm.")
+METRICS.describe("react_agent_ollama_load_seconds", "Time to preload an Ollama model.")
+METRICS.describe(
+    "react_agent_ollama_first_token_seconds",
+    "Time to first token on an Ollama model that was cold or warm.",
+)
+METRICS.describe(
+    "react_agent_response_cache_lookups_total",
+    "Opening turns looked up in the response cache: exact, similar or miss.",
+)
+METRICS.describe(
+    "react_agent_response_cache_seconds_saved_total",
+    "Model latency saved by replies served from the response cache.",
+)
+METRICS.describe(
+    "react_agent_response_cache_entries", "Player messages held in the response cache."
+)
+METRICS.describe(
+    "react_agent_event_loop_lag_seconds", "How late the event loop ran its heartbeat."
+)
+METRICS.describe(
+    "react_agent_event_loop_stalls_total",
+    "Times a callback blocked the event loop, by the graph node it ran in.",
+)
+METRICS.describe(
+    "react_agent_node_allocated_bytes", "Live memory allocated under each graph node."
+)
+METRICS.describe(
+    "react_agent_scheduler_queue_depth", "Model calls waiting for admission."
+)
+METRICS.describe("react_agent_scheduler_inflight", "Model calls in flight.")
+METRICS.describe(
+    "react_agent_scheduler_concurrency_limit", "Adaptive limit on concurrent calls."
+)
+METRICS.describe(
+    "react_agent_scheduler_wait_seconds", "Time model calls spent queued."
+)
+METRICS.describe("react_agent_scheduler_shed_total", "Model calls dropped by the scheduler.")
+METRICS.describe(
+    "react_agent_scheduler_rate_limited_total", "Model calls answered with 429."
+)
+
+
+def render_prometheus() -> str:
+    """Render `METRICS` and the runtime stats in Prometheus text format."""
+    lines = [METRICS.render().rstrip("\n")]
+    lines += [
+        "# TYPE react_agent_speculation_total counter",
+        f'react_agent_speculation_total{{outcome="hit"}} {SPECULATION_STATS.hits}',
+        f'react_agent_speculation_total{{outcome="miss"}} {SPECULATION_STATS.misses}',
+        "# TYPE react_agent_speculation_wasted_tokens_total counter",
+        f"react_agent_speculation_wasted_tokens_total {SPECULATION_STATS.wasted_tokens}",
+        "# TYPE react_agent_speculation_wasted_seconds_total counter",
+        "react_agent_speculation_wasted_seconds_total "
+        f"{SPECULATION_STATS.wasted_seconds}",
+    ]
+    for name, windows in (
+        ("react_agent_time_to_first_token_seconds", STREAMING_STATS.time_to_first_token),
+        ("react_agent_inter_token_seconds", STREAMING_STATS.inter_token),
+    ):
+        lines.append(f"# TYPE {name} summary")
+        for (node, provider), window in sorted(windows.items()):
+            for q in (0.5, 0.95, 0.99):
+                labels = _format_labels(
+                    (("node", node), ("provider", provider), ("quantile", str(q)))
+                )
+                lines.append(f"{name}{labels} {window.percentile(q * 100)!r}")
+    return "\n".join(line for line in lines if line) + "\n"
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve `render_prometheus()` at http://host:port/metrics from a daemon thread.
+
+    The ``/profiling`` routes of `react_agent.profiling` are served alongside.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            if self.path.startswith("/profiling"):
+                self._profiling()
+                return
+            if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            self._send(
+                200,
+                "text/plain; version=0.0.4; charset=utf-8",
+                render_prometheus().encode(),
+            )
+
+        def do_POST(self) -> None:  # noqa: N802
+            if not self.path.startswith("/profiling"):
+                self.send_error(404)
+                return
+            self._profiling()
+
+        def _profiling(self) -> None:
+            from react_agent.profiling import handle_request
+
+            self._send(*handle_request(self.command, self.path))
+
+        def _send(self, status: int, content_type: str, body: bytes) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:
+            logger.debug("metrics endpoint: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(
+        target=server.serve_forever, name="react-agent-metrics", daemon=True
+    )
+    thread.start()
+    logger.info("Serving metrics on http://%s:%d/metrics", host, server.server_port)
+    return server
+
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server_from_env() -> Optional[ThreadingHTTPServer]:
+    """Start the metrics endpoint once if `REACT_AGENT_METRICS_PORT` is set.
+
+    `REACT_AGENT_METRICS=0` disables metric collection altogether.
+    """
+    global _metrics_server
+    if os.environ.get("REACT_AGENT_METRICS", "1").lower() in ("0", "false", "off"):
+        METRICS.enabled = False
+        return None
+    port = os.environ.get("REACT_AGENT_METRICS_PORT")
+    if port and _metrics_server is None:
+        host = os.environ.get("REACT_AGENT_METRICS_HOST", "127.0.0.1")
+        _metrics_server = start_metrics_server(int(port), host)
+    return _metrics_server
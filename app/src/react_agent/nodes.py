@@ -1,18 +1,216 @@
-from typing import Dict, List, cast
-
-from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+import zlib
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, AnyMessage, SystemMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig
 
+from react_agent.batching import GUARD_BATCHER
+from react_agent.budget import (
+    atoken_counter,
+    check_message_limit,
+    check_thread_limit,
+    token_usage,
+    truncate_message,
+)
 from react_agent.configuration import Configuration
-from react_agent.prompts import *
-
+from react_agent.guard import classify_message
+from react_agent.instrumentation import record_token_limit, record_token_usage
+from react_agent.llm import ainvoke_model
+from react_agent.memory import (
+    MISSION_PIN,
+    SUMMARY_SCHEDULER,
+    WEAPONS_KEY_PIN,
+    pinned_message_id,
+    select_history,
+    thread_id_from_config,
+)
+from react_agent.metrics import SPECULATION_STATS
+from react_agent.prompting import assemble_prompt, compile_prompt, system_prompt
+from react_agent.residency import model_kwargs
+from react_agent.response_cache import RESPONSE_CACHE, opening_turn
+from react_agent.routing import ainvoke_routed, model_for_role
+from react_agent.scheduler import Priority, SchedulerSettings
+from react_agent.prompts import (
+    CORRECT_GUESS_PROMPT,
+    GUESS_LOCKOUT_MESSAGE,
+    INCORRECT_GUESS_PROMPT,
+    MALICIOUS_WARNING_PROMPT,
+    NEW_GAME_PROMPT,
+    THROTTLED_GUESS_REACTIONS,
+    WARN_CAPTAIN_PROMPT,
+    WEAPONS_KEY_GUESS_PREFIX,
+)
+
+from react_agent.scenarios import SCENARIOS
 from react_agent.state import InputState, State
-from react_agent.utils import load_chat_model
+from react_agent.utils import get_message_text, load_chat_model
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+logger = logging.getLogger(__name__)
+
+def _load_model(configuration: Configuration) -> "BaseChatModel":
+    """Return the shared client for the configured model."""
+    return load_chat_model(
+        configuration.model_provider,
+        configuration.model_name,
+        configuration.ollama_base_url,
+        scheduled=configuration.scheduler_enabled,
+        **model_kwargs(configuration),
+    )
+
+@dataclass
+class _Deferred:
+    """Side effects of a speculative captain run, held until the guard decides."""
+
+    effects: List[Callable[[], None]] = field(default_factory=list)
+    tokens: int = 0
+    """Tokens the run has sent to or received from the model so far."""
+
+    def commit(self) -> None:
+        """Apply the held side effects, once the reply is kept."""
+        for effect in self.effects:
+            effect()
+        self.effects.clear()
+
+async def _ainvoke_with_history(
+    model: "BaseChatModel",
+    system_message: str,
+    messages: Sequence[AnyMessage],
+    state: State,
+    configuration: Configuration,
+    config: RunnableConfig,
+    node: str,
+    trailing: Sequence[AnyMessage] = (),
+    cacheable: bool = False,
+    deferred: Optional[_Deferred] = None,
+) -> tuple[AIMessage, Dict[str, Any]]:
+    """Call the model on a bounded window of `messages`.
+
+    Returns the response and any state update for the rolling summary, the
+    thread's token usage, a detected secret leak, or a message truncated or
+    dropped by a token limit. The summary itself is refreshed in the background once the response is ready.
+    A turn over a token limit is answered with a notice instead of the model.
+    If `cacheable`, an opening turn may be answered from the response cache.
+    With `deferred`, the reply is not streamed, and storing it in the response
+    cache, recording its token usage and scheduling the summary are left to
+    `deferred.commit()`.
+    """
+    counter = await atoken_counter(configuration.token_encoding)
+    check = check_message_limit(messages, configuration, counter)
+    messages = check.messages
+    thread_id = thread_id_from_config(config)
+    summary, summarized_count = state.history_summary, state.history_summarized_count
+    update: Dict[str, Any] = {}
+    adopted = SUMMARY_SCHEDULER.collect(thread_id, summarized_count)
+    if adopted is not None:
+        summarized_count, summary = adopted
+        update = {
+            "history_summary": summary,
+            "history_summarized_count": summarized_count,
+        }
+
+    update.update(check.update)
+
+    window = select_history(messages, summary, summarized_count, configuration)
+    history = [*window.messages, *trailing]
+    prompt_tokens = counter.count_text(system_message) + counter.count_messages(
+        history
+    )
+    if check.reply is None:
+        if check.limit:
+            record_token_limit(node, check.limit, configuration.token_limit_action)
+        check = check_thread_limit(state, prompt_tokens, configuration)
+        update.update(check.update)
+    if check.reply is not None:
+        record_token_limit(node, check.limit, configuration.token_limit_action)
+        return AIMessage(check.reply), update
+
+    turn = opening_turn(messages, system_message, configuration) if cacheable else None
+    similarity = (
+        configuration.response_cache_similarity
+        if configuration.response_cache == "semantic"
+        else 1.0
+    )
+    if turn is not None:
+        reply = RESPONSE_CACHE.lookup(
+            turn, similarity=similarity, variants=configuration.response_cache_variants
+        )
+        if reply is not None:
+            return AIMessage(reply), update
+
+    async def ask(backend: Configuration, primary: bool) -> AIMessage:
+        prompt = assemble_prompt(system_message, history, backend, thread_id)
+        return await ainvoke_model(
+            _load_model(backend),
+            prompt.messages,
+            config,
+            node=node,
+            provider=backend.model_provider,
+            # Only the first request streams, so a hedge or fallback cannot
+            # interleave its tokens with another reply's.
+            stream=configuration.stream_responses and primary and deferred is None,
+            secret_key=configuration.secret_key,
+            leak_action=configuration.leak_detection,
+            invoke_kwargs=prompt.invoke_kwargs,
+            limits=SchedulerSettings.from_configuration(backend),
+        )
+
+    effects = _Deferred() if deferred is None else deferred
+    effects.tokens += prompt_tokens
+    start = time.perf_counter()
+    response = await ainvoke_routed(configuration, ask, node=node)
+    model_seconds = time.perf_counter() - start
+    output_tokens = counter.count(response)
+    effects.tokens += output_tokens
+    usage = token_usage(state, prompt_tokens, output_tokens)
+    update.update(usage)
+    leaked = bool(response.response_metadata.get("secret_leak"))
+    if leaked:
+        update["is_secret_leaked"] = True
+
+    def commit() -> None:
+        if turn is not None and not leaked and not response.tool_calls:
+            RESPONSE_CACHE.store(
+                turn,
+                get_message_text(response),
+                model_seconds,
+                secret_key=configuration.secret_key,
+                similarity=similarity,
+                ttl=configuration.response_cache_ttl_seconds,
+                variants=configuration.response_cache_variants,
+            )
+        record_token_usage(
+            node,
+            usage["input_tokens"] + usage["output_tokens"],
+            configuration.max_thread_tokens,
+        )
+        SUMMARY_SCHEDULER.schedule(
+            thread_id,
+            messages,
+            summary,
+            summarized_count,
+            window.window_start,
+            model,
+            configuration,
+        )
+
+    effects.effects.append(commit)
+    if deferred is None:
+        effects.commit()
+    return response, update
 
 # Define the function that calls the model
 async def call_model(
     state: State, config: RunnableConfig
-) -> Dict[str, List[AIMessage]]:
+) -> Dict[str, Any]:
     """Call the LLM powering our "agent".
 
     This function prepares the prompt, initializes the model, and processes the response.
@@ -24,49 +222,100 @@ async def call_model(
     Returns:
         dict: A dictionary containing the model's response message.
     """
-    configuration = Configuration.from_runnable_config(config)
+    return await _call_model(state, config)
+
+async def _call_model(
+    state: State, config: RunnableConfig, deferred: Optional[_Deferred] = None
+) -> Dict[str, Any]:
+    """`call_model`, optionally holding its side effects in `deferred`."""
+    configuration = model_for_role(
+        Configuration.from_runnable_config(config), "captain"
+    )
 
     # Initialize the model with tool binding. Change the model or add more tools here.
-    model = load_chat_model(
-        configuration.model_provider, 
-        configuration.model_name,
-        configuration.ollama_base_url
-        )
+    model = _load_model(configuration)
 
-    secret_key = configuration.secret_key
-    # Format the system prompt. Customize this to change the agent's behavior.
-    if configuration.game_difficulty.lower() == 'hard':
-        system_message = configuration.hard_system_prompt.format(secret_key=secret_key)
-    elif configuration.game_difficulty.lower() == 'medium':
-        system_message = configuration.medium_system_prompt.format(secret_key=secret_key)
-    else:
-        system_message = configuration.easy_system_prompt.format(secret_key=secret_key)
+    # The system prompt is compiled once per difficulty and secret key.
+    system_message = system_prompt(configuration)
 
     # Get the model's response
-    response = cast(
-        AIMessage,
-        await model.ainvoke(
-            [{"role": "system", "content": system_message}, *state.messages], config
-        ),
+    response, update = await _ainvoke_with_history(
+        model,
+        system_message,
+        state.messages,
+        state,
+        configuration,
+        config,
+        node="call_model",
+        cacheable=True,
+        deferred=deferred,
     )
 
     # Handle the case when it's the last step and the model still wants to use a tool
     if state.is_last_step and response.tool_calls:
         return {
+            **update,
             "messages": [
+                *update.get("messages", []),
                 AIMessage(
                     id=response.id,
                     content="Sorry, I could not find an answer to your question in the specified number of steps.",
-                )
-            ]
+                ),
+            ],
         }
 
     # Return the model's response as a list to be added to existing messages
-    return {"messages": [response]}
+    return {**update, "messages": [*update.get("messages", []), response]}
+
+async def _is_message_malicious(
+    message: AnyMessage, configuration: Configuration, config: RunnableConfig
+) -> bool:
+    """Classify `message`, asking the guard model only when the local tier is unsure.
+
+    Only the first `max_message_tokens` of the message are classified.
+    """
+    message = truncate_message(
+        message,
+        configuration.max_message_tokens,
+        await atoken_counter(configuration.token_encoding),
+    )
+
+    async def ask_model() -> bool:
+        guard = model_for_role(configuration, "guard")
+
+        if configuration.guard_batching:
+            return await GUARD_BATCHER.classify(get_message_text(message), guard)
+
+        # Format the system prompt. Customize this to change the agent's behavior.
+        system_message = compile_prompt(WARN_CAPTAIN_PROMPT, configuration.secret_key)
+
+        async def ask(backend: Configuration, primary: bool) -> AIMessage:
+            return await ainvoke_model(
+                _load_model(backend),
+                [SystemMessage(system_message), message],
+                config,
+                node="check_incoming_message",
+                provider=backend.model_provider,
+                priority=Priority.GUARD,
+                limits=SchedulerSettings.from_configuration(backend),
+            )
+
+        # Get the model's response
+        response = await ainvoke_routed(guard, ask, node="check_incoming_message")
+
+        return 'malicious' in response.content
+
+    return await classify_message(
+        get_message_text(message),
+        configuration.secret_key,
+        ask_model,
+        use_local=configuration.guard_local_tier,
+        cache_ttl=configuration.guard_cache_ttl_seconds,
+    )
 
 async def check_incoming_message(
     state: State, config: RunnableConfig
-) -> Dict[str, List[AIMessage]]:
+) -> Dict[str, Any]:
     """Checks if the most recent message returns the secret
 
     Args:
@@ -78,35 +327,92 @@ async def check_incoming_message(
     """
     configuration = Configuration.from_runnable_config(config)
 
-    # Initialize the model with tool binding. Change the model or add more tools here.
-    model = load_chat_model(
-        configuration.model_provider, 
-        configuration.model_name,
-        configuration.ollama_base_url
-        )
-
-    # Format the system prompt. Customize this to change the agent's behavior.
-    system_message = WARN_CAPTAIN_PROMPT.format(secret_key=configuration.secret_key)
-
-    # Get the model's response
-    response = cast(
-        AIMessage,
-        await model.ainvoke(
-            [{"role": "system", "content": system_message}, state.messages[-1]], config
-        ),
+    is_incoming_message_malicious = await _is_message_malicious(
+        state.messages[-1], configuration, config
     )
 
-    is_incoming_message_malicious = True if 'malicious' in response.content else False
-
     if is_incoming_message_malicious:
         return {
             "messages": [{"role": "system", "content": MALICIOUS_WARNING_PROMPT}],
             "is_incoming_message_malicious": is_incoming_message_malicious
             }
-    
+    return {}
+
+async def speculative_call_model(
+    state: State, config: RunnableConfig
+) -> Dict[str, Any]:
+    """Run the malicious-message check and the captain's reply concurrently
+
+    The captain's reply is committed if the guard calls the message safe.
+    Otherwise it is cancelled and the captain answers again with
+    `MALICIOUS_WARNING_PROMPT` in view, exactly as in the sequential graph.
+    The speculative reply is not streamed, and its response cache entry,
+    token usage metrics and summary are only recorded once it is committed.
+
+    Args:
+        state (State): The current state of the conversation.
+        config (RunnableConfig): Configuration for the model run.
+
+    Returns:
+        dict: A dictionary containing the model's response message.
+    """
+    configuration = Configuration.from_runnable_config(config)
+    timings: Dict[str, float] = {}
+    deferred = _Deferred()
+
+    async def speculate() -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            return await _call_model(state, config, deferred)
+        finally:
+            timings["captain"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    captain = asyncio.create_task(speculate())
+    try:
+        is_incoming_message_malicious = await _is_message_malicious(
+            state.messages[-1], configuration, config
+        )
+    except BaseException:
+        captain.cancel()
+        raise
+    timings["guard"] = time.perf_counter() - start
+
+    if not is_incoming_message_malicious:
+        result = await captain
+        deferred.commit()
+        SPECULATION_STATS.record(
+            True, timings["guard"] + timings["captain"], time.perf_counter() - start
+        )
+        return result
+
+    captain.cancel()
+    # The discarded reply may already have failed; retrieve it so the error
+    # is not reported as never retrieved.
+    captain.add_done_callback(lambda task: task.cancelled() or task.exception())
+    wasted_seconds = time.perf_counter() - start
+    warning = SystemMessage(MALICIOUS_WARNING_PROMPT)
+    rerun_start = time.perf_counter()
+    result = await call_model(
+        replace(state, messages=[*state.messages, warning]), config
+    )
+    end = time.perf_counter()
+    SPECULATION_STATS.record(
+        False,
+        timings["guard"] + end - rerun_start,
+        end - start,
+        wasted_tokens=deferred.tokens,
+        wasted_seconds=wasted_seconds,
+    )
+    return {
+        **result,
+        "messages": [warning, *result["messages"]],
+        "is_incoming_message_malicious": True,
+    }
+
 async def setup_game(
     state: State, config: RunnableConfig
-) -> Dict[str, List[AIMessage]]:
+) -> Dict[str, Any]:
     """Sets up the game with a new story and task
 
     Args:
@@ -117,15 +423,36 @@ async def setup_game(
         dict: A dictionary containing the game start messages.
     """
 
-    first_message = SystemMessage(NEW_GAME_PROMPT)
+    configuration = Configuration.from_runnable_config(config)
+    if not configuration.scenarios_enabled:
+        first_message = SystemMessage(
+            NEW_GAME_PROMPT, id=pinned_message_id(MISSION_PIN)
+        )
+        return {"messages": [first_message], "is_start_of_game": False}
+
+    SCENARIOS.maybe_reload()
+    book = SCENARIOS.book
+    played = 0 if book.all_played(state.scenarios_played) else state.scenarios_played
+    scenario = book.sample(exclude=played)
+    first_message = SystemMessage(scenario.prompt, id=pinned_message_id(MISSION_PIN))
 
-    return {"messages": [first_message], "is_start_of_game": False}
+    return {
+        "messages": [first_message],
+        "is_start_of_game": False,
+        "scenario_index": scenario.index,
+        "scenarios_played": played | 1 << scenario.index,
+    }
 
 async def check_for_weapons_key(
         state: State, config: RunnableConfig
-) -> Dict[str, bool]:
+) -> Dict[str, Any]:
     """Checks the user input for a correct weapons key guess
 
+    Wrong guesses are counted per thread. Once `guess_throttle_after` wrong
+    guesses have been made, further wrong guesses are answered without the
+    model, and guessing faster than `guess_rate_limit` per window locks the
+    console for `guess_cooldown_seconds`, during which guesses are not checked.
+
     Args:
         state (State): The current state of the conversation.
         config (RunnableConfig): Configuration for the model run.
@@ -137,14 +464,81 @@ async def check_for_weapons_key(
     configuration = Configuration.from_runnable_config(config)
 
     # Grab the last user message
-    last_message = state.messages[-1].content
+    last_message = get_message_text(state.messages[-1])
 
-    if last_message.startswith("WEAPONS KEY GUESS: "):
-        print("incoming_weapons_key_guess")
+    if last_message.startswith(WEAPONS_KEY_GUESS_PREFIX):
+        logger.debug("Incoming weapons key guess")
         weapons_key_guess = last_message.split(":",1)[1].strip().lower()
-        return {"user_discovered_weapons_key": weapons_key_guess == configuration.secret_key.lower()} 
+
+        now = time.time()
+        window = configuration.guess_rate_window_seconds
+        guess_times = [t for t in state.weapons_key_guess_times if now - t < window]
+        guess_times.append(now)
+        guess_times = guess_times[-(configuration.guess_rate_limit + 1):]
+        update: Dict[str, Any] = {"weapons_key_guess_times": guess_times}
+
+        throttling = 0 < configuration.guess_throttle_after <= state.weapons_key_attempts
+        if throttling and len(guess_times) > configuration.guess_rate_limit:
+            update["weapons_key_cooldown_until"] = now + configuration.guess_cooldown_seconds
+        cooldown_until = update.get(
+            "weapons_key_cooldown_until", state.weapons_key_cooldown_until
+        )
+        if now < cooldown_until:
+            return {
+                **update,
+                "weapons_key_attempts": state.weapons_key_attempts + 1,
+                "is_guess_throttled": True,
+            }
+
+        is_correct = _matches_secret(weapons_key_guess, configuration.secret_key)
+        if is_correct:
+            return {**update, "user_discovered_weapons_key": True}
+        return {
+            **update,
+            "user_discovered_weapons_key": False,
+            "weapons_key_attempts": state.weapons_key_attempts + 1,
+            "is_guess_throttled": throttling,
+        }
+    else:
+        return {}
+
+def _matches_secret(guess: str, secret_key: str) -> bool:
+    """Compare a guess to the secret in constant time."""
+    return hmac.compare_digest(
+        hashlib.sha256(guess.encode()).digest(),
+        hashlib.sha256(secret_key.lower().encode()).digest(),
+    )
+
+async def throttled_weapons_key(
+        state: State, config: RunnableConfig
+) -> Dict[str, Any]:
+    """Answer a throttled weapons key guess without calling the model
+
+    Args:
+        state (State): The current state of the conversation.
+        config (RunnableConfig): Configuration for the model run.
+
+    Returns:
+        dict: A dictionary containing the canned captain reaction or the
+            console lockout notice
+    """
+    configuration = Configuration.from_runnable_config(config)
+
+    remaining = state.weapons_key_cooldown_until - time.time()
+    if configuration.guess_throttle_action == "reject" or remaining > 0:
+        content = GUESS_LOCKOUT_MESSAGE.format(seconds=max(int(remaining) + 1, 1))
     else:
-        return
+        # Rotate through the reactions, starting at a different one per thread
+        thread_id = thread_id_from_config(config) or ""
+        offset = zlib.crc32(thread_id.encode())
+        reactions = THROTTLED_GUESS_REACTIONS
+        content = reactions[(offset + state.weapons_key_attempts) % len(reactions)]
+
+    return {
+        "messages": [AIMessage(content)],
+        "user_discovered_weapons_key": None,
+        "is_guess_throttled": False,
+    }
 
 async def incorrect_weapons_key(
         state: State, config: RunnableConfig
@@ -161,53 +555,52 @@ async def incorrect_weapons_key(
             weapons key guess
     """
 
-    incorrect_guess_prompt = SystemMessage(INCORRECT_GUESS_PROMPT)
+    incorrect_guess_prompt = SystemMessage(
+        INCORRECT_GUESS_PROMPT, id=pinned_message_id(WEAPONS_KEY_PIN)
+    )
 
-    configuration = Configuration.from_runnable_config(config)
+    configuration = model_for_role(
+        Configuration.from_runnable_config(config), "reaction"
+    )
 
     # Initialize the model with tool binding. Change the model or add more tools here.
-    model = load_chat_model(
-        configuration.model_provider, 
-        configuration.model_name,
-        configuration.ollama_base_url
-        )
+    model = _load_model(configuration)
 
-    secret_key = configuration.secret_key
-    # Format the system prompt. Customize this to change the agent's behavior.
-    if configuration.game_difficulty.lower() == 'hard':
-        system_message = configuration.hard_system_prompt.format(secret_key=secret_key)
-    elif configuration.game_difficulty.lower() == 'medium':
-        system_message = configuration.medium_system_prompt.format(secret_key=secret_key)
-    else:
-        system_message = configuration.easy_system_prompt.format(secret_key=secret_key)
+    # The system prompt is compiled once per difficulty and secret key.
+    system_message = system_prompt(configuration)
 
-    user_weapons_guess = state.messages.pop()
+    # The guess itself is left out of the model's view; the captain only
+    # learns that a wrong guess was made.
+    *history, user_weapons_guess = state.messages
 
     if not isinstance(user_weapons_guess, HumanMessage):
-        print((
-            "WARNING: Expected to remove weapons guess, instead removed: "
-            f"{user_weapons_guess.__dict__}"
-            ))
+        logger.warning(
+            "Expected to remove weapons guess, instead removed: %r",
+            user_weapons_guess,
+        )
 
-    print(state.messages[-1].__dict__)
+    logger.debug("Last message before the guess: %r", history[-1] if history else None)
     # Get the model's response
-    response = cast(
-        AIMessage,
-        await model.ainvoke(
-            [
-                {"role": "system", "content": system_message}, 
-                *state.messages, 
-                incorrect_guess_prompt
-            ], 
-            config
-        ),
+    response, update = await _ainvoke_with_history(
+        model,
+        system_message,
+        history,
+        state,
+        configuration,
+        config,
+        node="incorrect_weapons_key",
+        trailing=[incorrect_guess_prompt],
     )
 
-    return {"messages": [incorrect_guess_prompt,response], "user_discovered_weapons_key": None}
+    return {
+        **update,
+        "messages": [*update.get("messages", []), incorrect_guess_prompt, response],
+        "user_discovered_weapons_key": None,
+    }
 
 async def won_game(
         state: State, config: RunnableConfig
-) -> Dict[str, List[AIMessage]]:
+) -> Dict[str, Any]:
     """The user has won the game! Send the congrats message
 
     Args:
@@ -220,7 +613,12 @@ async def won_game(
 
     if state.user_discovered_weapons_key:
         win_message = AIMessage(CORRECT_GUESS_PROMPT)
-        return {"messages": [win_message], "is_start_of_game": True}
-    
-    return
+        return {
+            "messages": [win_message],
+            "is_start_of_game": True,
+            "user_discovered_weapons_key": None,
+            "weapons_key_attempts": 0,
+        }
+
+    return {}
 
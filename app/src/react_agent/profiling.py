@@ -0,0 +1,561 @@
+"""Event-loop health and profiling for the graph runtime.
+
+`PROFILER` watches the event loop that runs the graphs. It has three modes,
+all off by default. While they are off, nothing runs and the nodes pay nothing.
+
+- ``lag``: a heartbeat task measures how late the loop wakes it, recorded as
+  `react_agent_event_loop_lag_seconds`. A watchdog thread notices when the
+  heartbeat is overdue by `block_threshold` and captures the loop thread's
+  stack. The stall is then attributed to the graph node on that stack and to
+  the innermost source line of this package, logged, counted in
+  `react_agent_event_loop_stalls_total` and kept in `LoopProfiler.stalls`.
+- ``cpu``: the watchdog samples the loop thread's stack every
+  `sample_interval` while the loop is busy. `LoopProfiler.folded` returns the
+  samples as collapsed stacks rooted at their node, the input format of
+  flame graph tools such as ``flamegraph.pl`` and speedscope.
+- ``allocations``: tracemalloc records where memory is allocated.
+  `LoopProfiler.allocations` attributes the live allocations to the node
+  whose frame is on their traceback. Tracing `frames` deep makes turns many
+  times slower, so switch it on for a short window, read the report and
+  switch it off again.
+
+Nodes are recognised by their code objects, which `instrument_node`
+registers with `register_node`. Work a node hands to other tasks, such as its
+model calls, has no node frame on its stack, so while profiling, a task
+created inside a node runs under a small per-node coroutine that takes the
+node's place on the stack and in allocation tracebacks.
+
+`PROFILER` attaches itself to the loop running the graph on the first node
+run. The modes can be chosen at startup with
+``REACT_AGENT_PROFILING=lag,cpu,allocations`` and
+``REACT_AGENT_PROFILING_BLOCK_MS``, and switched at runtime through the
+metrics endpoint:
+
+    curl -X POST 'localhost:9100/profiling?cpu=on&block_ms=50'
+    curl 'localhost:9100/profiling/flamegraph?node=call_model' > call_model.folded
+    curl localhost:9100/profiling/allocations
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import Counter, deque
+from dataclasses import asdict, dataclass
+from types import CodeType, FrameType
+from typing import Any, Callable, Coroutine, Optional, TypeVar
+from urllib.parse import parse_qs
+
+from react_agent.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+NO_NODE = "(none)"
+"""The node of stalls, samples and allocations outside every graph node."""
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# The deepest traceback tracemalloc accepts.
+_MAX_FRAMES = 65535
+
+_Number = TypeVar("_Number", int, float)
+
+_NODE_CODES: dict[CodeType, str] = {}
+# Source lines of each node's own body, by file, for tracemalloc frames.
+_NODE_LINES: dict[str, list[tuple[int, int, str]]] = {}
+_RUNNERS: dict[str, Callable[..., Coroutine[Any, Any, Any]]] = {}
+
+
+async def _run_in_node(coro: Coroutine[Any, Any, Any]) -> Any:
+    return await coro
+
+
+def register_node(func: Callable[..., Any], name: str) -> None:
+    """Attribute stalls, samples and allocations in `func`'s frames to `name`."""
+    code = func.__code__
+    _NODE_CODES[code] = name
+    lines = [line for _, _, line in code.co_lines() if line is not None]
+    _NODE_LINES.setdefault(code.co_filename, []).append(
+        (code.co_firstlineno, max(lines, default=code.co_firstlineno), name)
+    )
+    if name not in _RUNNERS:
+        # A copy of `_run_in_node` named after the node; code objects that
+        # differ only in their file name would compare equal.
+        runner = _run_in_node.__code__.replace(
+            co_filename=f"<node {name}>", co_name=name, co_qualname=name
+        )
+        _NODE_CODES[runner] = name
+        _NODE_LINES[runner.co_filename] = [(0, sys.maxsize, name)]
+        _RUNNERS[name] = types.FunctionType(runner, globals(), name)
+
+
+@dataclass(frozen=True)
+class Stall:
+    """A stretch of time in which the event loop ran nothing else."""
+
+    node: str
+    location: str
+    """Innermost source line of this package, e.g. ``nodes.py:120 in call_model``."""
+
+    seconds: float
+    stack: tuple[str, ...] = ()
+    """The loop thread's frames from the node inwards."""
+
+
+@dataclass(frozen=True)
+class NodeAllocations:
+    """Memory allocated under one node and still alive."""
+
+    node: str
+    size: int
+    """Bytes."""
+
+    blocks: int
+
+
+def _frames(frame: Optional[FrameType]) -> list[FrameType]:
+    """Return the frames of a stack, outermost first."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def _describe(frame: FrameType) -> str:
+    filename = frame.f_code.co_filename
+    if filename.startswith(_PACKAGE_DIR):
+        filename = os.path.relpath(filename, _PACKAGE_DIR)
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+def _node_of(frames: list[FrameType]) -> tuple[str, int]:
+    """Return the innermost node on `frames` and the index of its frame."""
+    for index in range(len(frames) - 1, -1, -1):
+        node = _NODE_CODES.get(frames[index].f_code)
+        if node is not None:
+            return node, index
+    return NO_NODE, 0
+
+
+def _node_calling(frame: Optional[FrameType]) -> Optional[str]:
+    """Return the innermost node on the stack of `frame`."""
+    while frame is not None:
+        node = _NODE_CODES.get(frame.f_code)
+        if node is not None:
+            return node
+        frame = frame.f_back
+    return None
+
+
+def _is_idle(frame: FrameType) -> bool:
+    # An idle loop waits for I/O in its selector.
+    code = frame.f_code
+    return code.co_name in ("select", "poll") and code.co_filename.endswith(
+        "selectors.py"
+    )
+
+
+class LoopProfiler:
+    """Measures lag, stalls, CPU and allocations of one event loop.
+
+    Args:
+        interval: Seconds between heartbeats.
+        block_threshold: Seconds of lag that count as a stall.
+        sample_interval: Seconds between CPU samples.
+        max_stalls: Stalls kept in `stalls`.
+        frames: Traceback depth recorded for each allocation.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.05,
+        block_threshold: float = 0.1,
+        sample_interval: float = 0.005,
+        max_stalls: int = 100,
+        frames: int = 32,
+    ) -> None:
+        """Create a profiler with every mode off; see `configure`."""
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.sample_interval = sample_interval
+        self.frames = frames
+        self.lag = False
+        self.cpu = False
+        self.track_allocations = False
+        self.stalls: deque[Stall] = deque(maxlen=max_stalls)
+        self.samples: Counter[str] = Counter()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task[None]] = None
+        self._task_factory: Optional[Callable[..., asyncio.Future[Any]]] = None
+        self._factory_installed = False
+        self._tracing = False
+        self._watchdog: Optional[threading.Thread] = None
+        self._beat = 0.0
+        # The heartbeat that was overdue, and the stack it was captured with.
+        self._captured: Optional[tuple[float, Stall]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any mode is on."""
+        return self.lag or self.cpu or self.track_allocations
+
+    def attach(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """Profile `loop`, by default the running one, in the modes switched on."""
+        loop = loop or asyncio.get_running_loop()
+        previous = self._loop
+        if previous is not None and previous is not loop:
+            # Leave the previous loop as it was; its heartbeat dies with it.
+            if self._factory_installed and not previous.is_closed():
+                previous.set_task_factory(self._task_factory)
+            self._factory_installed = False
+            self._heartbeat = None
+        self._loop = loop
+        self._thread_id = threading.get_ident()
+        self._apply()
+
+    def detach(self) -> None:
+        """Switch every mode off and stop watching the loop."""
+        self.configure(lag=False, cpu=False, allocations=False)
+        self._loop = self._thread_id = None
+
+    def configure(
+        self,
+        *,
+        lag: Optional[bool] = None,
+        cpu: Optional[bool] = None,
+        allocations: Optional[bool] = None,
+        block_threshold: Optional[float] = None,
+        frames: Optional[int] = None,
+    ) -> None:
+        """Switch modes on or off; safe to call from any thread.
+
+        A new `frames` depth applies the next time allocation tracking starts.
+        """
+        with self._lock:
+            if lag is not None:
+                self.lag = lag
+            if cpu is not None:
+                self.cpu = cpu
+            if allocations is not None:
+                self.track_allocations = allocations
+            if block_threshold is not None:
+                self.block_threshold = block_threshold
+            if frames is not None:
+                self.frames = frames
+        self._apply()
+
+    def reset(self) -> None:
+        """Forget the recorded stalls and CPU samples."""
+        with self._lock:
+            self.stalls.clear()
+            self.samples.clear()
+
+    def folded(self, node: Optional[str] = None) -> str:
+        """Return the CPU samples as collapsed stacks, one ``stack count`` per line.
+
+        Args:
+            node: Only the samples of this node.
+        """
+        with self._lock:
+            samples = sorted(self.samples.items())
+        return "".join(
+            f"{stack} {count}\n"
+            for stack, count in samples
+            if node is None or stack.split(";", 1)[0] == node
+        )
+
+    def allocations(self) -> list[NodeAllocations]:
+        """Live allocations by node, largest first; empty unless tracking."""
+        if not tracemalloc.is_tracing():
+            return []
+        totals: dict[str, list[int]] = {}
+        for trace in tracemalloc.take_snapshot().traces:
+            node = next(
+                (
+                    node
+                    for frame in reversed(trace.traceback)
+                    if (node := self._node_at(frame.filename, frame.lineno))
+                ),
+                NO_NODE,
+            )
+            total = totals.setdefault(node, [0, 0])
+            total[0] += trace.size
+            total[1] += 1
+        report = sorted(
+            (NodeAllocations(node, *total) for node, total in totals.items()),
+            key=lambda allocations: allocations.size,
+            reverse=True,
+        )
+        for allocations in report:
+            METRICS.set_gauge(
+                "react_agent_node_allocated_bytes",
+                allocations.size,
+                node=allocations.node,
+            )
+        return report
+
+    def status(self) -> dict[str, Any]:
+        """Return the modes, settings and recent stalls, for the metrics endpoint."""
+        return {
+            "lag": self.lag,
+            "cpu": self.cpu,
+            "allocations": self.track_allocations,
+            "block_ms": self.block_threshold * 1000,
+            "frames": self.frames,
+            "attached": self._loop is not None,
+            "samples": sum(self.samples.values()),
+            "stalls": [asdict(stall) for stall in self.stalls],
+        }
+
+    def _apply(self) -> None:
+        if self.track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._tracing = True
+        elif not self.track_allocations and self._tracing:
+            # Tracing that someone else started is left running.
+            tracemalloc.stop()
+            self._tracing = False
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        if self.enabled and not self._factory_installed:
+            self._task_factory = loop.get_task_factory()
+            loop.set_task_factory(self._create_task)
+            self._factory_installed = True
+        elif not self.enabled and self._factory_installed:
+            loop.set_task_factory(self._task_factory)
+            self._factory_installed = False
+        if self.lag and self._heartbeat is None:
+            loop.call_soon_threadsafe(self._start_heartbeat)
+        if (self.lag or self.cpu) and self._watchdog is None:
+            self._watchdog = threading.Thread(
+                target=self._watch, name="react-agent-profiler", daemon=True
+            )
+            self._watchdog.start()
+
+    def _create_task(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        coro: Any,
+        **kwargs: Any,
+    ) -> asyncio.Future[Any]:
+        node = _node_calling(sys._getframe(1)) if asyncio.iscoroutine(coro) else None
+        if node is not None:
+            coro = _RUNNERS[node](coro)
+        if self._task_factory is not None:
+            return self._task_factory(loop, coro, **kwargs)
+        return asyncio.Task(coro, loop=loop, **kwargs)
+
+    def _start_heartbeat(self) -> None:
+        if self._heartbeat is None and self.lag:
+            self._heartbeat = asyncio.ensure_future(self._beat_forever())
+
+    async def _beat_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self.lag:
+                beat = self._beat = time.monotonic()
+                expected = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                if not self.lag:
+                    # Switched off while asleep; the watchdog no longer captures.
+                    break
+                lag = max(loop.time() - expected, 0.0)
+                METRICS.observe(
+                    "react_agent_event_loop_lag_seconds", lag, buckets=LAG_BUCKETS
+                )
+                if lag >= self.block_threshold:
+                    self._record_stall(lag, beat)
+        finally:
+            self._heartbeat = None
+
+    def _record_stall(self, seconds: float, beat: float) -> None:
+        # A stack captured for an earlier heartbeat belongs to another stall.
+        captured = Stall(NO_NODE, "unknown", 0.0)
+        if self._captured is not None and self._captured[0] == beat:
+            captured = self._captured[1]
+        stall = Stall(captured.node, captured.location, seconds, captured.stack)
+        with self._lock:
+            self.stalls.append(stall)
+        METRICS.increment("react_agent_event_loop_stalls_total", node=stall.node)
+        logger.warning(
+            "Event loop blocked for %.0f ms in node %s at %s",
+            seconds * 1000,
+            stall.node,
+            stall.location,
+        )
+
+    def _watch(self) -> None:
+        try:
+            while self.lag or self.cpu:
+                period = self.sample_interval if self.cpu else self.block_threshold / 4
+                time.sleep(period)
+                frame = sys._current_frames().get(self._thread_id or 0)
+                if frame is None:
+                    continue
+                beat = self._beat
+                overdue = time.monotonic() - beat - self.interval
+                captured = self._captured
+                if (
+                    self.lag
+                    and overdue >= self.block_threshold
+                    and (captured is None or captured[0] != beat)
+                ):
+                    self._captured = beat, self._capture(frame)
+                if self.cpu and not _is_idle(frame):
+                    self._sample(frame)
+                del frame
+        finally:
+            self._watchdog = None
+
+    def _capture(self, frame: FrameType) -> Stall:
+        frames = _frames(frame)
+        node, start = _node_of(frames)
+        inside = [
+            candidate
+            for candidate in frames
+            if candidate.f_code.co_filename.startswith(_PACKAGE_DIR)
+            and candidate.f_code.co_filename != __file__
+        ]
+        location = _describe(inside[-1] if inside else frames[-1])
+        return Stall(node, location, 0.0, tuple(map(_describe, frames[start:])))
+
+    def _sample(self, frame: FrameType) -> None:
+        frames = _frames(frame)
+        node, start = _node_of(frames)
+        stack = ";".join(
+            [node]
+            + [
+                f"{os.path.basename(candidate.f_code.co_filename)}:"
+                f"{candidate.f_code.co_name}"
+                for candidate in frames[start:]
+            ]
+        )
+        with self._lock:
+            self.samples[stack] += 1
+
+    @staticmethod
+    def _node_at(filename: str, lineno: int) -> Optional[str]:
+        for first, last, node in _NODE_LINES.get(filename, ()):
+            if first <= lineno <= last:
+                return node
+        return None
+
+
+PROFILER = LoopProfiler()
+"""The profiler of the process's graph event loop."""
+
+
+def attach_from_env() -> LoopProfiler:
+    """Attach `PROFILER` to the running loop in the modes of the environment.
+
+    ``REACT_AGENT_PROFILING`` lists the modes, e.g. ``lag,cpu``;
+    ``REACT_AGENT_PROFILING_BLOCK_MS`` sets the stall threshold. The profiler
+    is attached even with no modes, so that they can be switched on later.
+    """
+    modes = {
+        mode.strip()
+        for mode in os.environ.get("REACT_AGENT_PROFILING", "").split(",")
+        if mode.strip()
+    }
+    block_ms = os.environ.get("REACT_AGENT_PROFILING_BLOCK_MS")
+    PROFILER.configure(
+        lag="lag" in modes,
+        cpu="cpu" in modes,
+        allocations="allocations" in modes,
+        block_threshold=float(block_ms) / 1000 if block_ms else None,
+    )
+    PROFILER.attach()
+    return PROFILER
+
+
+def attach_to_running_loop() -> None:
+    """Make `PROFILER` watch the running loop; `instrument_node` calls this.
+
+    The first call attaches it with `attach_from_env`. A later call from
+    another loop, e.g. after `asyncio.run` was called again, moves it there in
+    the modes it already has. Once attached, a call costs one comparison.
+    """
+    loop = asyncio.get_running_loop()
+    if PROFILER._loop is loop:
+        return
+    if PROFILER._loop is None:
+        attach_from_env()
+    else:
+        PROFILER.attach(loop)
+
+
+def _query_number(
+    params: dict[str, str],
+    name: str,
+    parse: Callable[[str], _Number],
+    maximum: float = sys.float_info.max,
+) -> Optional[_Number]:
+    """Return the query parameter `name` parsed by `parse`, or None if absent.
+
+    Raises:
+        ValueError: If the value does not parse or is not in (0, `maximum`].
+    """
+    if not params.get(name):
+        return None
+    try:
+        value = parse(params[name])
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {params[name]!r}") from None
+    if not 0 < value <= maximum:
+        raise ValueError(f"{name} must be positive and at most {maximum:g}")
+    return value
+
+
+def handle_request(
+    method: str, path: str, profiler: LoopProfiler = PROFILER
+) -> tuple[int, str, bytes]:
+    """Serve the ``/profiling`` routes of the metrics endpoint.
+
+    Returns:
+        The HTTP status, the content type and the body.
+    """
+    route, _, query = path.partition("?")
+    params = {name: values[-1] for name, values in parse_qs(query).items()}
+    if route == "/profiling" and method == "POST":
+        switches = {
+            mode: params[mode].lower() in ("1", "on", "true")
+            for mode in ("lag", "cpu", "allocations")
+            if mode in params
+        }
+        try:
+            block_ms = _query_number(params, "block_ms", float)
+            frames = _query_number(params, "frames", int, _MAX_FRAMES)
+        except ValueError as error:
+            detail = json.dumps({"detail": str(error)}).encode()
+            return 400, "application/json", detail
+        profiler.configure(
+            **switches,
+            block_threshold=block_ms / 1000 if block_ms is not None else None,
+            frames=frames,
+        )
+        if "reset" in params:
+            profiler.reset()
+    elif route == "/profiling/flamegraph" and method == "GET":
+        body = profiler.folded(params.get("node")).encode()
+        return 200, "text/plain; charset=utf-8", body
+    elif route == "/profiling/allocations" and method == "GET":
+        report = [asdict(allocations) for allocations in profiler.allocations()]
+        return 200, "application/json", json.dumps(report).encode()
+    elif route != "/profiling" or method != "GET":
+        return 404, "application/json", b'{"detail": "Not found"}'
+    return 200, "application/json", json.dumps(profiler.status()).encode()
@@ -0,0 +1,150 @@
+"""Prompt assembly for the captain's model calls.
+
+Providers cache the longest prompt prefix they have seen recently, so a turn
+is cheaper and faster when its prompt starts with exactly the bytes of the
+previous turn's prompt. This module keeps that prefix stable:
+
+* The difficulty-selected system prompt is formatted once per
+  `(template, secret_key)` and reused as the same string object afterwards.
+* The history is laid out the same way by every node. The system prompt comes
+  first, then game notes and turns in transcript order. A wrong weapons key
+  guess is always replaced by the note that follows it, so the prompt of
+  `incorrect_weapons_key` is a prefix of the next turn's prompt.
+* Each provider gets the cache hints it understands: `cache_control`
+  breakpoints for Anthropic, a `prompt_cache_key` for OpenAI's automatic
+  prefix caching, and `keep_alive` for Ollama so the loaded model and its
+  context stay resident between turns.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Optional, Sequence
+
+from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage
+
+from react_agent.memory import PIN_PREFIX, WEAPONS_KEY_PIN
+from react_agent.prompts import GAME_NOTE_PROMPT, WEAPONS_KEY_GUESS_PREFIX
+from react_agent.utils import get_message_text
+
+if TYPE_CHECKING:
+    from react_agent.configuration import Configuration
+
+_SYSTEM_PROMPTS = {
+    "easy": "easy_system_prompt",
+    "medium": "medium_system_prompt",
+    "hard": "hard_system_prompt",
+}
+_GUESS_NOTE_ID = f"{PIN_PREFIX}{WEAPONS_KEY_PIN}:"
+_EPHEMERAL = {"type": "ephemeral"}
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_prompt(template: str, secret_key: str) -> str:
+    """Format `template` with `secret_key`, once per distinct pair."""
+    return template.format(secret_key=secret_key)
+
+
+def system_prompt(configuration: Configuration) -> str:
+    """Return the captain's system prompt for the configured difficulty.
+
+    Unknown difficulties fall back to the easy prompt.
+    """
+    name = _SYSTEM_PROMPTS.get(
+        configuration.game_difficulty.lower(), "easy_system_prompt"
+    )
+    return compile_prompt(getattr(configuration, name), configuration.secret_key)
+
+
+@dataclass
+class AssembledPrompt:
+    """The messages and provider options for one model call."""
+
+    messages: list[AnyMessage]
+    """The system prompt followed by the history, in a stable layout."""
+
+    invoke_kwargs: dict[str, Any] = field(default_factory=dict)
+    """Provider cache hints to pass to `ainvoke`/`astream`."""
+
+
+def _is_answered_guess(messages: Sequence[AnyMessage], index: int) -> bool:
+    """Whether `messages[index]` is a wrong guess followed by its game note."""
+    message = messages[index]
+    if not isinstance(message, HumanMessage) or index + 1 >= len(messages):
+        return False
+    following = messages[index + 1]
+    return (
+        isinstance(following, SystemMessage)
+        and (following.id or "").startswith(_GUESS_NOTE_ID)
+        and get_message_text(message).startswith(WEAPONS_KEY_GUESS_PREFIX)
+    )
+
+
+def _with_breakpoint(message: AnyMessage) -> AnyMessage:
+    """Return a copy of `message` marked as an Anthropic cache breakpoint."""
+    content = message.content
+    if isinstance(content, str):
+        blocks: list[Any] = [{"type": "text", "text": content}]
+    else:
+        blocks = [
+            {"type": "text", "text": block} if isinstance(block, str) else dict(block)
+            for block in content
+        ]
+    if not blocks:
+        return message
+    blocks[-1] = {**blocks[-1], "cache_control": _EPHEMERAL}
+    return message.model_copy(update={"content": blocks})
+
+
+def prompt_cache_key(system_message: str, thread_id: Optional[str]) -> str:
+    """Return a short routing key shared by every call of one thread and prompt."""
+    digest = hashlib.blake2b(system_message.encode(), digest_size=8)
+    if thread_id is not None:
+        digest.update(thread_id.encode())
+    return digest.hexdigest()
+
+
+def assemble_prompt(
+    system_message: str,
+    history: Sequence[AnyMessage],
+    configuration: Configuration,
+    thread_id: Optional[str] = None,
+) -> AssembledPrompt:
+    """Lay out a model call so consecutive turns share their prefix.
+
+    Args:
+        system_message: The compiled system prompt, see `system_prompt`.
+        history: The selected history, including any trailing game note.
+        configuration: Supplies the provider and the cache hint settings.
+        thread_id: The game's thread, used to route OpenAI requests.
+
+    Returns:
+        AssembledPrompt: The messages and invoke kwargs for `ainvoke_model`.
+    """
+    provider = configuration.model_provider
+    messages: list[AnyMessage] = [SystemMessage(system_message)]
+    for index, message in enumerate(history):
+        if _is_answered_guess(history, index):
+            continue
+        if provider == "anthropic" and isinstance(message, SystemMessage):
+            # Anthropic hoists later system messages into the system prompt,
+            # which would change the prefix every time a note is added.
+            message = HumanMessage(
+                GAME_NOTE_PROMPT.format(note=get_message_text(message))
+            )
+        messages.append(message)
+
+    kwargs: dict[str, Any] = {}
+    if not configuration.prompt_cache_hints:
+        return AssembledPrompt(messages, kwargs)
+    if provider == "anthropic":
+        messages[0] = _with_breakpoint(messages[0])
+        if len(messages) > 1:
+            messages[-1] = _with_breakpoint(messages[-1])
+    elif provider == "openai":
+        kwargs["prompt_cache_key"] = prompt_cache_key(system_message, thread_id)
+    elif provider == "ollama" and configuration.ollama_keep_alive:
+        kwargs["keep_alive"] = configuration.ollama_keep_alive
+    return AssembledPrompt(messages, kwargs)
@@ -0,0 +1,294 @@
+"""Process-wide registry of long-lived chat model clients.
+
+Building a chat model is not free: every instance owns an SDK client and, with
+it, an HTTP connection pool. The registry hands out one shared instance per
+(provider, model, base URL, sampling parameters) so that consecutive turns reuse
+warm keep-alive connections instead of paying a new TCP/TLS handshake.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Hashable, Optional
+
+import httpx
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+DEFAULT_MAX_MODELS = 32
+"""Upper bound on the number of distinct clients kept alive at once."""
+
+DEFAULT_POOL_LIMITS = httpx.Limits(
+    max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0
+)
+
+# Providers whose LangChain integration accepts caller-supplied httpx clients.
+_HTTPX_PROVIDERS = frozenset({"openai"})
+
+# Providers whose SDK retries 429s on its own unless given max_retries=0.
+_SDK_RETRY_PROVIDERS = frozenset(
+    {"openai", "azure_openai", "anthropic", "fireworks", "groq", "mistralai"}
+)
+
+ModelKey = tuple[str, str, Optional[str], tuple[tuple[str, Hashable], ...]]
+
+Interceptor = Callable[[ModelKey, Callable[[], "BaseChatModel"]], "BaseChatModel"]
+"""Called with a client's key and a thunk that builds the real client."""
+
+
+class _ConnectionCounter:
+    """Thread-safe tally of the connections opened by a set of transports."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._seen: weakref.WeakSet[Any] = weakref.WeakSet()
+        self.handshakes = 0
+
+    def observe(self, connections: Any) -> None:
+        with self._lock:
+            for connection in connections:
+                if connection not in self._seen:
+                    self._seen.add(connection)
+                    self.handshakes += 1
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    """Sync transport that records every new pooled connection."""
+
+    def __init__(self, counter: _ConnectionCounter, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._counter = counter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = super().handle_request(request)
+        self._counter.observe(self._pool.connections)
+        return response
+
+    @property
+    def live_connections(self) -> int:
+        return len(self._pool.connections)
+
+
+class _CountingAsyncTransport(httpx.AsyncHTTPTransport):
+    """Async transport that records every new pooled connection."""
+
+    def __init__(self, counter: _ConnectionCounter, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._counter = counter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await super().handle_async_request(request)
+        self._counter.observe(self._pool.connections)
+        return response
+
+    @property
+    def live_connections(self) -> int:
+        return len(self._pool.connections)
+
+
+@dataclass
+class _Entry:
+    model: BaseChatModel
+    loop: Optional[weakref.ref[asyncio.AbstractEventLoop]]
+    transports: list[Any] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class RegistryStats:
+    """A point-in-time snapshot of registry usage."""
+
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    live_connections: int
+    handshakes: int
+
+    @property
+    def hit_ratio(self) -> float:
+        """Fraction of lookups served by an existing client."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ChatModelRegistry:
+    """A bounded, thread-safe LRU cache of chat model clients.
+
+    Async HTTP clients are bound to the event loop they were first used on, so
+    entries remember their loop and are rebuilt if requested from another one.
+    """
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_MODELS,
+        pool_limits: httpx.Limits = DEFAULT_POOL_LIMITS,
+    ) -> None:
+        """Create an empty registry that keeps at most `max_size` clients."""
+        self.max_size = max_size
+        self.pool_limits = pool_limits
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[ModelKey, int], _Entry] = OrderedDict()
+        self._counter = _ConnectionCounter()
+        self._factories: dict[str, Callable[..., BaseChatModel]] = {}
+        self._interceptor: Optional[Interceptor] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(
+        self,
+        model_provider: str,
+        model_name: str,
+        base_url: str | None = None,
+        *,
+        scheduled: bool = False,
+        **model_kwargs: Hashable,
+    ) -> BaseChatModel:
+        """Return the shared client for the given settings, creating it if needed.
+
+        With `scheduled`, the client's calls are admitted by `LLM_SCHEDULER`,
+        which retries rate-limited calls itself, so SDK clients are built
+        without retries of their own.
+        """
+        if scheduled and model_provider in _SDK_RETRY_PROVIDERS:
+            model_kwargs.setdefault("max_retries", 0)
+        key: ModelKey = (
+            model_provider,
+            model_name,
+            base_url,
+            tuple(sorted(model_kwargs.items())),
+        )
+        loop = _running_loop()
+        slot = (key, id(loop) if loop is not None else 0)
+        with self._lock:
+            entry = self._entries.get(slot)
+            if entry is not None and _same_loop(entry, loop):
+                self._entries.move_to_end(slot)
+                self.hits += 1
+                return entry.model
+            self.misses += 1
+            entry = self._build(key, loop)
+            self._entries[slot] = entry
+            while len(self._entries) > self.max_size:
+                # Evicted clients may still be serving an in-flight call, so
+                # their pools are released by garbage collection, not closed.
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return entry.model
+
+    def register_provider(
+        self, model_provider: str, factory: Callable[..., BaseChatModel]
+    ) -> None:
+        """Route `model_provider` to a custom factory instead of `init_chat_model`.
+
+        The factory is called as ``factory(model_name, base_url, **model_kwargs)``.
+        """
+        with self._lock:
+            self._factories[model_provider] = factory
+            stale = [slot for slot in self._entries if slot[0][0] == model_provider]
+            for slot in stale:
+                del self._entries[slot]
+
+    def intercept(self, interceptor: Optional[Interceptor]) -> Optional[Interceptor]:
+        """Hand every client built from now on to `interceptor`.
+
+        The interceptor may wrap the real client, which it builds by calling the
+        thunk, or replace it without building it at all. Cached clients are
+        dropped so the next lookups go through it. None removes it.
+
+        Returns:
+            The interceptor that was installed before.
+        """
+        with self._lock:
+            previous, self._interceptor = self._interceptor, interceptor
+            self._entries.clear()
+        return previous
+
+    def stats(self) -> RegistryStats:
+        """Return hit/miss counters and connection pool statistics."""
+        with self._lock:
+            live = sum(
+                transport.live_connections
+                for entry in self._entries.values()
+                for transport in entry.transports
+            )
+            return RegistryStats(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                size=len(self._entries),
+                live_connections=live,
+                handshakes=self._counter.handshakes,
+            )
+
+    def clear(self) -> None:
+        """Drop every cached client."""
+        with self._lock:
+            self._entries.clear()
+
+    def _build(
+        self, key: ModelKey, loop: asyncio.AbstractEventLoop | None
+    ) -> _Entry:
+        transports: list[Any] = []
+        if self._interceptor is not None:
+            model = self._interceptor(key, lambda: self._create(key, transports))
+        else:
+            model = self._create(key, transports)
+        return _Entry(
+            model=model,
+            loop=weakref.ref(loop) if loop is not None else None,
+            transports=transports,
+        )
+
+    def _create(self, key: ModelKey, transports: list[Any]) -> BaseChatModel:
+        model_provider, model_name, base_url, frozen_kwargs = key
+        model_kwargs: dict[str, Any] = dict(frozen_kwargs)
+
+        factory = self._factories.get(model_provider)
+        if factory is not None:
+            model = factory(model_name, base_url, **model_kwargs)
+        elif model_provider == "ollama":
+            from langchain_ollama import ChatOllama
+
+            model = ChatOllama(base_url=base_url, model=model_name, **model_kwargs)
+        else:
+            from langchain.chat_models import init_chat_model
+
+            if model_provider in _HTTPX_PROVIDERS:
+                sync_transport = _CountingTransport(
+                    self._counter, limits=self.pool_limits
+                )
+                async_transport = _CountingAsyncTransport(
+                    self._counter, limits=self.pool_limits
+                )
+                transports.extend([sync_transport, async_transport])
+                model_kwargs.update(
+                    http_client=httpx.Client(transport=sync_transport),
+                    http_async_client=httpx.AsyncClient(transport=async_transport),
+                )
+            model = init_chat_model(
+                model_name, model_provider=model_provider, **model_kwargs
+            )
+        return model
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _same_loop(entry: _Entry, loop: asyncio.AbstractEventLoop | None) -> bool:
+    if entry.loop is None:
+        return loop is None
+    return entry.loop() is loop
+
+
+MODEL_REGISTRY = ChatModelRegistry()
+"""The registry shared by every node in the process."""
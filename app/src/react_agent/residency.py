@@ -0,0 +1,278 @@
+"""Keep the game's Ollama models loaded, with the same runtime options on every call.
+
+Ollama loads a model's weights on its first request and drops them once its
+`keep_alive` runs out. It also reloads a model whenever a request asks for a
+different `num_ctx` or `num_thread`, and it evicts a model when another one
+needs the memory. Each of these costs the next player the full load time
+before the first token.
+
+`model_kwargs` gives every Ollama client the configured `keep_alive` and one
+set of runtime options per model. Each option is the largest value that any
+role sharing the model asks for in `ollama_options`, so the captain and the
+guard never reload a shared model back and forth. `OllamaResidency` talks to
+the server's REST API: `preload` loads the models a configuration uses before
+the first game, `start_preload_from_env` does so in the background when the
+LangGraph server starts, `refresh` reads which models are loaded, `release`
+unloads one, and `first_token_seconds` measures a request's time to first token,
+labelled cold or warm by whether its model was loaded beforehand.
+
+    async with OllamaResidency(configuration.ollama_base_url) as residency:
+        await residency.preload_configuration(configuration)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Hashable, Optional
+
+import httpx
+
+from react_agent.metrics import METRICS
+from react_agent.routing import ROLES, ollama_models, role_backend
+
+if TYPE_CHECKING:
+    from react_agent.configuration import Configuration
+
+logger = logging.getLogger(__name__)
+
+_preload_thread: Optional[threading.Thread] = None
+
+
+@dataclass(frozen=True)
+class ResidentModel:
+    """A model the Ollama server has loaded, from `GET /api/ps`."""
+
+    name: str
+    size_vram: int = 0
+    expires_at: str = ""
+    context_length: int = 0
+
+
+@dataclass(frozen=True)
+class LoadReport:
+    """The outcome of one `OllamaResidency.preload`."""
+
+    model: str
+    cold: bool
+    """Whether the model was not loaded before the request."""
+
+    seconds: float
+
+
+def ollama_options(configuration: Configuration, model_name: str) -> dict[str, int]:
+    """Return the runtime options pinned for `model_name` across its roles."""
+    options: dict[str, int] = {}
+    for role in ROLES:
+        role_options = configuration.ollama_options.get(role)
+        if not role_options:
+            continue
+        backend = role_backend(configuration, role)
+        if (backend.provider, backend.model_name) != ("ollama", model_name):
+            continue
+        for name, value in role_options.items():
+            options[name] = max(options.get(name, value), value)
+    return options
+
+
+def model_kwargs(configuration: Configuration) -> dict[str, Hashable]:
+    """Client settings for the configured model: `keep_alive` and its options.
+
+    Empty for providers other than Ollama.
+    """
+    if configuration.model_provider != "ollama":
+        return {}
+    kwargs: dict[str, Hashable] = dict(
+        ollama_options(configuration, configuration.model_name)
+    )
+    if configuration.ollama_keep_alive:
+        kwargs["keep_alive"] = configuration.ollama_keep_alive
+    return kwargs
+
+
+class OllamaResidency:
+    """Loads, tracks and unloads the models of one Ollama server.
+
+    Args:
+        base_url: The server, e.g. ``http://localhost:11434``.
+        timeout: Seconds to wait for a request, including a model load.
+    """
+
+    def __init__(
+        self, base_url: str = "http://localhost:11434", timeout: float = 600.0
+    ) -> None:
+        """Open a client for the server at `base_url`."""
+        self.base_url = base_url.rstrip("/")
+        self.resident: dict[str, ResidentModel] = {}
+        self._client = httpx.AsyncClient(base_url=self.base_url, timeout=timeout)
+
+    async def __aenter__(self) -> OllamaResidency:
+        """Return the client itself."""
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        """Close the HTTP client."""
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close the HTTP client."""
+        await self._client.aclose()
+
+    async def refresh(self) -> dict[str, ResidentModel]:
+        """Read the models the server has loaded right now."""
+        response = await self._client.get("/api/ps")
+        response.raise_for_status()
+        self.resident = {
+            model["name"]: ResidentModel(
+                name=model["name"],
+                size_vram=model.get("size_vram", 0),
+                expires_at=model.get("expires_at", ""),
+                context_length=model.get("context_length", 0),
+            )
+            for model in response.json().get("models", [])
+        }
+        METRICS.set_gauge(
+            "react_agent_ollama_resident_models", len(self.resident), server=self.base_url
+        )
+        return self.resident
+
+    async def preload(
+        self,
+        model: str,
+        options: Optional[dict[str, int]] = None,
+        keep_alive: str = "",
+    ) -> LoadReport:
+        """Load `model` with `options` and hold it for `keep_alive`."""
+        cold = not self._is_resident(await self.refresh(), model)
+        body: dict[str, Any] = {"model": model, "stream": False}
+        if options:
+            body["options"] = options
+        if keep_alive:
+            body["keep_alive"] = keep_alive
+        start = time.perf_counter()
+        response = await self._client.post("/api/generate", json=body)
+        response.raise_for_status()
+        report = LoadReport(model, cold, time.perf_counter() - start)
+        state = "cold" if cold else "warm"
+        METRICS.increment("react_agent_ollama_loads_total", model=model, state=state)
+        METRICS.observe(
+            "react_agent_ollama_load_seconds", report.seconds, model=model, state=state
+        )
+        await self.refresh()
+        logger.info("Preloaded %s (%s) in %.2fs", model, state, report.seconds)
+        return report
+
+    async def preload_configuration(
+        self, configuration: Configuration
+    ) -> list[LoadReport]:
+        """Load every Ollama model the roles of `configuration` use."""
+        return [
+            await self.preload(
+                model,
+                ollama_options(configuration, model),
+                configuration.ollama_keep_alive,
+            )
+            for model in ollama_models(configuration)
+        ]
+
+    async def release(self, model: str) -> None:
+        """Unload `model` now instead of when its `keep_alive` runs out."""
+        response = await self._client.post(
+            "/api/generate", json={"model": model, "keep_alive": 0, "stream": False}
+        )
+        response.raise_for_status()
+        await self.refresh()
+
+    async def first_token_seconds(
+        self,
+        model: str,
+        prompt: str = "Captain, report.",
+        options: Optional[dict[str, int]] = None,
+        keep_alive: str = "",
+    ) -> tuple[float, bool]:
+        """Time one streamed generation of `model` until its first token.
+
+        Returns:
+            The seconds to the first token, and whether the model was cold.
+        """
+        cold = not self._is_resident(await self.refresh(), model)
+        body: dict[str, Any] = {
+            "model": model,
+            "prompt": prompt,
+            "options": {**(options or {}), "num_predict": 8},
+        }
+        if keep_alive:
+            body["keep_alive"] = keep_alive
+        start = time.perf_counter()
+        seconds = 0.0
+        async with self._client.stream("POST", "/api/generate", json=body) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line or seconds:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("response") or chunk.get("done"):
+                    seconds = time.perf_counter() - start
+        METRICS.observe(
+            "react_agent_ollama_first_token_seconds",
+            seconds,
+            model=model,
+            state="cold" if cold else "warm",
+        )
+        await self.refresh()
+        return seconds, cold
+
+    @staticmethod
+    def _is_resident(resident: dict[str, ResidentModel], model: str) -> bool:
+        # The server lists "llama3.2" as "llama3.2:latest".
+        return model in resident or f"{model}:latest" in resident
+
+
+async def preload(configuration: Configuration) -> list[LoadReport]:
+    """Load the Ollama models of `configuration` on its server, if it uses any."""
+    if not ollama_models(configuration):
+        return []
+    async with OllamaResidency(configuration.ollama_base_url) as residency:
+        return await residency.preload_configuration(configuration)
+
+
+def start_preload(configuration: Configuration) -> Optional[threading.Thread]:
+    """Load the Ollama models of `configuration` on a background thread.
+
+    Failures are logged, not raised: a game still loads its model on first use.
+
+    Returns:
+        The thread, or None if `configuration` uses no Ollama models.
+    """
+    if not ollama_models(configuration):
+        return None
+
+    def run() -> None:
+        try:
+            asyncio.run(preload(configuration))
+        except httpx.HTTPError as error:
+            logger.warning("Could not preload the Ollama models: %s", error)
+
+    thread = threading.Thread(target=run, name="ollama-preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_preload_from_env() -> Optional[threading.Thread]:
+    """Preload the default configuration's Ollama models once, in the background.
+
+    `REACT_AGENT_PRELOAD=0` disables it.
+    """
+    global _preload_thread
+    if os.environ.get("REACT_AGENT_PRELOAD", "1").lower() in ("0", "false", "off"):
+        return None
+    if _preload_thread is None:
+        from react_agent.configuration import Configuration
+
+        _preload_thread = start_preload(Configuration())
+    return _preload_thread
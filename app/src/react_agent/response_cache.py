@@ -0,0 +1,349 @@
+"""Cached captain replies for the opening turns of a game.
+
+The first few things players say after `setup_game` ("hi captain", "what's our
+mission", "status report") recur across thousands of threads, under the same
+system prompt and mission. `RESPONSE_CACHE` answers those turns without a
+model call.
+
+A turn is cacheable while the current game has at most
+`response_cache_turns` player messages and the player spoke last (or just
+before the new game's mission). Its context key hashes the difficulty, the
+model, the system prompt, the mission and the normalized earlier messages of
+the game. The player's message is then matched within that context, as set
+by `response_cache`:
+
+- ``exact``: the normalized text must be identical.
+- ``semantic``: also the nearest cached message by cosine similarity of cheap
+  hashed word and character-trigram embeddings, if at least
+  `response_cache_similarity`. Each context keeps its embeddings in a small
+  in-memory matrix that is searched with one matrix-vector product, and the
+  phrasings of one question share an entry. These hits are counted as
+  "similar" in `ResponseCacheStats` and the metrics.
+
+numpy is imported when the first entry is embedded, not with the module.
+
+Each entry collects up to `response_cache_variants` different replies before
+it is served, then rotates through them, so repeated questions do not get a
+word-for-word canned answer. Replies that contain the secret key are never
+stored. Entries expire after `response_cache_ttl_seconds`, and the least
+recently used are evicted beyond `ResponseCache.max_entries`.
+`ResponseCacheStats` and the `react_agent_response_cache_*` metrics report
+hits and the model latency they saved.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional, Sequence
+
+from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage
+
+from react_agent.guard import normalize_message
+from react_agent.leaks import contains_secret
+from react_agent.memory import MISSION_PIN, PIN_PREFIX
+from react_agent.metrics import METRICS
+from react_agent.utils import get_message_text
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from react_agent.configuration import Configuration
+
+DIMENSIONS = 256
+"""Size of the hashed trigram embeddings."""
+
+_MISSION_ID = f"{PIN_PREFIX}{MISSION_PIN}:"
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+def embed(text: str, dimensions: int = DIMENSIONS) -> np.ndarray:
+    """Embed normalized `text` as an L2-normalized bag of hashed words and trigrams.
+
+    Punctuation is ignored, so "hello, captain" and "hello captain!" match.
+    """
+    import numpy as np
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    words = _PUNCTUATION.sub(" ", text).split()
+    for word in words:
+        vector[zlib.crc32(word.encode()) % dimensions] += 1.0
+    padded = f" {' '.join(words)} "
+    for index in range(len(padded) - 2):
+        vector[zlib.crc32(padded[index : index + 3].encode()) % dimensions] += 1.0
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+@dataclass(frozen=True)
+class OpeningTurn:
+    """A cacheable turn: its context key and the player's normalized message."""
+
+    context: bytes
+    message: str
+
+
+def opening_turn(
+    messages: Sequence[AnyMessage], system_message: str, configuration: Configuration
+) -> Optional[OpeningTurn]:
+    """Return the cache key of this turn, or None if it is not cacheable."""
+    if configuration.response_cache == "off":
+        return None
+    # The player's message is last, or followed only by the new game's mission.
+    player = len(messages) - 1
+    while player >= 0 and isinstance(messages[player], SystemMessage):
+        player -= 1
+    if player < 0 or not isinstance(messages[player], HumanMessage):
+        return None
+    start = 0
+    for index in range(len(messages) - 1, -1, -1):
+        message_id = messages[index].id
+        if message_id and message_id.startswith(_MISSION_ID):
+            # The message that started the game comes just before its mission.
+            starter = index and isinstance(messages[index - 1], HumanMessage)
+            start = index - 1 if starter else index
+            break
+    game = [*messages[start:player], *messages[player + 1 :]]
+    turns = 1 + sum(isinstance(message, HumanMessage) for message in game)
+    if turns > configuration.response_cache_turns:
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (
+        configuration.game_difficulty.lower(),
+        f"{configuration.model_provider}/{configuration.model_name}",
+        system_message,
+    ):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    for message in game:
+        digest.update(message.type.encode())
+        digest.update(b"\1")
+        digest.update(normalize_message(get_message_text(message)).encode())
+        digest.update(b"\0")
+    return OpeningTurn(
+        digest.digest(), normalize_message(get_message_text(messages[player]))
+    )
+
+
+@dataclass
+class ResponseCacheStats:
+    """Lookups served by the response cache, and the model time they saved."""
+
+    exact_hits: int = 0
+    similar_hits: int = 0
+    misses: int = 0
+    rejected: int = 0
+    """Replies not stored because they contained the secret."""
+
+    seconds_saved: float = 0.0
+
+    @property
+    def hits(self) -> int:
+        """Lookups answered from the cache."""
+        return self.exact_hits + self.similar_hits
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups answered from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class _Entry:
+    context: bytes
+    message: str
+    vector: np.ndarray
+    expires: float
+    replies: list[str] = field(default_factory=list)
+    model_seconds: float = 0.0
+    """Mean model latency of the calls that produced `replies`."""
+
+    served: int = 0
+
+
+class _ContextIndex:
+    """The embeddings of one context's entries, searched together."""
+
+    def __init__(self) -> None:
+        self.messages: list[str] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def add(self, message: str) -> None:
+        self.messages.append(message)
+        self._matrix = None
+
+    def remove(self, message: str) -> None:
+        self.messages.remove(message)
+        self._matrix = None
+
+    def nearest(
+        self,
+        vector: np.ndarray,
+        entries: dict[tuple[bytes, str], _Entry],
+        context: bytes,
+    ) -> tuple[Optional[str], float]:
+        import numpy as np
+
+        if not self.messages:
+            return None, 0.0
+        if self._matrix is None:
+            self._matrix = np.stack(
+                [entries[(context, message)].vector for message in self.messages]
+            )
+        scores = self._matrix @ vector
+        best = int(np.argmax(scores))
+        return self.messages[best], float(scores[best])
+
+
+class ResponseCache:
+    """A bounded, thread-safe cache of captain replies by opening turn.
+
+    Args:
+        max_entries: Player messages kept, over all contexts.
+        dimensions: Size of the message embeddings.
+    """
+
+    def __init__(self, max_entries: int = 10_000, dimensions: int = DIMENSIONS) -> None:
+        """Start empty, holding at most `max_entries` player messages."""
+        self.max_entries = max_entries
+        self.dimensions = dimensions
+        self.stats = ResponseCacheStats()
+        self._entries: OrderedDict[tuple[bytes, str], _Entry] = OrderedDict()
+        self._indexes: dict[bytes, _ContextIndex] = {}
+        self._lock = threading.Lock()
+
+    def lookup(
+        self,
+        turn: OpeningTurn,
+        *,
+        similarity: float = 1.0,
+        variants: int = 1,
+    ) -> Optional[str]:
+        """Return a cached reply for `turn`, or None on a miss.
+
+        Args:
+            turn: The turn from `opening_turn`.
+            similarity: The least cosine similarity of a near match; 1 or more
+                only matches the exact message.
+            variants: Replies an entry collects before it is served.
+        """
+        start = time.perf_counter()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live((turn.context, turn.message), now)
+            kind = "exact"
+            if entry is None and similarity < 1.0:
+                entry, kind = self._nearest(turn, similarity, now), "similar"
+            if entry is None or len(entry.replies) < max(variants, 1):
+                self.stats.misses += 1
+                METRICS.increment(
+                    "react_agent_response_cache_lookups_total", result="miss"
+                )
+                return None
+            self._entries.move_to_end((entry.context, entry.message))
+            reply = entry.replies[entry.served % len(entry.replies)]
+            entry.served += 1
+            saved = max(entry.model_seconds - (time.perf_counter() - start), 0.0)
+            if kind == "exact":
+                self.stats.exact_hits += 1
+            else:
+                self.stats.similar_hits += 1
+            self.stats.seconds_saved += saved
+        METRICS.increment("react_agent_response_cache_lookups_total", result=kind)
+        METRICS.increment("react_agent_response_cache_seconds_saved_total", saved)
+        return reply
+
+    def store(
+        self,
+        turn: OpeningTurn,
+        reply: str,
+        model_seconds: float,
+        *,
+        secret_key: str = "",
+        similarity: float = 1.0,
+        ttl: float = 3600.0,
+        variants: int = 1,
+    ) -> bool:
+        """Add `reply` as a variant for `turn`, unless it contains `secret_key`.
+
+        With `similarity` below 1, the reply joins the nearest similar entry,
+        so that all phrasings of a question collect variants together.
+
+        Returns:
+            Whether the reply was stored.
+        """
+        if not reply.strip():
+            return False
+        if secret_key and contains_secret(reply, secret_key):
+            with self._lock:
+                self.stats.rejected += 1
+            return False
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live((turn.context, turn.message), now)
+            if entry is None and similarity < 1.0:
+                entry = self._nearest(turn, similarity, now)
+            if entry is None:
+                vector = embed(turn.message, self.dimensions)
+                entry = _Entry(turn.context, turn.message, vector, now + ttl)
+                self._entries[(turn.context, turn.message)] = entry
+                index = self._indexes.setdefault(turn.context, _ContextIndex())
+                index.add(turn.message)
+                while len(self._entries) > self.max_entries:
+                    self._drop(next(iter(self._entries)))
+            self._entries.move_to_end((entry.context, entry.message))
+            if len(entry.replies) >= max(variants, 1) or reply in entry.replies:
+                return False
+            count = len(entry.replies)
+            entry.model_seconds += (model_seconds - entry.model_seconds) / (count + 1)
+            entry.replies.append(reply)
+            METRICS.set_gauge("react_agent_response_cache_entries", len(self._entries))
+        return True
+
+    def clear(self) -> None:
+        """Drop every entry and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._indexes.clear()
+            self.stats = ResponseCacheStats()
+
+    def __len__(self) -> int:
+        """Return the number of cached player messages."""
+        return len(self._entries)
+
+    def _live(self, key: tuple[bytes, str], now: float) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires <= now:
+            self._drop(key)
+            return None
+        return entry
+
+    def _nearest(
+        self, turn: OpeningTurn, similarity: float, now: float
+    ) -> Optional[_Entry]:
+        index = self._indexes.get(turn.context)
+        if index is None:
+            return None
+        message, score = index.nearest(
+            embed(turn.message, self.dimensions), self._entries, turn.context
+        )
+        if message is None or score < similarity:
+            return None
+        return self._live((turn.context, message), now)
+
+    def _drop(self, key: tuple[bytes, str]) -> None:
+        self._entries.pop(key)
+        index = self._indexes[key[0]]
+        index.remove(key[1])
+        if not index.messages:
+            del self._indexes[key[0]]
+
+
+RESPONSE_CACHE = ResponseCache()
+"""The cache shared by every game in the process."""
@@ -0,0 +1,510 @@
+"""Hedged and fallback model calls across an ordered list of backends.
+
+A backend is a (provider, model, base URL) triple. `ModelRouter.call` asks the
+first healthy backend and, if it has not answered after the hedge delay, also
+asks the next one. The first valid reply wins and the other requests are
+cancelled. A backend that fails is skipped straight away in favour of the
+next one.
+
+Each backend has a `CircuitBreaker` that stops routing to it after repeated
+failures and lets a single probe through once it has cooled down. Hedges are
+paid for from a `HedgeBudget`, so duplicated requests stay under a set share
+of all requests however slow the backends get.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional, Sequence, TypeVar
+
+from langchain_core.messages import AIMessage
+
+from react_agent.metrics import METRICS, LatencyWindow
+
+if TYPE_CHECKING:
+    from react_agent.configuration import Configuration
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_MIN_SAMPLES_FOR_P95 = 20
+
+
+@dataclass(frozen=True)
+class Backend:
+    """One model a call can be routed to."""
+
+    provider: str
+    model_name: str
+    base_url: Optional[str] = None
+
+    @classmethod
+    def parse(cls, spec: str, base_url: Optional[str] = None) -> Backend:
+        """Parse "provider/model", e.g. "anthropic/claude-3-5-haiku-latest"."""
+        provider, sep, model_name = spec.partition("/")
+        if not sep or not provider or not model_name:
+            raise ValueError(f"Expected 'provider/model', got {spec!r}")
+        return cls(provider, model_name, base_url if provider == "ollama" else None)
+
+    def __str__(self) -> str:
+        """Return the backend as "provider/model"."""
+        return f"{self.provider}/{self.model_name}"
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe.
+
+    Args:
+        failure_threshold: Consecutive failures that open the circuit.
+        reset_seconds: How long the circuit stays open before a probe is let
+            through.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0) -> None:
+        """Start closed, with no failures recorded."""
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """The breaker state: "closed", "open" or "half-open"."""
+        if self.opened_at is None:
+            return "closed"
+        if self._probing or time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a request may be sent; claims the probe when half-open."""
+        with self._lock:
+            if self.opened_at is None or self.failure_threshold <= 0:
+                return True
+            if self._probing or time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self._probing = True
+            return True
+
+    @property
+    def probing(self) -> bool:
+        """Whether the half-open probe request is in flight."""
+        return self._probing
+
+    def record_success(self) -> None:
+        """Close the circuit."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> bool:
+        """Count a failure; return True if this opened the circuit."""
+        with self._lock:
+            self.failures += 1
+            was_open = self.opened_at is not None
+            if self._probing or (
+                0 < self.failure_threshold <= self.failures and not was_open
+            ):
+                self.opened_at = time.monotonic()
+                self._probing = False
+                return not was_open
+            return False
+
+    def release(self) -> None:
+        """Give back a probe whose request was cancelled before it finished."""
+        with self._lock:
+            self._probing = False
+
+
+class HedgeBudget:
+    """Caps hedged requests at a share of all requests.
+
+    Every request earns `percent / 100` of a hedge, up to `burst` saved hedges,
+    and every hedge spends one.
+    """
+
+    def __init__(self, percent: float = 5.0, burst: float = 10.0) -> None:
+        """Start with no hedges saved; `earn` adds to them."""
+        self.percent = percent
+        self.burst = burst
+        self._balance = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        """Credit one request."""
+        with self._lock:
+            self._balance = min(self.burst, self._balance + self.percent / 100)
+
+    def try_spend(self) -> bool:
+        """Spend one hedge if the budget allows it."""
+        with self._lock:
+            # Allow for rounding: ten requests at 10% must earn a full hedge.
+            if self.percent <= 0 or self._balance < 1.0 - 1e-9:
+                return False
+            self._balance -= 1.0
+            return True
+
+    def refund(self) -> None:
+        """Return a hedge that was spent but never sent."""
+        with self._lock:
+            self._balance = min(self.burst, self._balance + 1.0)
+
+
+@dataclass
+class RouterStats:
+    """Counters describing routed calls."""
+
+    calls: int = 0
+    hedges: int = 0
+    """Duplicate requests fired because a backend was slow."""
+
+    hedge_wins: int = 0
+    """Calls answered by a hedge rather than the backend asked first."""
+
+    fallbacks: int = 0
+    """Requests sent to the next backend because a backend failed."""
+
+    rejected: int = 0
+    """Backends skipped because their circuit was open."""
+
+
+class NoBackendAvailable(RuntimeError):
+    """Raised when every backend failed or was skipped by its breaker."""
+
+
+def is_valid_reply(reply: object) -> bool:
+    """Return whether `reply` counts, i.e. has text or tool calls."""
+    if not isinstance(reply, AIMessage):
+        return reply is not None
+    return bool(reply.content) or bool(reply.tool_calls)
+
+
+class ModelRouter:
+    """Routes calls across backends with hedging, fallback and breakers."""
+
+    def __init__(self) -> None:
+        """Start with no breakers or latency history; both are kept per backend."""
+        self._breakers: dict[Backend, CircuitBreaker] = {}
+        self._latency: dict[Backend, LatencyWindow] = {}
+        self._budgets: dict[float, HedgeBudget] = {}
+        self._lock = threading.Lock()
+        self.stats = RouterStats()
+
+    def breaker(
+        self, backend: Backend, failure_threshold: int = 5, reset_seconds: float = 30.0
+    ) -> CircuitBreaker:
+        """Return the breaker of `backend`, applying the given settings."""
+        with self._lock:
+            breaker = self._breakers.get(backend)
+            if breaker is None:
+                breaker = self._breakers[backend] = CircuitBreaker()
+        breaker.failure_threshold = failure_threshold
+        breaker.reset_seconds = reset_seconds
+        return breaker
+
+    def latency(self, backend: Backend) -> LatencyWindow:
+        """Return the window of successful call latencies of `backend`."""
+        with self._lock:
+            window = self._latency.get(backend)
+            if window is None:
+                window = self._latency[backend] = LatencyWindow(max_samples=256)
+            return window
+
+    def budget(self, percent: float) -> HedgeBudget:
+        """Return the shared hedge budget for a spend cap of `percent`."""
+        with self._lock:
+            budget = self._budgets.get(percent)
+            if budget is None:
+                budget = self._budgets[percent] = HedgeBudget(percent)
+            return budget
+
+    def hedge_delay(self, backend: Backend, delay: float) -> Optional[float]:
+        """Seconds to wait for `backend` before hedging, or None not to hedge.
+
+        A `delay` of 0 uses the backend's observed p95 latency once enough
+        calls have been seen.
+        """
+        if delay > 0:
+            return delay
+        window = self.latency(backend)
+        if len(window) < _MIN_SAMPLES_FOR_P95:
+            return None
+        return window.percentile(95)
+
+    def reset(self) -> None:
+        """Forget breakers, latencies, budgets and counters."""
+        with self._lock:
+            self._breakers.clear()
+            self._latency.clear()
+            self._budgets.clear()
+        self.stats = RouterStats()
+
+    async def call(
+        self,
+        backends: Sequence[Backend],
+        request: Callable[[Backend, bool], Awaitable[T]],
+        *,
+        node: str,
+        hedge_delay: float = 0.0,
+        hedge_budget_percent: float = 5.0,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        is_valid: Callable[[T], bool] = is_valid_reply,
+    ) -> T:
+        """Send `request` to `backends` until one returns a valid reply.
+
+        Args:
+            backends: Backends in order of preference.
+            request: Called as ``request(backend, primary)``; `primary` is
+                False for hedges and fallbacks.
+            node: The calling node, used to label metrics.
+            hedge_delay: Seconds before hedging; 0 uses the observed p95.
+            hedge_budget_percent: Most hedges as a percentage of calls; 0
+                disables hedging but keeps fallback on failure.
+            failure_threshold: Consecutive failures that open a breaker; 0
+                disables the breakers.
+            reset_seconds: How long an open breaker rejects requests.
+            is_valid: Decides whether a reply is usable.
+
+        Raises:
+            NoBackendAvailable: If no backend produced a valid reply. The last
+                backend error, if any, is chained.
+        """
+        self.stats.calls += 1
+        budget = self.budget(hedge_budget_percent)
+        budget.earn()
+        queue = list(backends)
+        running: dict[asyncio.Task[T], tuple[Backend, CircuitBreaker, bool, float]] = {}
+        first: Optional[Backend] = None
+        last_error: Optional[BaseException] = None
+
+        def launch() -> Optional[Backend]:
+            nonlocal first
+            while queue:
+                backend = queue.pop(0)
+                breaker = self.breaker(backend, failure_threshold, reset_seconds)
+                if not breaker.allow():
+                    self.stats.rejected += 1
+                    METRICS.increment(
+                        "react_agent_llm_backend_rejected_total",
+                        node=node,
+                        backend=str(backend),
+                    )
+                    continue
+                task = asyncio.ensure_future(request(backend, first is None))
+                running[task] = (backend, breaker, breaker.probing, time.perf_counter())
+                first = first or backend
+                return backend
+            return None
+
+        try:
+            launch()
+            while running:
+                newest = next(reversed(running.values()))[0]
+                delay = self.hedge_delay(newest, hedge_delay) if queue else None
+                done, _ = await asyncio.wait(
+                    running, timeout=delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Still waiting after the hedge delay: ask the next backend
+                    # too. A spent budget is checked again after the next
+                    # delay, and a hedge with no backend left to ask is refunded.
+                    if budget.try_spend():
+                        if launch() is None:
+                            budget.refund()
+                        else:
+                            self.stats.hedges += 1
+                            METRICS.increment(
+                                "react_agent_llm_hedges_total",
+                                node=node,
+                                backend=str(newest),
+                            )
+                    continue
+                for task in done:
+                    backend, breaker, _, started = running.pop(task)
+                    error = task.exception()
+                    if error is None and is_valid(task.result()):
+                        breaker.record_success()
+                        self.latency(backend).observe(time.perf_counter() - started)
+                        if backend != first:
+                            self.stats.hedge_wins += 1
+                        return task.result()
+                    last_error = error or last_error
+                    logger.warning(
+                        "Backend %s failed for %s: %r",
+                        backend,
+                        node,
+                        error or "invalid reply",
+                    )
+                    if breaker.record_failure():
+                        logger.warning("Circuit opened for backend %s", backend)
+                        METRICS.increment(
+                            "react_agent_llm_circuit_opened_total",
+                            backend=str(backend),
+                        )
+                    if not running and launch() is not None:
+                        self.stats.fallbacks += 1
+                        METRICS.increment(
+                            "react_agent_llm_fallbacks_total",
+                            node=node,
+                            backend=str(backend),
+                        )
+        finally:
+            for task, (_, breaker, probe, _) in running.items():
+                task.cancel()
+                if probe:
+                    breaker.release()
+        raise NoBackendAvailable(
+            f"No backend answered {node}: {', '.join(map(str, backends))}"
+        ) from last_error
+
+
+MODEL_ROUTER = ModelRouter()
+"""The router shared by every node in the process."""
+
+
+ROLES = ("captain", "guard", "reaction", "summarizer")
+"""The model roles: `call_model`, `check_incoming_message`,
+`incorrect_weapons_key` and the history summarizer."""
+
+
+def _role_backend(
+    configuration: Configuration, role: str
+) -> tuple[Optional[Backend], str]:
+    spec = getattr(configuration, f"{role}_model", "")
+    reason = "role"
+    if not spec:
+        difficulty = configuration.game_difficulty.lower()
+        spec = configuration.models_by_difficulty.get(difficulty, "")
+        reason = "difficulty"
+    if not spec:
+        return None, "default"
+    return Backend.parse(spec), reason
+
+
+def ollama_models(configuration: Configuration) -> list[str]:
+    """Return the Ollama models the roles use, in `ROLES` order, without duplicates.
+
+    With `ollama_max_loaded_models` set, only the first that many are listed;
+    these are the models a game keeps loaded.
+    """
+    models: list[str] = []
+    for role in ROLES:
+        backend, _ = _role_backend(configuration, role)
+        if backend is None:
+            backend = Backend(configuration.model_provider, configuration.model_name)
+        if backend.provider == "ollama" and backend.model_name not in models:
+            models.append(backend.model_name)
+    if configuration.ollama_max_loaded_models > 0:
+        return models[: configuration.ollama_max_loaded_models]
+    return models
+
+
+def _route_role(
+    configuration: Configuration, role: str
+) -> tuple[Optional[Backend], str]:
+    backend, reason = _role_backend(configuration, role)
+    if (
+        backend is not None
+        and backend.provider == "ollama"
+        and configuration.ollama_max_loaded_models > 0
+        and backend.model_name not in ollama_models(configuration)
+    ):
+        backend, _ = _role_backend(configuration, "captain")
+        reason = "residency"
+    return backend, reason
+
+
+def role_backend(configuration: Configuration, role: str) -> Backend:
+    """Return the backend `model_for_role` picks for `role`, without counting it."""
+    backend, _ = _route_role(configuration, role)
+    if backend is None:
+        return Backend(configuration.model_provider, configuration.model_name)
+    return backend
+
+
+def model_for_role(configuration: Configuration, role: str) -> Configuration:
+    """Point `configuration` at the model configured for `role`.
+
+    The role's own `<role>_model` setting wins, then the model listed for the
+    game's difficulty in `models_by_difficulty`, then `model_provider` and
+    `model_name`. An Ollama model that would not fit next to the models of the
+    earlier roles, given `ollama_max_loaded_models`, is replaced by the
+    captain's model, so one server does not keep swapping models in and out.
+    The decision is counted in `react_agent_llm_role_routes_total` so latency
+    and cost can be compared per role. `configuration` itself is returned when
+    the default model applies.
+    """
+    backend, reason = _route_role(configuration, role)
+    if backend is not None:
+        configuration = replace(
+            configuration,
+            model_provider=backend.provider,
+            model_name=backend.model_name,
+        )
+    METRICS.increment(
+        "react_agent_llm_role_routes_total",
+        role=role,
+        model=f"{configuration.model_provider}/{configuration.model_name}",
+        reason=reason,
+    )
+    return configuration
+
+
+def backends_for(configuration: Configuration) -> list[Backend]:
+    """Return the configured model followed by its fallback models."""
+    base_url = configuration.ollama_base_url
+    primary = Backend(
+        configuration.model_provider,
+        configuration.model_name,
+        base_url if configuration.model_provider == "ollama" else None,
+    )
+    return [
+        primary,
+        *(Backend.parse(spec, base_url) for spec in configuration.fallback_models),
+    ]
+
+
+async def ainvoke_routed(
+    configuration: Configuration,
+    request: Callable[[Configuration, bool], Awaitable[T]],
+    *,
+    node: str,
+    router: Optional[ModelRouter] = None,
+) -> T:
+    """Run a model request against the configured model and its fallbacks.
+
+    `request` is called as ``request(configuration, primary)`` with a copy of
+    `configuration` pointing at one backend. Without `fallback_models` it is
+    simply called once with `configuration` itself.
+    """
+    if not configuration.fallback_models:
+        return await request(configuration, True)
+
+    async def call(backend: Backend, primary: bool) -> T:
+        return await request(
+            replace(
+                configuration,
+                model_provider=backend.provider,
+                model_name=backend.model_name,
+            ),
+            primary,
+        )
+
+    return await (router or MODEL_ROUTER).call(
+        backends_for(configuration),
+        call,
+        node=node,
+        hedge_delay=configuration.hedge_delay_ms / 1000,
+        hedge_budget_percent=configuration.hedge_budget_percent,
+        failure_threshold=configuration.circuit_breaker_failures,
+        reset_seconds=configuration.circuit_breaker_reset_seconds,
+    )
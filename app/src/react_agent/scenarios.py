@@ -0,0 +1,270 @@
+"""Mission dilemmas loaded from `src/data/scenarios.json`.
+
+The file is parsed and validated once into an immutable `ScenarioBook`. Each
+scenario has a stable integer index, so a thread's progress is stored in
+`State` as two integers (the current index and a bitmask of the scenarios
+already played) rather than as copied text, and each scenario's mission prompt
+is rendered ahead of time.
+
+`ScenarioCatalog` holds the current book and can swap in a reloaded one at
+any time. Reloading keeps every known id at its old index and retires removed
+ids instead of renumbering, so games already in progress keep resolving to
+the same scenario.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+from itertools import accumulate
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+from react_agent.prompts import NEW_GAME_PROMPT, SCENARIO_PROMPT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCENARIOS_PATH = (
+    Path(__file__).resolve().parent.parent / "data" / "scenarios.json"
+)
+
+
+class ScenarioError(ValueError):
+    """Raised when a scenarios file is malformed."""
+
+
+@dataclass(frozen=True, slots=True)
+class Scenario:
+    """One mission dilemma."""
+
+    index: int
+    id: str
+    text: str
+    choices: tuple[str, ...]
+    weight: float
+    prompt: str
+    """The rendered mission message that starts a game with this scenario."""
+
+    @property
+    def retired(self) -> bool:
+        """Whether the scenario was removed from the file by a reload."""
+        return self.weight == 0
+
+
+def render_prompt(text: str, choices: tuple[str, ...]) -> str:
+    """Render the mission message for a scenario."""
+    numbered = (f"{number}. {choice}" for number, choice in enumerate(choices, 1))
+    return NEW_GAME_PROMPT + SCENARIO_PROMPT.format(
+        scenario=text, choices="\n".join(numbered)
+    )
+
+
+def _parse(data: Any) -> list[tuple[str, str, tuple[str, ...], float]]:
+    if not isinstance(data, dict) or not isinstance(data.get("scenarios"), list):
+        raise ScenarioError('Expected an object with a "scenarios" list')
+    parsed = []
+    seen: set[str] = set()
+    for position, item in enumerate(data["scenarios"]):
+        where = f"scenarios[{position}]"
+        if not isinstance(item, dict):
+            raise ScenarioError(f"{where} must be an object")
+        scenario_id = item.get("id")
+        if not isinstance(scenario_id, str) or not scenario_id.strip():
+            raise ScenarioError(f"{where}.id must be a non-empty string")
+        if scenario_id in seen:
+            raise ScenarioError(f"{where}.id {scenario_id!r} is not unique")
+        seen.add(scenario_id)
+        text = item.get("scenario")
+        if not isinstance(text, str) or not text.strip():
+            raise ScenarioError(f"{where}.scenario must be a non-empty string")
+        choices = item.get("choices")
+        if (
+            not isinstance(choices, list)
+            or len(choices) < 2
+            or not all(isinstance(c, str) and c.strip() for c in choices)
+        ):
+            raise ScenarioError(f"{where}.choices must list at least two strings")
+        weight = item.get("weight", 1)
+        if not isinstance(weight, (int, float)) or isinstance(weight, bool) or weight <= 0:
+            raise ScenarioError(f"{where}.weight must be a positive number")
+        parsed.append((scenario_id, text.strip(), tuple(choices), float(weight)))
+    if not parsed:
+        raise ScenarioError("The scenarios list is empty")
+    return parsed
+
+
+class ScenarioBook:
+    """An immutable, index-addressed set of scenarios."""
+
+    __slots__ = ("scenarios", "by_id", "digest", "_cumulative", "_total", "_active")
+
+    def __init__(self, scenarios: tuple[Scenario, ...], digest: str) -> None:
+        """Index `scenarios`; `digest` is the hash of the data they came from."""
+        self.scenarios = scenarios
+        self.by_id: Mapping[str, Scenario] = MappingProxyType(
+            {scenario.id: scenario for scenario in scenarios}
+        )
+        self.digest = digest
+        self._cumulative = tuple(accumulate(s.weight for s in scenarios))
+        self._total = self._cumulative[-1] if scenarios else 0.0
+        self._active = (1 << len(scenarios)) - 1
+        for scenario in scenarios:
+            if scenario.retired:
+                self._active &= ~(1 << scenario.index)
+
+    @classmethod
+    def from_data(
+        cls, data: Any, previous: Optional[ScenarioBook] = None
+    ) -> ScenarioBook:
+        """Validate parsed JSON and build a book, keeping `previous`'s indices."""
+        parsed = _parse(data)
+        digest = hashlib.blake2b(
+            json.dumps(data, sort_keys=True).encode(), digest_size=8
+        ).hexdigest()
+        if previous is None:
+            slots: list[Optional[Scenario]] = []
+            index_of: dict[str, int] = {}
+        else:
+            # Existing ids keep their index; removed ones stay, retired.
+            slots = [
+                Scenario(s.index, s.id, s.text, s.choices, 0.0, s.prompt)
+                for s in previous.scenarios
+            ]
+            index_of = {s.id: s.index for s in previous.scenarios}
+        for scenario_id, text, choices, weight in parsed:
+            index = index_of.get(scenario_id)
+            if index is None:
+                index = index_of[scenario_id] = len(slots)
+                slots.append(None)
+            slots[index] = Scenario(
+                index, scenario_id, text, choices, weight, render_prompt(text, choices)
+            )
+        return cls(tuple(s for s in slots if s is not None), digest)
+
+    @classmethod
+    def load(
+        cls, path: str | os.PathLike[str], previous: Optional[ScenarioBook] = None
+    ) -> ScenarioBook:
+        """Read, validate and index a scenarios file."""
+        with open(path, encoding="utf-8") as file:
+            try:
+                data = json.load(file)
+            except json.JSONDecodeError as error:
+                raise ScenarioError(f"{path} is not valid JSON: {error}") from error
+        return cls.from_data(data, previous)
+
+    def __len__(self) -> int:
+        """Return the number of scenarios."""
+        return len(self.scenarios)
+
+    def __getitem__(self, index: int) -> Scenario:
+        """Return the scenario at `index`."""
+        return self.scenarios[index]
+
+    def get(self, scenario_id: str) -> Optional[Scenario]:
+        """Return the scenario with `scenario_id`, if there is one."""
+        return self.by_id.get(scenario_id)
+
+    def all_played(self, played: int) -> bool:
+        """Whether the bitmask `played` covers every active scenario."""
+        return self._active & ~played == 0
+
+    def sample(
+        self, exclude: int = 0, rng: Optional[random.Random] = None
+    ) -> Scenario:
+        """Draw an active scenario by weight, avoiding indices set in `exclude`.
+
+        Once every active scenario is excluded, the exclusion is ignored.
+        """
+        uniform = (rng or random).random
+        allowed = self._active & ~exclude or self._active
+        if allowed == self._active:
+            index = bisect_right(self._cumulative, uniform() * self._total)
+            return self.scenarios[index]
+        # Rejection sampling is cheap while most scenarios are still allowed.
+        for _ in range(8):
+            index = bisect_right(self._cumulative, uniform() * self._total)
+            if allowed >> index & 1:
+                return self.scenarios[index]
+        candidates = [s for s in self.scenarios if allowed >> s.index & 1]
+        weights = list(accumulate(s.weight for s in candidates))
+        return candidates[bisect_right(weights, uniform() * weights[-1])]
+
+
+class ScenarioCatalog:
+    """The live `ScenarioBook`, reloaded in the background when its file changes.
+
+    Args:
+        path: The scenarios file.
+        check_interval: Minimum seconds between checks of the file's mtime.
+    """
+
+    def __init__(
+        self, path: str | os.PathLike[str], check_interval: float = 5.0
+    ) -> None:
+        """Load nothing yet; the file is read on the first lookup."""
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._book: Optional[ScenarioBook] = None
+        self._mtime = 0.0
+        self._next_check = 0.0
+        self._reloading = threading.Lock()
+
+    @property
+    def book(self) -> ScenarioBook:
+        """The current book, loading the file on first use."""
+        book = self._book
+        if book is None:
+            with self._reloading:
+                if self._book is None:
+                    self._mtime = self.path.stat().st_mtime
+                    self._book = ScenarioBook.load(self.path)
+                book = self._book
+        return book
+
+    def reload(self) -> ScenarioBook:
+        """Load the file now and swap it in; the old book stays on error."""
+        with self._reloading:
+            mtime = self.path.stat().st_mtime
+            book = ScenarioBook.load(self.path, previous=self._book)
+            self._book, self._mtime = book, mtime
+        logger.info("Loaded %d scenarios from %s", len(book), self.path)
+        return book
+
+    def maybe_reload(self) -> None:
+        """Start a background reload if the file changed since it was loaded.
+
+        Callers keep using the current book while the new one is parsed; the
+        swap is a single reference assignment.
+        """
+        now = time.monotonic()
+        if now < self._next_check or self._book is None:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            changed = self.path.stat().st_mtime != self._mtime
+        except OSError:
+            return
+        if changed and not self._reloading.locked():
+            threading.Thread(
+                target=self._reload_quietly, name="scenario-reload", daemon=True
+            ).start()
+
+    def _reload_quietly(self) -> None:
+        try:
+            self.reload()
+        except (OSError, ScenarioError):
+            logger.exception("Keeping the previous scenarios; reload failed")
+
+
+SCENARIOS = ScenarioCatalog(
+    os.environ.get("REACT_AGENT_SCENARIOS", DEFAULT_SCENARIOS_PATH)
+)
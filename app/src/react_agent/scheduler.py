@@ -0,0 +1,475 @@
+"""Process-wide admission control for model calls.
+
+Every model call is admitted by `LLM_SCHEDULER` before it is sent. Each
+provider has its own queue with:
+
+* token buckets for requests per minute and tokens per minute, charged with
+  the estimated prompt size up front and settled against the reported usage
+  afterwards;
+* an AIMD concurrency limit that grows by one call per round trip while calls
+  are healthy and halves when the provider answers 429 or its latency climbs
+  well above its usual level;
+* strict priority between guard checks, active players' turns and background
+  work such as history summaries, with background work shed first when the
+  queue is full and any call shed once it has waited too long.
+
+Rate-limited calls are retried by the scheduler after the provider's
+`Retry-After`, instead of by each SDK on its own, so a burst of 429s slows the
+whole process down rather than multiplying the load. Clients loaded with
+``scheduled=True`` are built with the SDK's own retries turned off.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import enum
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional, TypeVar
+
+from react_agent.metrics import METRICS, LatencyWindow
+
+if TYPE_CHECKING:
+    from react_agent.configuration import Configuration
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Priority(enum.IntEnum):
+    """Admission order; lower values go first."""
+
+    GUARD = 0
+    INTERACTIVE = 1
+    BACKGROUND = 2
+
+
+class RequestShed(RuntimeError):
+    """Raised when the scheduler drops a call instead of queueing it further."""
+
+
+@dataclass(frozen=True)
+class SchedulerSettings:
+    """Limits applied to one provider's queue."""
+
+    enabled: bool = True
+    requests_per_minute: float = 0.0
+    tokens_per_minute: float = 0.0
+    max_concurrency: int = 64
+    max_queue: int = 1000
+    max_wait: float = 30.0
+    max_retries: int = 2
+
+    @classmethod
+    def from_configuration(cls, configuration: Configuration) -> SchedulerSettings:
+        """Read the scheduler fields of `configuration`."""
+        return cls(
+            enabled=configuration.scheduler_enabled,
+            requests_per_minute=configuration.scheduler_requests_per_minute,
+            tokens_per_minute=configuration.scheduler_tokens_per_minute,
+            max_concurrency=configuration.scheduler_max_concurrency,
+            max_queue=configuration.scheduler_max_queue,
+            max_wait=configuration.scheduler_max_wait_seconds,
+        )
+
+
+class TokenBucket:
+    """A refilling allowance of `per_minute` units.
+
+    The bucket holds at most one second's worth, so a quiet spell does not turn
+    into a burst the provider's own, finer-grained limiter would reject.
+    Settling actual usage may push the level below zero; callers then wait
+    until the debt is repaid.
+    """
+
+    def __init__(self, per_minute: float = 0.0) -> None:
+        """Start full, refilling at `per_minute`; 0 means unlimited."""
+        self.per_minute = 0.0
+        self.capacity = 0.0
+        self.level = 0.0
+        self._updated = time.monotonic()
+        self.configure(per_minute)
+
+    def configure(self, per_minute: float) -> None:
+        """Change the rate; 0 means unlimited."""
+        if per_minute == self.per_minute:
+            return
+        was_limited = self.per_minute > 0
+        self.per_minute = per_minute
+        self.capacity = max(per_minute / 60, 1.0)
+        self.level = min(self.level, self.capacity) if was_limited else self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        rate = self.per_minute / 60
+        elapsed = max(now - self._updated, 0.0)
+        self.level = min(self.capacity, self.level + elapsed * rate)
+        self._updated = max(now, self._updated)
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken; 0 if it can be taken now."""
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill(now)
+        # Requests larger than the bucket only wait for a full bucket.
+        missing = min(amount, self.capacity) - self.level
+        return max(missing, 0.0) / (self.per_minute / 60)
+
+    def take(self, amount: float, now: float) -> None:
+        """Remove `amount`, which may leave the bucket in debt."""
+        if self.per_minute > 0:
+            self._refill(now)
+            self.level -= amount
+
+
+class AdaptiveLimit:
+    """Additive-increase, multiplicative-decrease limit on concurrent calls.
+
+    Latency is tracked with a fast and a slow moving average. A call that
+    finishes while the fast average is more than `tolerance` times the slow
+    one (and at least 100 ms above it) counts as a congestion signal, like a 429
+    does. The limit is cut at most once per round trip so one burst of slow
+    calls only halves it once.
+    """
+
+    def __init__(
+        self, maximum: int = 64, minimum: int = 1, backoff: float = 0.5,
+        tolerance: float = 3.0,
+    ) -> None:
+        """Start at `maximum` concurrent calls, with no latency history."""
+        self.maximum = maximum
+        self.minimum = minimum
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.limit = float(maximum)
+        self._fast = 0.0
+        self._slow = 0.0
+        self._last_cut = 0.0
+
+    def configure(self, maximum: int) -> None:
+        """Change the ceiling, clamping the current limit to it."""
+        if maximum != self.maximum:
+            self.maximum = maximum
+            self.limit = min(self.limit, float(maximum)) if maximum > 0 else 0.0
+
+    def on_success(self, latency: float) -> None:
+        """Grow the limit by about one per round trip, or cut it on congestion."""
+        if self._slow == 0.0:
+            self._fast = self._slow = latency
+        else:
+            self._fast += 0.2 * (latency - self._fast)
+            self._slow += 0.01 * (latency - self._slow)
+        # The absolute margin keeps jitter on very fast calls from counting.
+        if self._fast > max(self.tolerance * self._slow, self._slow + 0.1):
+            self.on_overload()
+        elif self.maximum > 0:
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+    def on_overload(self) -> None:
+        """Cut the limit after a 429 or a latency spike."""
+        now = time.monotonic()
+        if now - self._last_cut < max(self._fast, 0.05):
+            return
+        self._last_cut = now
+        self.limit = max(float(self.minimum), self.limit * self.backoff)
+
+
+@dataclass
+class SchedulerStats:
+    """Counters for one provider's queue."""
+
+    admitted: int = 0
+    shed: int = 0
+    rate_limited: int = 0
+    """Calls the provider answered with 429."""
+
+    retried: int = 0
+    waits: LatencyWindow = field(default_factory=LatencyWindow)
+    """Seconds each admitted call spent queued."""
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    tokens: float = field(compare=False)
+    future: asyncio.Future[None] = field(compare=False)
+
+
+class ProviderQueue:
+    """Admission queue, rate limits and concurrency limit of one provider."""
+
+    def __init__(self, provider: str, loop: asyncio.AbstractEventLoop) -> None:
+        """Create the queue with default settings; `configure` replaces them."""
+        self.provider = provider
+        self.loop = loop
+        self.requests = TokenBucket()
+        self.tokens = TokenBucket()
+        self.limit = AdaptiveLimit()
+        self.settings = SchedulerSettings()
+        self.inflight = 0
+        self.paused_until = 0.0
+        self.stats = SchedulerStats()
+        self._waiters: list[_Waiter] = []
+        self._queued = 0
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def configure(self, settings: SchedulerSettings) -> None:
+        """Apply the latest settings seen for this provider."""
+        self.settings = settings
+        self.requests.configure(settings.requests_per_minute)
+        self.tokens.configure(settings.tokens_per_minute)
+        self.limit.configure(settings.max_concurrency)
+
+    @property
+    def depth(self) -> int:
+        """Calls waiting to be admitted."""
+        return self._queued
+
+    async def acquire(self, priority: Priority, tokens: float) -> float:
+        """Wait for admission and return the seconds spent waiting."""
+        settings = self.settings
+        if not self._waiters and self._delay(tokens) == 0.0 and self._has_room():
+            self._admit(tokens)
+            self._observe_wait(priority, 0.0)
+            return 0.0
+        if priority == Priority.BACKGROUND and self.depth >= settings.max_queue:
+            self._shed(priority, "queue full")
+
+        start = time.perf_counter()
+        waiter = _Waiter(
+            priority, next(self._sequence), tokens, self.loop.create_future()
+        )
+        heapq.heappush(self._waiters, waiter)
+        self._queued += 1
+        self._gauges()
+        self._pump()
+        try:
+            await asyncio.wait_for(waiter.future, settings.max_wait or None)
+        except TimeoutError:
+            self._shed(priority, "waited too long")
+        except BaseException:
+            # Cancelled right after being admitted: hand the slot back.
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.inflight -= 1
+                self._pump()
+            raise
+        finally:
+            self._queued -= 1
+            self._gauges()
+        waited = time.perf_counter() - start
+        self._observe_wait(priority, waited)
+        return waited
+
+    def release(
+        self,
+        latency: float,
+        *,
+        estimated_tokens: float = 0.0,
+        used_tokens: Optional[float] = None,
+        rate_limited: bool = False,
+        retry_after: float = 0.0,
+        healthy: bool = True,
+    ) -> None:
+        """Return a slot and feed the outcome of the call back into the limits."""
+        self.inflight -= 1
+        now = time.monotonic()
+        if used_tokens is not None:
+            self.tokens.take(used_tokens - estimated_tokens, now)
+        if rate_limited:
+            self.stats.rate_limited += 1
+            METRICS.increment(
+                "react_agent_scheduler_rate_limited_total", provider=self.provider
+            )
+            self.paused_until = max(self.paused_until, now + retry_after)
+            self.limit.on_overload()
+        elif healthy:
+            self.limit.on_success(latency)
+        self._gauges()
+        self._pump()
+
+    def _has_room(self) -> bool:
+        return self.settings.max_concurrency <= 0 or self.inflight < max(
+            int(self.limit.limit), 1
+        )
+
+    def _delay(self, tokens: float) -> float:
+        now = time.monotonic()
+        return max(
+            self.paused_until - now,
+            self.requests.delay(1, now),
+            self.tokens.delay(tokens, now),
+            0.0,
+        )
+
+    def _admit(self, tokens: float) -> None:
+        now = time.monotonic()
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+        self.inflight += 1
+        self.stats.admitted += 1
+
+    def _pump(self) -> None:
+        """Admit waiters in priority order while the limits allow."""
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter.future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._has_room():
+                return
+            delay = self._delay(waiter.tokens)
+            if delay > 0:
+                if self._timer is None or self._timer.when() > self.loop.time() + delay:
+                    if self._timer is not None:
+                        self._timer.cancel()
+                    self._timer = self.loop.call_later(delay, self._wake)
+                return
+            heapq.heappop(self._waiters)
+            self._admit(waiter.tokens)
+            waiter.future.set_result(None)
+
+    def _wake(self) -> None:
+        self._timer = None
+        self._pump()
+
+    def _shed(self, priority: Priority, reason: str) -> None:
+        self.stats.shed += 1
+        METRICS.increment(
+            "react_agent_scheduler_shed_total",
+            provider=self.provider,
+            priority=priority.name.lower(),
+        )
+        raise RequestShed(f"{self.provider} call shed: {reason}")
+
+    def _observe_wait(self, priority: Priority, seconds: float) -> None:
+        self.stats.waits.observe(seconds)
+        METRICS.observe(
+            "react_agent_scheduler_wait_seconds",
+            seconds,
+            provider=self.provider,
+            priority=priority.name.lower(),
+        )
+
+    def _gauges(self) -> None:
+        METRICS.set_gauge(
+            "react_agent_scheduler_queue_depth", self.depth, provider=self.provider
+        )
+        METRICS.set_gauge(
+            "react_agent_scheduler_inflight", self.inflight, provider=self.provider
+        )
+        METRICS.set_gauge(
+            "react_agent_scheduler_concurrency_limit",
+            self.limit.limit,
+            provider=self.provider,
+        )
+
+
+def rate_limit_retry_after(error: BaseException) -> Optional[float]:
+    """Return the back-off for a 429 error, or None if `error` is not a 429."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(
+        response, "status_code", None
+    )
+    if status != 429:
+        return None
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return float(retry_after)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 1.0))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class LLMScheduler:
+    """One `ProviderQueue` per provider and event loop."""
+
+    def __init__(self) -> None:
+        """Start with no queues; each provider gets one on first use."""
+        self._queues: dict[str, ProviderQueue] = {}
+
+    def queue(self, provider: str) -> ProviderQueue:
+        """Return the queue of `provider` on the running event loop."""
+        loop = asyncio.get_running_loop()
+        queue = self._queues.get(provider)
+        if queue is None or queue.loop is not loop:
+            queue = self._queues[provider] = ProviderQueue(provider, loop)
+        return queue
+
+    def stats(self, provider: str) -> Optional[SchedulerStats]:
+        """Counters of `provider`'s queue, if it has been used."""
+        queue = self._queues.get(provider)
+        return queue.stats if queue is not None else None
+
+    def clear(self) -> None:
+        """Forget every queue."""
+        self._queues.clear()
+
+    async def run(
+        self,
+        provider: str,
+        call: Callable[[], Awaitable[T]],
+        *,
+        priority: Priority = Priority.INTERACTIVE,
+        tokens: float = 0.0,
+        settings: Optional[SchedulerSettings] = None,
+        usage: Callable[[T], Optional[float]] = lambda _: None,
+    ) -> T:
+        """Admit and run `call`, retrying it when the provider answers 429.
+
+        Args:
+            provider: The provider the call goes to.
+            call: Makes the model call.
+            priority: The call's admission class.
+            tokens: Estimated tokens the call will consume.
+            settings: Limits for `provider`; None keeps the last ones applied.
+            usage: Returns the tokens a result actually consumed, if known.
+
+        Raises:
+            RequestShed: If the call was dropped while queued.
+        """
+        if settings is not None and not settings.enabled:
+            return await call()
+        queue = self.queue(provider)
+        if settings is not None:
+            queue.configure(settings)
+        attempt = 0
+        while True:
+            await queue.acquire(priority, tokens)
+            start = time.perf_counter()
+            try:
+                result = await call()
+            except BaseException as error:
+                retry_after = rate_limit_retry_after(error)
+                queue.release(
+                    time.perf_counter() - start,
+                    estimated_tokens=tokens,
+                    rate_limited=retry_after is not None,
+                    retry_after=retry_after or 0.0,
+                    healthy=False,
+                )
+                if retry_after is None or attempt >= queue.settings.max_retries:
+                    raise
+                attempt += 1
+                queue.stats.retried += 1
+                logger.debug(
+                    "%s rate limited, retrying in %.2fs", provider, retry_after
+                )
+                continue
+            queue.release(
+                time.perf_counter() - start,
+                estimated_tokens=tokens,
+                used_tokens=usage(result),
+            )
+            return result
+
+
+LLM_SCHEDULER = LLMScheduler()
+"""The scheduler shared by every model call in the process."""
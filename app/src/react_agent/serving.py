@@ -0,0 +1,612 @@
+"""Serve games from several worker processes, each game pinned to one worker.
+
+`langgraph dev` runs every game on one event loop and one core. A
+`ShardedGameServer` starts one process per worker instead. Each process
+compiles its own `agent` and `extra_hard_agent` graphs and keeps its own
+model client pools. Requests go to the worker that owns their `thread_id` on a
+consistent-hash `HashRing`, so a game's latest state stays cached in that
+worker's `DeltaSqliteSaver`.
+
+All workers share one checkpoint file. When a worker dies, or workers are
+added or removed, the threads it owned move to the next worker on the ring.
+That worker resumes them from the shared file. Only about 1/N of the threads
+move when the N-th worker is added. A thread with a turn in flight stays on
+its current worker until the turn finishes, so no game is ever run by two
+workers at once.
+
+Run it with an HTTP front end that accepts LangGraph's
+`POST /threads/{thread_id}/runs/wait` requests, as JSON or, with
+`Content-Type`/`Accept: application/msgpack`, as MessagePack:
+
+    python -m react_agent.serving --workers 4 --port 2024
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Optional
+
+import httpx
+import ormsgpack
+from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+MSGPACK = "application/msgpack"
+
+GRAPHS = ("agent", "extra_hard_agent")
+"""Graph names as in langgraph.json, mapped to `builder` and `extra_hard_builder`."""
+
+_LIVENESS_INTERVAL = 0.5
+"""Seconds between checks that every worker process is still running."""
+
+
+class WorkerLost(RuntimeError):
+    """The worker running a request exited before answering it."""
+
+
+class HashRing:
+    """Consistent hashing of thread ids onto worker indexes.
+
+    Each worker gets `replicas` points on the ring, so threads spread evenly
+    and adding or removing a worker only moves the threads next to its points.
+
+    Args:
+        nodes: The worker indexes to start with.
+        replicas: Points per worker.
+    """
+
+    def __init__(self, nodes: Iterable[int] = (), replicas: int = 64) -> None:
+        """Place `replicas` points for each of `nodes` on the ring."""
+        self.replicas = replicas
+        self._points: list[int] = []
+        self._owners: list[int] = []
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> list[int]:
+        """The worker indexes on the ring, in ascending order."""
+        return sorted(set(self._owners))
+
+    def add(self, node: int) -> None:
+        """Place `node` on the ring."""
+        if node in self._owners:
+            return
+        for replica in range(self.replicas):
+            point = _hash(f"{node}:{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: int) -> None:
+        """Take `node` off the ring."""
+        kept = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def owner(self, key: str) -> int:
+        """Return the worker that owns `key`.
+
+        Raises:
+            LookupError: If the ring is empty.
+        """
+        if not self._points:
+            raise LookupError("No workers on the ring")
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+@dataclass
+class WorkerStats:
+    """Requests a worker answered and failed."""
+
+    completed: int = 0
+    failed: int = 0
+
+
+@dataclass
+class _Worker:
+    index: int
+    process: Any
+    requests: Any
+    pending: dict[int, asyncio.Future[Any]] = field(default_factory=dict)
+    stopping: bool = False
+    stats: WorkerStats = field(default_factory=WorkerStats)
+
+
+class ShardedGameServer:
+    """Run games on `workers` processes that share one checkpoint file.
+
+    Args:
+        workers: Worker processes to start; defaults to the number of cores.
+        checkpoint_path: The SQLite file every worker checkpoints to.
+        synchronous: SQLite `synchronous` pragma for the workers' savers.
+        replicas: Points per worker on the `HashRing`.
+        initializer: Called in each worker before its graphs are compiled, for
+            example to register model providers. Must be picklable.
+
+    Example:
+        ```python
+        async with ShardedGameServer(workers=4) as server:
+            state = await server.ainvoke(
+                {"messages": [("user", "Hello captain")]},
+                {"configurable": {"thread_id": "player-1"}},
+            )
+        ```
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        checkpoint_path: str = "games.sqlite",
+        *,
+        synchronous: str = "NORMAL",
+        replicas: int = 64,
+        initializer: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Configure the server; no worker starts until `start`."""
+        self.checkpoint_path = checkpoint_path
+        self.synchronous = synchronous
+        self.initializer = initializer
+        self.ring = HashRing(replicas=replicas)
+        self._initial_workers = workers or os.cpu_count() or 1
+        self._context = multiprocessing.get_context("spawn")
+        self._responses: Any = None
+        self._workers: dict[int, _Worker] = {}
+        self._ready: dict[int, asyncio.Future[None]] = {}
+        self._pinned: dict[str, tuple[int, int]] = {}
+        self._request_ids = itertools.count()
+        self._next_index = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[threading.Thread] = None
+
+    async def __aenter__(self) -> ShardedGameServer:
+        """Start the workers and return the server."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        """Stop the workers."""
+        await self.close()
+
+    @property
+    def workers(self) -> list[int]:
+        """Indexes of the running workers."""
+        return sorted(self._workers)
+
+    def stats(self, index: int) -> WorkerStats:
+        """Return the request counters of worker `index`."""
+        return self._workers[index].stats
+
+    async def start(self) -> None:
+        """Start the initial workers and wait until they can take requests."""
+        self._loop = asyncio.get_running_loop()
+        self._responses = self._context.Queue()
+        self._reader = threading.Thread(
+            target=self._read_responses, name="sharded-game-server", daemon=True
+        )
+        self._reader.start()
+        await asyncio.gather(
+            *(self.add_worker() for _ in range(self._initial_workers))
+        )
+
+    async def add_worker(self) -> int:
+        """Start one more worker and move its share of the threads to it.
+
+        Returns:
+            The new worker's index.
+        """
+        loop = asyncio.get_running_loop()
+        index = next(self._next_index)
+        requests = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                index,
+                self.checkpoint_path,
+                self.synchronous,
+                requests,
+                self._responses,
+                self.initializer,
+            ),
+            name=f"game-worker-{index}",
+            daemon=True,
+        )
+        ready = self._ready[index] = loop.create_future()
+        process.start()
+        self._workers[index] = _Worker(index, process, requests)
+        try:
+            await ready
+        except BaseException:
+            self._workers.pop(index, None)
+            process.kill()
+            raise
+        finally:
+            del self._ready[index]
+        self.ring.add(index)
+        self._broadcast_ring()
+        logger.info("Worker %d ready, %d running", index, len(self._workers))
+        return index
+
+    async def remove_worker(self, index: int) -> None:
+        """Stop routing to worker `index`, let it finish its turns and stop it."""
+        worker = self._workers[index]
+        worker.stopping = True
+        self.ring.remove(index)
+        self._broadcast_ring()
+        # Threads with a turn in flight stay pinned here until they finish.
+        while worker.pending:
+            await asyncio.gather(*worker.pending.values(), return_exceptions=True)
+        worker.requests.put(("stop",))
+        await asyncio.to_thread(worker.process.join, 10)
+        self._workers.pop(index, None)
+
+    async def ainvoke(
+        self,
+        input: Any,
+        config: dict[str, Any],
+        *,
+        graph: str = "agent",
+    ) -> dict[str, Any]:
+        """Run one turn of the game in `config["configurable"]["thread_id"]`.
+
+        Args:
+            input: The graph input, e.g. `{"messages": [("user", "Hi")]}`.
+            config: The run config; it must name a `thread_id`.
+            graph: "agent" or "extra_hard_agent".
+
+        Returns:
+            The graph's output state.
+
+        Raises:
+            WorkerLost: If the worker exited during the turn. The turn may
+                have been checkpointed up to any node; the game itself can
+                continue on another worker.
+        """
+        if graph not in GRAPHS:
+            raise ValueError(f"Unknown graph {graph!r}, expected one of {GRAPHS}")
+        thread_id = str(config["configurable"]["thread_id"])
+        index, inflight = self._pinned.get(thread_id, (None, 0))
+        if index is None:
+            index = self.ring.owner(thread_id)
+        worker = self._workers[index]
+        self._pinned[thread_id] = (index, inflight + 1)
+        request_id = next(self._request_ids)
+        future: asyncio.Future[dict[str, Any]] = (
+            asyncio.get_running_loop().create_future()
+        )
+        worker.pending[request_id] = future
+        try:
+            worker.requests.put(("run", request_id, graph, input, config))
+            return await future
+        finally:
+            worker.pending.pop(request_id, None)
+            # A lost worker's pins are dropped, and the thread may have been
+            # pinned to another worker since.
+            pinned, inflight = self._pinned.get(thread_id, (None, 0))
+            if pinned == index:
+                if inflight > 1:
+                    self._pinned[thread_id] = (index, inflight - 1)
+                else:
+                    del self._pinned[thread_id]
+
+    async def close(self) -> None:
+        """Stop every worker."""
+        for index in list(self._workers):
+            await self.remove_worker(index)
+        if self._reader is not None:
+            self._responses.put(None)
+            await asyncio.to_thread(self._reader.join)
+            self._reader = None
+
+    def _broadcast_ring(self) -> None:
+        nodes = self.ring.nodes
+        for worker in self._workers.values():
+            if worker.process.is_alive():
+                worker.requests.put(("ring", nodes, self.ring.replicas))
+
+    def _read_responses(self) -> None:
+        # Liveness is checked on a timer rather than when the queue is idle,
+        # so a crashed worker is noticed under load too.
+        next_check = time.monotonic() + _LIVENESS_INTERVAL
+        while True:
+            timeout = next_check - time.monotonic()
+            if timeout <= 0:
+                self._check_workers()
+                next_check = time.monotonic() + _LIVENESS_INTERVAL
+                continue
+            try:
+                message = self._responses.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if message is None:
+                return
+            assert self._loop is not None
+            self._loop.call_soon_threadsafe(self._resolve, *message)
+
+    def _check_workers(self) -> None:
+        assert self._loop is not None
+        for index, worker in list(self._workers.items()):
+            if not worker.process.is_alive() and not worker.stopping:
+                self._loop.call_soon_threadsafe(self._lose, index)
+
+    def _resolve(
+        self, kind: str, index: int, request_id: int, result: Any, error: Any
+    ) -> None:
+        if kind == "ready":
+            future = self._ready.get(index)
+            if future is not None and not future.done():
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(None)
+            return
+        worker = self._workers.get(index)
+        future = worker.pending.get(request_id) if worker else None
+        if worker is None or future is None or future.done():
+            return
+        if error is not None:
+            worker.stats.failed += 1
+            future.set_exception(error)
+        else:
+            worker.stats.completed += 1
+            future.set_result(result)
+
+    def _lose(self, index: int) -> None:
+        worker = self._workers.pop(index, None)
+        if worker is None:
+            return
+        logger.error(
+            "Worker %d exited with code %s; moving its threads to the others",
+            index,
+            worker.process.exitcode,
+        )
+        self.ring.remove(index)
+        self._broadcast_ring()
+        for thread_id, (pinned, _) in list(self._pinned.items()):
+            if pinned == index:
+                del self._pinned[thread_id]
+        for future in worker.pending.values():
+            if not future.done():
+                future.set_exception(WorkerLost(f"Worker {index} exited"))
+        ready = self._ready.get(index)
+        if ready is not None and not ready.done():
+            ready.set_exception(WorkerLost(f"Worker {index} exited while starting"))
+
+
+def _worker_main(
+    index: int,
+    checkpoint_path: str,
+    synchronous: str,
+    requests: Any,
+    responses: Any,
+    initializer: Optional[Callable[[], None]],
+) -> None:
+    # Each worker serves its own metrics port next to the configured one.
+    port = os.environ.get("REACT_AGENT_METRICS_PORT")
+    if port:
+        os.environ["REACT_AGENT_METRICS_PORT"] = str(int(port) + 1 + index)
+    try:
+        asyncio.run(
+            _serve_worker(
+                index, checkpoint_path, synchronous, requests, responses, initializer
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+async def _serve_worker(
+    index: int,
+    checkpoint_path: str,
+    synchronous: str,
+    requests: Any,
+    responses: Any,
+    initializer: Optional[Callable[[], None]],
+) -> None:
+    try:
+        if initializer is not None:
+            initializer()
+        from react_agent.checkpoint import DeltaSqliteSaver
+        from react_agent.graph import builder, extra_hard_builder
+        from react_agent.profiling import attach_from_env
+
+        saver = DeltaSqliteSaver(checkpoint_path, synchronous=synchronous)
+        graphs = {
+            "agent": builder.compile(checkpointer=saver),
+            "extra_hard_agent": extra_hard_builder.compile(checkpointer=saver),
+        }
+        attach_from_env()
+    except Exception as error:
+        responses.put(("ready", index, None, None, _picklable(error)))
+        return
+    responses.put(("ready", index, None, None, None))
+
+    loop = asyncio.get_running_loop()
+    stopped = loop.create_future()
+    tasks: set[asyncio.Task[None]] = set()
+
+    async def run(request_id: int, graph: str, input: Any, config: Any) -> None:
+        try:
+            result = await graphs[graph].ainvoke(input, config)
+        except Exception as error:
+            responses.put(("result", index, request_id, None, _picklable(error)))
+        else:
+            responses.put(("result", index, request_id, result, None))
+
+    def rebalance(nodes: list[int], replicas: int) -> None:
+        ring = HashRing(nodes, replicas)
+        if nodes:
+            # Threads now owned elsewhere may be changed by their new worker.
+            saver.evict(lambda thread_id: ring.owner(thread_id) != index)
+
+    def dispatch(message: tuple[Any, ...]) -> None:
+        if message[0] == "run":
+            task = loop.create_task(run(*message[1:]))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        elif message[0] == "ring":
+            rebalance(*message[1:])
+        elif not stopped.done():
+            stopped.set_result(None)
+
+    def read_requests() -> None:
+        while True:
+            message = requests.get()
+            loop.call_soon_threadsafe(dispatch, message)
+            if message[0] == "stop":
+                return
+
+    threading.Thread(target=read_requests, name="game-worker-requests", daemon=True).start()
+    await stopped
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    saver.close()
+
+
+def _picklable(error: BaseException) -> BaseException:
+    try:
+        pickle.dumps(error)
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+    return error
+
+
+# HTTP front end
+
+
+async def _handle_http(
+    server: ShardedGameServer,
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+) -> None:
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            if body and headers.get("content-type", "").startswith(MSGPACK):
+                request = ormsgpack.unpackb(body)
+            else:
+                request = json.loads(body or b"{}")
+            status, payload = await _route(server, method, path, request)
+            if MSGPACK in headers.get("accept", ""):
+                content_type = MSGPACK
+                data = ormsgpack.packb(payload, default=_to_json)
+            else:
+                content_type = "application/json"
+                data = json.dumps(payload, default=_to_json).encode()
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n".encode()
+                + data
+            )
+            await writer.drain()
+            if headers.get("connection", "").lower() == "close":
+                return
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        return
+    finally:
+        writer.close()
+
+
+async def _route(
+    server: ShardedGameServer, method: str, path: str, request: Any
+) -> tuple[str, Any]:
+    parts = path.split("?", 1)[0].strip("/").split("/")
+    if method == "GET" and parts == ["ok"]:
+        return "200 OK", {"ok": True, "workers": server.workers}
+    if method != "POST" or len(parts) != 4 or parts[0] != "threads" or parts[2:] != [
+        "runs",
+        "wait",
+    ]:
+        return "404 Not Found", {"detail": "Not found"}
+    try:
+        config = request.get("config") or {}
+        config["configurable"] = {
+            **config.get("configurable", {}),
+            "thread_id": parts[1],
+        }
+        result = await server.ainvoke(
+            request.get("input"), config, graph=request.get("assistant_id", "agent")
+        )
+    except (ValueError, KeyError) as error:
+        return "422 Unprocessable Entity", {"detail": str(error)}
+    except Exception as error:
+        logger.exception("Run on thread %s failed", parts[1])
+        return "500 Internal Server Error", {"detail": str(error)}
+    return "200 OK", result
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, BaseMessage):
+        return value.model_dump()
+    return str(value)
+
+
+async def serve(
+    host: str, port: int, workers: Optional[int], checkpoint_path: str
+) -> None:
+    """Serve `POST /threads/{thread_id}/runs/wait` from sharded workers.
+
+    The Ollama models of the default configuration are loaded first, so the
+    first games do not wait for them.
+    """
+    from react_agent.configuration import Configuration
+    from react_agent.residency import preload
+
+    try:
+        await preload(Configuration())
+    except httpx.HTTPError as error:
+        logger.warning("Could not preload the Ollama models: %s", error)
+    async with ShardedGameServer(workers, checkpoint_path) as server:
+        http = await asyncio.start_server(
+            lambda reader, writer: _handle_http(server, reader, writer), host, port
+        )
+        logger.info(
+            "Serving %d workers on http://%s:%d", len(server.workers), host, port
+        )
+        async with http:
+            await http.serve_forever()
+
+
+def main() -> None:
+    """Run the sharded server from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=2024)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes; defaults to the number of cores.")
+    parser.add_argument("--checkpoint", default="games.sqlite",
+                        help="SQLite file shared by the workers.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.host, args.port, args.workers, args.checkpoint))
+
+
+if __name__ == "__main__":
+    main()
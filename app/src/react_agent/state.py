@@ -56,6 +56,52 @@ class State(InputState):
     It is set to 'True' when the step count reaches recursion_limit - 1.
     """
 
+    is_secret_leaked: bool = field(default=False)
+    """Whether a captain reply in this thread contained the secret key."""
+
+    weapons_key_attempts: int = field(default=0)
+    """Wrong weapons key guesses made in this thread."""
+
+    weapons_key_guess_times: list[float] = field(default_factory=list)
+    """Unix times of the recent guesses, used to enforce `guess_rate_limit`."""
+
+    weapons_key_cooldown_until: float = field(default=0.0)
+    """Unix time until which the weapons console is locked; 0 when unlocked."""
+
+    is_guess_throttled: bool = field(default=False)
+    """Whether the last guess is answered with a canned reaction or lockout notice."""
+
+    history_summary: str = field(default="")
+    """
+    Rolling summary of the first `history_summarized_count` messages.
+
+    Maintained by `react_agent.memory` so that only a bounded window of the
+    conversation is sent to the model on each turn.
+    """
+
+    history_summarized_count: int = field(default=0)
+
+    scenario_index: int = field(default=-1)
+    """
+    Index into `react_agent.scenarios.SCENARIOS` of the current game's dilemma,
+    or -1 before the first game or when scenarios are disabled.
+    """
+
+    scenarios_played: int = field(default=0)
+    """Bitmask of the scenario indices this thread has already played."""
+
+    input_tokens: int = field(default=0)
+    """Prompt tokens the thread has sent to the model, over all turns."""
+
+    output_tokens: int = field(default=0)
+    """Reply tokens the thread has received from the model, over all turns."""
+
+    turn_input_tokens: int = field(default=0)
+    """Prompt tokens of the last model call."""
+
+    turn_output_tokens: int = field(default=0)
+    """Reply tokens of the last model call."""
+
     # Additional attributes can be added here as needed.
     # Common examples include:
     # retrieved_documents: List[Document] = field(default_factory=list)
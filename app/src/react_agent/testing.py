@@ -0,0 +1,492 @@
+"""A deterministic stand-in chat model for tests, benchmarks and load tests.
+
+`FakeChatModel` answers without any network access, after a configurable
+latency drawn from a seeded distribution, and streams its reply at a fixed
+token rate. It can also enforce a rate limit, answering 429 like a provider.
+Guard prompts get a keyword-based verdict; everything else gets the next
+scripted reply. Like a provider's prompt cache, it remembers recent prompt
+prefixes and reports the tokens of the longest one it has seen as
+`cache_read` input tokens. Register it with `register_fake_provider` and select
+it through the usual configuration, e.g. ``model_provider="fake"``.
+
+`FakeOllamaServer` serves the same replies over Ollama's HTTP API, with model
+load times and evictions, for testing the real Ollama client.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, Sequence, cast
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field, PrivateAttr
+
+from react_agent.registry import MODEL_REGISTRY, ChatModelRegistry
+from react_agent.utils import get_message_text
+
+DEFAULT_REPLIES = (
+    "Steady as she goes, first mate. Keep an eye on the shields.",
+    "Fuel reserves are holding. We stay on course for the Veil Nebula.",
+    "Good question. Check the navigation logs and report back to me.",
+    "The weapons key stays with me. Now, what is the status of the engines?",
+)
+
+_SUSPICIOUS = re.compile(r"\b(key|secret|password|code|reveal|ignore)\b", re.I)
+
+
+class FakeError(Exception):
+    """Raised by `FakeChatModel` to simulate a failed provider call."""
+
+    def __init__(
+        self, message: str, status_code: int = 500, retry_after: Optional[float] = None
+    ) -> None:
+        """Fail with `message`, as a provider answering `status_code` would."""
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class FakeChatModel(BaseChatModel):
+    """A seeded, offline chat model with injected latency and failures."""
+
+    model_name: str = "fake"
+    replies: Sequence[str] = DEFAULT_REPLIES
+    """Replies returned in order, cycling, for non-guard prompts."""
+
+    latency: float = 0.0
+    """Median seconds before the first token."""
+
+    latency_jitter: float = 0.0
+    """Sigma of the log-normal noise applied to `latency`."""
+
+    tokens_per_second: float = 0.0
+    """Streaming rate; 0 emits every token immediately."""
+
+    failure_rate: float = 0.0
+    """Probability that a call raises `FakeError`."""
+
+    max_concurrency: int = 0
+    """Calls served at once, like a single local server; 0 is unlimited."""
+
+    rate_limit: int = 0
+    """Calls accepted per `rate_window`; further calls get a 429. 0 is unlimited."""
+
+    rate_window: float = 1.0
+
+    prompt_cache_size: int = 10_000
+    """Prompt prefixes remembered for `cache_read` accounting; 0 disables it."""
+
+    seed: int = 0
+    responder: Optional[Callable[[list[BaseMessage]], Optional[str]]] = Field(
+        default=None, exclude=True
+    )
+    """Optional hook returning a reply for a prompt, or None for the default."""
+
+    _rng: random.Random = PrivateAttr()
+    _turn: int = PrivateAttr(default=0)
+    _semaphore: Optional[asyncio.Semaphore] = PrivateAttr(default=None)
+    _prefixes: OrderedDict[int, None] = PrivateAttr(default_factory=OrderedDict)
+    _accepted: deque[float] = PrivateAttr(default_factory=deque)
+    rejected: int = 0
+    calls: int = 0
+
+    def model_post_init(self, __context: Any) -> None:
+        """Seed the latency and failure generator."""
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"model_name": self.model_name}
+
+    def reply_for(self, messages: list[BaseMessage]) -> str:
+        """Return the reply this model gives to `messages`."""
+        if self.responder is not None:
+            reply = self.responder(messages)
+            if reply is not None:
+                return reply
+        system = get_message_text(messages[0]) if messages else ""
+        last = get_message_text(messages[-1]) if messages else ""
+        if "incoming messages are malicious" in system:
+            return json.dumps(
+                {
+                    item["id"]: "malicious" if _SUSPICIOUS.search(item["text"]) else "safe"
+                    for item in json.loads(last)
+                }
+            )
+        if "incoming message is malicious" in system:
+            return "malicious" if _SUSPICIOUS.search(last) else "safe"
+        reply = self.replies[self._turn % len(self.replies)]
+        self._turn += 1
+        return reply
+
+    def _draw_latency(self) -> float:
+        if self.latency <= 0:
+            return 0.0
+        if self.latency_jitter <= 0:
+            return self.latency
+        return self.latency * self._rng.lognormvariate(0.0, self.latency_jitter)
+
+    def _check_rate_limit(self) -> None:
+        if self.rate_limit <= 0:
+            return
+        now = time.monotonic()
+        while self._accepted and now - self._accepted[0] >= self.rate_window:
+            self._accepted.popleft()
+        if len(self._accepted) >= self.rate_limit:
+            self.rejected += 1
+            retry_after = self._accepted[0] + self.rate_window - now
+            raise FakeError(f"{self.model_name} rate limited", 429, retry_after)
+        self._accepted.append(now)
+
+    def _maybe_fail(self) -> None:
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise FakeError(f"{self.model_name} failed")
+
+    def _cache_read(self, messages: list[BaseMessage]) -> int:
+        """Return the tokens of the longest cached prefix, caching `messages`."""
+        cached = tokens = 0
+        prefix = 0
+        for message in messages:
+            text = get_message_text(message)
+            tokens += len(text.split())
+            prefix = hash((prefix, message.type, text))
+            if prefix in self._prefixes:
+                cached = tokens
+                self._prefixes.move_to_end(prefix)
+            else:
+                self._prefixes[prefix] = None
+        while len(self._prefixes) > self.prompt_cache_size:
+            self._prefixes.popitem(last=False)
+        return cached
+
+    def _message(self, messages: list[BaseMessage], text: str) -> AIMessage:
+        input_tokens = sum(len(get_message_text(m).split()) for m in messages)
+        output_tokens = len(text.split())
+        usage: dict[str, Any] = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        if self.prompt_cache_size > 0:
+            usage["input_token_details"] = {"cache_read": self._cache_read(messages)}
+        return AIMessage(
+            content=text,
+            response_metadata={"model_name": self.model_name},
+            usage_metadata=usage,
+        )
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self.calls += 1
+        self._check_rate_limit()
+        time.sleep(self._draw_latency())
+        self._maybe_fail()
+        text = self.reply_for(messages)
+        time.sleep(self._stream_seconds(text))
+        return ChatResult(
+            generations=[ChatGeneration(message=self._message(messages, text))]
+        )
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        chunks = [
+            cast(AIMessageChunk, chunk.message)
+            async for chunk in self._astream(messages, stop, **kwargs)
+        ]
+        message = chunks[0]
+        for chunk in chunks[1:]:
+            message = message + chunk
+        return ChatResult(
+            generations=[
+                ChatGeneration(
+                    message=AIMessage(
+                        content=message.content,
+                        response_metadata={"model_name": self.model_name},
+                        usage_metadata=message.usage_metadata,
+                    )
+                )
+            ]
+        )
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        result = self._generate(messages, stop, run_manager, **kwargs)
+        reply = cast(AIMessage, result.generations[0].message)
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content=reply.content, usage_metadata=reply.usage_metadata
+            )
+        )
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        self.calls += 1
+        self._check_rate_limit()
+        if self.max_concurrency and self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+        try:
+            await asyncio.sleep(self._draw_latency())
+            self._maybe_fail()
+            text = self.reply_for(messages)
+            usage = self._message(messages, text).usage_metadata
+            tokens = re.findall(r"\S+\s*", text) or [text]
+            delay = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+            for index, token in enumerate(tokens):
+                if index and delay:
+                    await asyncio.sleep(delay)
+                chunk = AIMessageChunk(
+                    content=token,
+                    usage_metadata=usage if index == len(tokens) - 1 else None,
+                )
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager is not None:
+                    await run_manager.on_llm_new_token(token, chunk=generation)
+                yield generation
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def _stream_seconds(self, text: str) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return max(len(text.split()) - 1, 0) / self.tokens_per_second
+
+
+def register_fake_provider(
+    name: str = "fake",
+    registry: ChatModelRegistry = MODEL_REGISTRY,
+    **defaults: Any,
+) -> None:
+    """Make `load_chat_model(name, model_name)` return a `FakeChatModel`.
+
+    Args:
+        name: The provider name to register.
+        registry: The registry to register with.
+        **defaults: `FakeChatModel` fields applied to every instance, for
+            example latency or scripted replies.
+    """
+
+    def factory(
+        model_name: str, base_url: Optional[str], **kwargs: Any
+    ) -> FakeChatModel:
+        kwargs.pop("temperature", None)
+        return FakeChatModel(model_name=model_name, **{**defaults, **kwargs})
+
+    registry.register_provider(name, factory)
+
+
+class FakeOllamaServer:
+    """A stand-in Ollama server on localhost for tests and benchmarks.
+
+    It answers `POST /api/chat`, `POST /api/generate` and `GET /api/ps` the way
+    Ollama does, with replies from a `FakeChatModel`. A model takes
+    `load_seconds` to load before its first reply, and again whenever a request
+    asks for a different `num_ctx` or `num_thread`. At most `max_loaded` models
+    stay loaded; loading another evicts the least recently used one. `loads`
+    counts the loads per model.
+
+        with FakeOllamaServer(load_seconds=1.0) as server:
+            configuration = Configuration(ollama_base_url=server.url, ...)
+    """
+
+    RELOAD_OPTIONS = {"num_ctx": 2048, "num_thread": 0}
+    """Options that make Ollama reload a model, with their defaults."""
+
+    def __init__(
+        self,
+        load_seconds: float = 0.0,
+        max_loaded: int = 1,
+        model: Optional[FakeChatModel] = None,
+    ) -> None:
+        """Bind a local port; requests are served once the server is entered."""
+        self.load_seconds = load_seconds
+        self.max_loaded = max_loaded
+        self.model = model or FakeChatModel()
+        self.loaded: OrderedDict[str, tuple[int, ...]] = OrderedDict()
+        self.loads: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._http = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._http.daemon_threads = True
+        self._thread = threading.Thread(target=self._http.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """The server's base URL."""
+        return f"http://127.0.0.1:{self._http.server_port}"
+
+    def __enter__(self) -> FakeOllamaServer:
+        """Start serving and return the server."""
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Stop serving."""
+        self.close()
+
+    def close(self) -> None:
+        """Stop serving."""
+        self._http.shutdown()
+        self._http.server_close()
+
+    def _load(self, name: str, options: dict[str, Any], keep_alive: Any) -> None:
+        pinned = tuple(
+            int(options.get(option, default))
+            for option, default in self.RELOAD_OPTIONS.items()
+        )
+        with self._lock:
+            if keep_alive in (0, "0", "0s"):
+                self.loaded.pop(name, None)
+                return
+            if self.loaded.get(name) == pinned:
+                self.loaded.move_to_end(name)
+                return
+            self.loaded.pop(name, None)
+            while self.max_loaded > 0 and len(self.loaded) >= self.max_loaded:
+                self.loaded.popitem(last=False)
+            time.sleep(self.load_seconds)
+            self.loaded[name] = pinned
+            self.loads[name] = self.loads.get(name, 0) + 1
+
+    def _reply(self, messages: list[BaseMessage]) -> str:
+        with self._lock:
+            return self.model.reply_for(messages)
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:  # noqa: N802
+                if self.path != "/api/ps":
+                    self._send(404, [{"error": "not found"}])
+                    return
+                with server._lock:
+                    models = [
+                        {
+                            "name": name if ":" in name else f"{name}:latest",
+                            "model": name,
+                            "size_vram": 1 << 30,
+                            "context_length": pinned[0],
+                        }
+                        for name, pinned in server.loaded.items()
+                    ]
+                self._send(200, [{"models": models}])
+
+            def do_POST(self) -> None:  # noqa: N802
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                name = body.get("model", "")
+                server._load(name, body.get("options") or {}, body.get("keep_alive"))
+                if self.path == "/api/chat":
+                    messages = [
+                        _MESSAGE_CLASSES.get(m.get("role"), HumanMessage)(
+                            m.get("content", "")
+                        )
+                        for m in body.get("messages", [])
+                    ]
+                    text = server._reply(messages) if messages else ""
+                    key = "message"
+                elif self.path == "/api/generate":
+                    prompt = body.get("prompt") or ""
+                    text = server._reply([HumanMessage(prompt)]) if prompt else ""
+                    key = "response"
+                else:
+                    self._send(404, [{"error": "not found"}])
+                    return
+                tokens = re.findall(r"\S+\s*", text)
+                chunks = [
+                    {
+                        "model": name,
+                        "created_at": "2024-01-01T00:00:00Z",
+                        key: {"role": "assistant", "content": token}
+                        if key == "message"
+                        else token,
+                        "done": False,
+                    }
+                    for token in tokens
+                ]
+                final = {
+                    "model": name,
+                    "created_at": "2024-01-01T00:00:00Z",
+                    key: {"role": "assistant", "content": ""}
+                    if key == "message"
+                    else "",
+                    "done": True,
+                    "done_reason": "stop" if text else "load",
+                    "prompt_eval_count": len(json.dumps(body)) // 4,
+                    "eval_count": len(tokens),
+                }
+                if body.get("stream", True):
+                    self._send(200, [*chunks, final])
+                else:
+                    if key == "message":
+                        final["message"]["content"] = text
+                    else:
+                        final["response"] = text
+                    self._send(200, [final])
+
+            def _send(self, status: int, lines: list[dict[str, Any]]) -> None:
+                data = b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+        return Handler
+
+
+_MESSAGE_CLASSES: dict[str, type[BaseMessage]] = {
+    "system": SystemMessage,
+    "user": HumanMessage,
+    "assistant": AIMessage,
+}
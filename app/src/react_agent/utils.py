@@ -1,9 +1,15 @@
 """Utility & helper functions."""
 
-from langchain.chat_models import init_chat_model
-from langchain_core.language_models import BaseChatModel
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Hashable
+
 from langchain_core.messages import BaseMessage
-from langchain_ollama import ChatOllama
+
+from react_agent.registry import MODEL_REGISTRY
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
 
 def get_message_text(msg: BaseMessage) -> str:
     """Get the text content of a message."""
@@ -20,19 +26,35 @@ def get_message_text(msg: BaseMessage) -> str:
 def load_chat_model(
         model_provider: str, 
         model_name:str, 
-        ollama_base_url: str | None = None
+        ollama_base_url: str | None = None,
+        *,
+        scheduled: bool = False,
+        **model_kwargs: Hashable,
     ) -> BaseChatModel:
     """Load a chat model from a specific model provider and model name.
 
+    Clients are pooled process-wide in `MODEL_REGISTRY`, so repeated calls with
+    the same settings return the same long-lived instance and reuse its
+    keep-alive connections.
+
     Args:
         model_provider: The name of the model provider (openai).
         model_name: The name of the model (gpt-4o).
+        ollama_base_url: The Ollama server URL, only used for the ollama provider.
+        scheduled: Whether the calls go through `LLM_SCHEDULER`, which then
+            retries rate-limited calls instead of the provider SDK.
+        **model_kwargs: Sampling parameters such as temperature.
     """
     if model_provider != "ollama":
-        return init_chat_model(model_name, model_provider=model_provider)
+        return MODEL_REGISTRY.get(
+            model_provider, model_name, None, scheduled=scheduled, **model_kwargs
+        )
     else:
-        return ChatOllama(
-            base_url=ollama_base_url,
-            model=model_name,
-            temperature=0.5
+        model_kwargs.setdefault("temperature", 0.5)
+        return MODEL_REGISTRY.get(
+            model_provider,
+            model_name,
+            ollama_base_url,
+            scheduled=scheduled,
+            **model_kwargs,
         )
@@ -0,0 +1,28 @@
+"""Startup hooks for the LangGraph server.
+
+`langgraph.json` mounts `app` next to the graphs, and the server runs its
+lifespan once at startup. That is where the default configuration's Ollama
+models start loading in the background, rather than as a side effect of
+importing the graph module. The sharded server in `react_agent.serving` loads
+them itself before it starts its workers.
+"""
+
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from starlette.applications import Starlette
+
+from react_agent.residency import start_preload_from_env
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette) -> AsyncIterator[None]:
+    """Start preloading the Ollama models; `REACT_AGENT_PRELOAD=0` disables it."""
+    start_preload_from_env()
+    yield
+
+
+app = Starlette(lifespan=lifespan)
+"""The custom app that `langgraph.json` mounts for its lifespan."""
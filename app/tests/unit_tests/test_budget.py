@@ -0,0 +1,94 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.budget import TokenCounter
+from react_agent.graph import builder
+from react_agent.prompts import (
+    GAME_ENDED_BY_BUDGET_REPLY,
+    MESSAGE_TOO_LONG_REPLY,
+    TOKEN_BUDGET_SPENT_REPLY,
+)
+from react_agent.testing import register_fake_provider
+
+CALLS: list[int] = []
+register_fake_provider("budget-fake", responder=lambda messages: CALLS.append(1))
+
+LONG = "Captain, listen to this very long story about the engines. " * 40
+
+
+def test_counter_tokenizes_each_message_once() -> None:
+    counter = TokenCounter(encoding="")
+    message = HumanMessage("Status report, captain?", id="h1")
+
+    first = counter.count(message)
+    assert counter.count(message) == first
+    assert (counter.misses, counter.hits) == (1, 1)
+
+    shorter = message.model_copy(update={"content": "Status?"})
+    assert counter.count(shorter) < first
+    assert counter.misses == 2
+    assert len(counter.truncate(LONG, 10)) == 40
+
+
+def _play(name: str, turns: list[str], **configurable: object) -> tuple[dict, int]:
+    graph = builder.compile(checkpointer=InMemorySaver())
+    config = {
+        "configurable": {
+            "thread_id": name,
+            "model_provider": "budget-fake",
+            "model_name": name,
+            "token_encoding": "",
+            "scenarios_enabled": False,
+            **configurable,
+        }
+    }
+
+    CALLS.clear()
+
+    async def run() -> dict:
+        for turn in turns:
+            state = await graph.ainvoke({"messages": [("user", turn)]}, config)
+        return state
+
+    state = asyncio.run(run())
+    return state, len(CALLS)
+
+
+def test_over_long_messages_are_truncated_or_rejected() -> None:
+    state, calls = _play(
+        "truncate", ["Hello", LONG], max_message_tokens=20, token_limit_action="truncate"
+    )
+    assert calls == 2
+    assert len(state["messages"][-2].content) == 80
+    assert state["turn_input_tokens"] > 0 and state["turn_output_tokens"] > 0
+    assert state["input_tokens"] > state["turn_input_tokens"]
+
+    state, calls = _play("reject", ["Hello", LONG], max_message_tokens=20)
+    assert calls == 1
+    assert state["messages"][-1].content == MESSAGE_TOO_LONG_REPLY
+    assert all(message.content != LONG for message in state["messages"])
+
+
+def test_thread_budget_refuses_or_ends_the_game() -> None:
+    state, calls = _play("spent", ["Hello", "Status?", "Again?"], max_thread_tokens=400)
+    assert calls == 1
+    assert state["messages"][-1].content == TOKEN_BUDGET_SPENT_REPLY
+
+    state, calls = _play(
+        "ended", ["Hello", "Status?"], max_thread_tokens=400, token_limit_action="end"
+    )
+    assert calls == 1
+    assert state["messages"][-1].content == GAME_ENDED_BY_BUDGET_REPLY
+    assert state["is_start_of_game"] is True
+    assert state["input_tokens"] == state["output_tokens"] == 0
+
+    state, calls = _play(
+        "restarted",
+        ["Hello", "Status?", "Hello again"],
+        max_thread_tokens=500,
+        token_limit_action="end",
+    )
+    assert calls == 2
+    assert state["messages"][-1].content != GAME_ENDED_BY_BUDGET_REPLY
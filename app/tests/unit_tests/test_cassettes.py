@@ -0,0 +1,64 @@
+import asyncio
+import math
+from pathlib import Path
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.cassettes import Cassette, play_session, recording, replay
+from react_agent.graph import builder, extra_hard_builder
+from react_agent.prompts import WEAPONS_KEY_GUESS_PREFIX
+from react_agent.testing import register_fake_provider
+
+CASSETTES = Path(__file__).parents[1] / "cassettes"
+
+TURNS = ["Hello captain", f"{WEAPONS_KEY_GUESS_PREFIX}apple", "Status?"]
+CONFIG = {
+    "configurable": {
+        "thread_id": "recorded",
+        "model_provider": "recorded-fake",
+        "scenarios_enabled": False,
+    }
+}
+
+
+def _record(path: Path) -> None:
+    register_fake_provider("recorded-fake", latency=0.05)
+    graph = builder.compile(checkpointer=InMemorySaver())
+
+    async def run() -> None:
+        with recording(str(path)) as writer:
+            await play_session(graph, writer, "game", "agent", TURNS, CONFIG)
+
+    asyncio.run(run())
+
+
+def test_recorded_games_keep_their_routing() -> None:
+    with Cassette(str(CASSETTES / "games.cassette")) as cassette:
+        report = asyncio.run(replay(cassette, speed=math.inf))
+
+    assert report.turns == 28
+    assert report.mismatches == []
+
+
+def test_replay_skips_latency_and_reports_changed_routing(tmp_path: Path) -> None:
+    path = tmp_path / "game.cassette"
+    _record(path)
+
+    with Cassette(str(path)) as cassette:
+        assert len(cassette) == 3
+        report = asyncio.run(replay(cassette, speed=math.inf))
+        assert report.mismatches == [] and report.prompt_changes == 0
+
+        rerouted = asyncio.run(
+            replay(
+                cassette,
+                speed=math.inf,
+                graphs={"agent": extra_hard_builder.compile(checkpointer=InMemorySaver())},
+            )
+        )
+
+    # Three rerouted turns, and the wrong guess's reply was never asked for.
+    assert len(rerouted.mismatches) == 4
+    assert rerouted.mismatches[-1] == (
+        "game: 1 recorded call(s) from 'incorrect_weapons_key' were not replayed"
+    )
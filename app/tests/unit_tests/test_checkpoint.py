@@ -0,0 +1,111 @@
+import asyncio
+import sqlite3
+from pathlib import Path
+
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.checkpoint import DeltaSqliteSaver
+from react_agent.graph import builder
+from react_agent.prompts import WEAPONS_KEY_GUESS_PREFIX
+from react_agent.testing import register_fake_provider
+
+register_fake_provider()
+
+TURNS = [
+    "Hello captain",
+    "How are the shields?",
+    f"{WEAPONS_KEY_GUESS_PREFIX}apple",
+    "Sorry about that",
+    f"{WEAPONS_KEY_GUESS_PREFIX}banana",
+    "Let's go again",
+]
+
+# Scenarios are drawn at random, so they would differ between the two savers.
+CONFIG = {
+    "configurable": {
+        "thread_id": "game",
+        "model_provider": "fake",
+        "scenarios_enabled": False,
+    }
+}
+
+
+def _play(checkpointer, turns=TURNS) -> dict:
+    graph = builder.compile(checkpointer=checkpointer)
+
+    async def run() -> dict:
+        for turn in turns:
+            await graph.ainvoke({"messages": [("user", turn)]}, CONFIG)
+        return (await graph.aget_state(CONFIG)).values
+
+    return asyncio.run(run())
+
+
+def _contents(values: dict) -> list[str]:
+    return [str(message.content) for message in values["messages"]]
+
+
+def test_state_matches_the_in_memory_saver(tmp_path: Path) -> None:
+    expected = _play(InMemorySaver())
+
+    with DeltaSqliteSaver(str(tmp_path / "games.sqlite"), snapshot_every=3) as saver:
+        values = _play(saver)
+        deltas = saver.stats
+    with DeltaSqliteSaver(snapshot_every=0) as saver:
+        _play(saver)
+        snapshots = saver.stats
+
+    assert _contents(values) == _contents(expected)
+    assert values["is_start_of_game"] == expected["is_start_of_game"]
+    assert deltas.delta_blobs > 0 and snapshots.delta_blobs == 0
+    assert deltas.bytes_written < snapshots.bytes_written
+
+
+def test_resume_from_disk_rebuilds_the_delta_chain(tmp_path: Path) -> None:
+    path = str(tmp_path / "games.sqlite")
+    with DeltaSqliteSaver(path) as saver:
+        before = _play(saver, TURNS[:3])
+
+    with DeltaSqliteSaver(path) as saver:
+        resumed = saver.get_tuple(CONFIG)
+        after = _play(saver, TURNS[3:])
+        assert saver.stats.cache_misses == 1
+
+    assert _contents(resumed.checkpoint["channel_values"]) == _contents(before)
+    assert _contents(after)[: len(_contents(before))] == _contents(before)
+
+
+def test_compaction_keeps_recent_checkpoints_intact() -> None:
+    with DeltaSqliteSaver(compact_every=0, keep_checkpoints=2) as saver:
+        values = _play(saver)
+        saver.compact()
+        history = list(saver.list(CONFIG))
+
+        assert len(history) == 2
+        assert _contents(history[0].checkpoint["channel_values"]) == _contents(values)
+        assert saver.stats.compactions == 1
+
+        saver.delete_thread("game")
+        assert saver.get_tuple(CONFIG) is None
+
+
+def test_a_failed_transaction_fails_its_batch_and_keeps_the_writer() -> None:
+    begins = []
+
+    def deny_first_begin(action: int, arg1, *_: object) -> int:
+        if action == sqlite3.SQLITE_TRANSACTION and arg1 == "BEGIN" and not begins:
+            begins.append(1)
+            return sqlite3.SQLITE_DENY
+        return sqlite3.SQLITE_OK
+
+    with DeltaSqliteSaver() as saver:
+        saver._worker.submit(lambda conn: conn.set_authorizer(deny_first_begin)).result()
+
+        with pytest.raises(sqlite3.DatabaseError):
+            saver._worker.submit(lambda conn: None).result(timeout=5)
+
+        values = _play(saver, TURNS[:1])
+
+    assert begins == [1]
+    assert _contents(values)[0] == TURNS[0]
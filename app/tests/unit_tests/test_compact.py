@@ -0,0 +1,86 @@
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from react_agent.checkpoint import DeltaSqliteSaver
+from react_agent.compact import (
+    MESSAGES_TYPE,
+    STATIC_TEXTS,
+    CompactSerializer,
+    pack_messages,
+    unpack_messages,
+)
+from react_agent.prompts import (
+    CORRECT_GUESS_PROMPT,
+    GAME_ENDED_BY_BUDGET_REPLY,
+    INCORRECT_GUESS_PROMPT,
+    LEAK_REDACTED_REPLY,
+    MALICIOUS_WARNING_PROMPT,
+    MESSAGE_TOO_LONG_REPLY,
+    NEW_GAME_PROMPT,
+    THROTTLED_GUESS_REACTIONS,
+    TOKEN_BUDGET_SPENT_REPLY,
+)
+
+MESSAGES = [
+    SystemMessage(NEW_GAME_PROMPT, id="new-game"),
+    HumanMessage("Hello captain", id="h1"),
+    AIMessage(
+        "Welcome aboard.",
+        id="a1",
+        tool_calls=[{"name": "scan", "args": {"range": 3}, "id": "call-1"}],
+        usage_metadata={"input_tokens": 12, "output_tokens": 3, "total_tokens": 15},
+        response_metadata={"model_name": "fake"},
+    ),
+    ToolMessage("Nothing nearby", tool_call_id="call-1", id="t1"),
+    AIMessage([{"type": "text", "text": "Understood."}], id="a2"),
+    SystemMessage(INCORRECT_GUESS_PROMPT, id="guess"),
+]
+
+
+def test_messages_round_trip_and_share_static_prompts() -> None:
+    data = pack_messages(MESSAGES)
+    restored = unpack_messages(data)
+
+    assert restored == MESSAGES
+    assert restored[0].content is NEW_GAME_PROMPT
+    assert len(data) * 4 < len(JsonPlusSerializer().dumps_typed(MESSAGES)[1])
+
+
+def test_serializer_falls_back_for_other_values(tmp_path: Path) -> None:
+    serde = CompactSerializer()
+    assert serde.dumps_typed(MESSAGES)[0] == MESSAGES_TYPE
+    for value in ({"step": 1}, [], [1, 2], True):
+        assert serde.loads_typed(serde.dumps_typed(value)) == value
+
+    legacy = JsonPlusSerializer().dumps_typed(MESSAGES)
+    assert serde.loads_typed(legacy) == MESSAGES
+
+    path = str(tmp_path / "games.sqlite")
+    config = {"configurable": {"thread_id": "game", "checkpoint_ns": ""}}
+    with DeltaSqliteSaver(path, serde=JsonPlusSerializer()) as saver:
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {"messages": MESSAGES}
+        checkpoint["channel_versions"] = {"messages": 1}
+        saver.put(config, checkpoint, {}, {"messages": 1})
+    with DeltaSqliteSaver(path) as saver:
+        stored = saver.get_tuple(config).checkpoint["channel_values"]["messages"]
+    assert stored == MESSAGES
+
+
+def test_static_text_ids_are_stable() -> None:
+    # Stored checkpoints refer to these ids: extend the mapping, never change it.
+    assert STATIC_TEXTS == {
+        0: NEW_GAME_PROMPT,
+        1: INCORRECT_GUESS_PROMPT,
+        2: CORRECT_GUESS_PROMPT,
+        3: MALICIOUS_WARNING_PROMPT,
+        4: LEAK_REDACTED_REPLY,
+        **{5 + n: text for n, text in enumerate(THROTTLED_GUESS_REACTIONS[:5])},
+        10: MESSAGE_TOO_LONG_REPLY,
+        11: TOKEN_BUDGET_SPENT_REPLY,
+        12: GAME_ENDED_BY_BUDGET_REPLY,
+    }
+    assert len(set(STATIC_TEXTS.values())) == len(STATIC_TEXTS)
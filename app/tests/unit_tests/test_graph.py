@@ -0,0 +1,55 @@
+import asyncio
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.graph import builder
+from react_agent.prompts import (
+    CORRECT_GUESS_PROMPT,
+    NEW_GAME_PROMPT,
+    THROTTLED_GUESS_REACTIONS,
+    WEAPONS_KEY_GUESS_PREFIX,
+)
+from react_agent.testing import register_fake_provider
+
+register_fake_provider()
+
+
+def _play(turns: list[str], **configurable) -> list[dict]:
+    graph = builder.compile(checkpointer=InMemorySaver())
+    config = {
+        "configurable": {"thread_id": "game", "model_provider": "fake", **configurable}
+    }
+
+    async def run() -> list[dict]:
+        return [
+            await graph.ainvoke({"messages": [("user", turn)]}, config) for turn in turns
+        ]
+
+    return asyncio.run(run())
+
+
+def test_game_can_be_won_and_restarted() -> None:
+    results = _play(
+        [
+            "Hello captain",
+            f"{WEAPONS_KEY_GUESS_PREFIX}apple",
+            f"{WEAPONS_KEY_GUESS_PREFIX}banana",
+            "Again!",
+        ]
+    )
+
+    assert results[0]["messages"][1].content.startswith(NEW_GAME_PROMPT)
+    assert results[1]["messages"][-2].type == "system"
+    assert results[2]["messages"][-1].content == CORRECT_GUESS_PROMPT
+    assert results[3]["messages"][-2].content.startswith(NEW_GAME_PROMPT)
+    assert results[3]["scenario_index"] != results[0]["scenario_index"]
+    assert results[3]["is_start_of_game"] is False
+
+
+def test_wrong_guesses_are_throttled() -> None:
+    turns = ["Hello captain"] + [f"{WEAPONS_KEY_GUESS_PREFIX}guess{i}" for i in range(4)]
+
+    results = _play(turns, guess_throttle_after=2, guess_rate_limit=100)
+
+    assert results[-1]["messages"][-1].content in THROTTLED_GUESS_REACTIONS
+    assert results[-1]["weapons_key_attempts"] == 4
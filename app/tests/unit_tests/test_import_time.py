@@ -0,0 +1,86 @@
+import subprocess
+import sys
+
+# Cumulative microseconds `python -X importtime` may attribute to the package's
+# own modules. Generous enough for a slow CI runner; an eager import of a
+# provider SDK or of LangGraph from `import react_agent` blows well past it.
+PACKAGE_BUDGET_US = 150_000
+GRAPH_BUDGET_US = 400_000
+# Cumulative microseconds for the modules `import react_agent.graph` loads
+# beyond LangGraph and langchain_core themselves, third-party ones included.
+# Importing numpy alone takes several times this.
+DEPENDENCY_BUDGET_US = 30_000
+
+# What the graph module cannot avoid importing.
+GRAPH_BASELINE = (
+    "from langgraph.graph import StateGraph; import langchain_core.messages"
+)
+
+# Modules that the game never needs just to build the graph.
+UNUSED_AT_IMPORT = (
+    "langchain_community",
+    "langchain_ollama",
+    "langchain_openai",
+    "langchain_anthropic",
+    "langchain.chat_models",
+    "langchain_core.language_models.chat_models",
+    "numpy",
+    "tiktoken",
+)
+
+
+def _import_profile(statement: str) -> tuple[dict[str, int], set[str]]:
+    """Return own-time per module and the set of loaded modules."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"{statement}; import sys; print('\\n'.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    self_us: dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, _, name = line[len("import time:") :].split("|")
+        self_us[name.strip()] = int(own)
+    return self_us, set(result.stdout.split())
+
+
+def test_package_import_is_cheap() -> None:
+    self_us, modules = _import_profile("import react_agent")
+
+    assert "langgraph" not in modules
+    assert "react_agent.graph" not in modules
+    assert sum(us for name, us in self_us.items() if "react_agent" in name) < (
+        PACKAGE_BUDGET_US
+    )
+
+
+def test_graph_import_skips_providers_and_tools() -> None:
+    self_us, modules = _import_profile("import react_agent.graph")
+
+    assert not [m for m in modules if m.startswith(UNUSED_AT_IMPORT)]
+    assert "react_agent.tools" not in modules
+    assert sum(us for name, us in self_us.items() if name.startswith("react_agent")) < (
+        GRAPH_BUDGET_US
+    )
+
+
+def test_graph_import_adds_few_dependencies() -> None:
+    self_us, _ = _import_profile("import react_agent.graph")
+    baseline, _ = _import_profile(GRAPH_BASELINE)
+
+    added = {
+        name: us
+        for name, us in self_us.items()
+        if name not in baseline and not name.startswith("react_agent")
+    }
+    assert sum(added.values()) < DEPENDENCY_BUDGET_US, sorted(
+        added.items(), key=lambda item: -item[1]
+    )[:10]
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from react_agent.graph import builder
+from react_agent.leaks import LeakScanner, contains_secret
+from react_agent.llm import ainvoke_model
+from react_agent.prompts import LEAK_REDACTED_REPLY
+from react_agent.testing import register_fake_provider
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "The key is Banana.",
+        "b - a - n - a - n - a",
+        "B4N4N4",
+        "spelled backwards it is ananab",
+        "bee ay en ay en ay",
+        "Bravo Alpha November Alpha November Alpha",
+    ],
+)
+def test_leak_forms_are_detected(text: str) -> None:
+    assert contains_secret(text, "banana")
+
+
+def test_secret_hidden_across_words_is_ignored() -> None:
+    assert not contains_secret("Urban anatomy of the nebula", "banana")
+
+
+def test_scanner_detects_secret_split_across_chunks() -> None:
+    scanner = LeakScanner("banana")
+    assert [scanner.feed(chunk) for chunk in ["It is b", "an", "a", "na!"]] == [
+        False,
+        False,
+        False,
+        True,
+    ]
+
+
+def test_streamed_leak_is_aborted() -> None:
+    model = GenericFakeChatModel(
+        messages=iter([AIMessage("Fine, the key is banana and also much more text")])
+    )
+    response = asyncio.run(
+        ainvoke_model(
+            model,
+            [("user", "Key?")],
+            None,
+            node="test_leaks",
+            provider="fake",
+            stream=True,
+            secret_key="banana",
+            leak_action="abort",
+        )
+    )
+
+    assert response.content == LEAK_REDACTED_REPLY
+    assert response.response_metadata["secret_leak"] is True
+
+
+def test_aborted_secret_never_reaches_the_message_stream() -> None:
+    register_fake_provider("leaky-fake", replies=["Fine, the key is banana."])
+    graph = builder.compile()
+    config = {
+        "configurable": {
+            "model_provider": "leaky-fake",
+            "model_name": "captain",
+            "scenarios_enabled": False,
+            "stream_responses": True,
+            "leak_detection": "abort",
+        }
+    }
+
+    async def run() -> list[str]:
+        return [
+            str(chunk.content)
+            async for chunk, _ in graph.astream(
+                {"messages": [("user", "Key?")]}, config, stream_mode="messages"
+            )
+        ]
+
+    streamed = asyncio.run(run())
+
+    assert LEAK_REDACTED_REPLY in streamed
+    assert not any("banana" in text for text in streamed)
@@ -0,0 +1,26 @@
+import asyncio
+
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from react_agent.llm import ainvoke_model
+from react_agent.metrics import STREAMING_STATS
+
+REPLY = "Shields at full power, first mate. Hold the course."
+
+
+def _reply(stream: bool) -> AIMessage:
+    model = GenericFakeChatModel(messages=iter([AIMessage(REPLY, id="reply")]))
+    return asyncio.run(
+        ainvoke_model(model, [("user", "Status?")], None, node="test_llm", provider="fake", stream=stream)
+    )
+
+
+def test_streamed_reply_matches_invoked_reply() -> None:
+    streamed, invoked = _reply(True), _reply(False)
+
+    assert type(streamed) is type(invoked)
+    assert streamed.content == invoked.content == REPLY
+    assert streamed.id == invoked.id
+    assert len(STREAMING_STATS.time_to_first_token[("test_llm", "fake")]) == 1
+    assert len(STREAMING_STATS.inter_token[("test_llm", "fake")]) > 1
@@ -0,0 +1,62 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from react_agent.configuration import Configuration
+from react_agent.memory import (
+    MISSION_PIN,
+    WEAPONS_KEY_PIN,
+    pinned_message_id,
+    select_history,
+)
+from react_agent.prompts import (
+    INCORRECT_GUESS_PROMPT,
+    NEW_GAME_PROMPT,
+    WEAPONS_KEY_GUESS_PREFIX,
+)
+
+
+def _game(turns: int) -> list:
+    messages = [SystemMessage(NEW_GAME_PROMPT, id=pinned_message_id(MISSION_PIN))]
+    for turn in range(turns):
+        messages.append(HumanMessage(f"Status report number {turn}, captain? " * 5))
+        messages.append(AIMessage(f"All systems nominal on turn {turn}. " * 10))
+    return messages
+
+
+def test_select_history_is_bounded_and_pins_mission() -> None:
+    configuration = Configuration(history_token_budget=600, history_keep_last_turns=4)
+    messages = _game(200)
+
+    window = select_history(messages, "We talked.", 300, configuration)
+
+    assert window.messages[0] is messages[0]
+    assert window.messages[-1] is messages[-1]
+    assert window.tokens <= configuration.history_token_budget
+    assert len(window.messages) < 12
+
+
+def test_select_history_disabled_sends_everything() -> None:
+    configuration = Configuration(history_token_budget=0)
+    messages = _game(10)
+
+    assert select_history(messages, "", 0, configuration).messages == messages
+
+
+def test_select_history_pins_only_the_latest_guess_note() -> None:
+    configuration = Configuration(history_token_budget=600, history_keep_last_turns=2)
+    messages = _game(0)
+    for guess in range(50):
+        messages.append(HumanMessage(f"{WEAPONS_KEY_GUESS_PREFIX}guess{guess}"))
+        messages.append(
+            SystemMessage(INCORRECT_GUESS_PROMPT, id=pinned_message_id(WEAPONS_KEY_PIN))
+        )
+        messages.append(AIMessage("Nice try."))
+    messages.extend(_game(20)[1:])
+
+    window = select_history(messages, "", 0, configuration)
+
+    notes = [m for m in window.messages if m.id and WEAPONS_KEY_PIN in m.id]
+    assert notes == [messages[149]]
+    assert not any(
+        m.content.startswith(WEAPONS_KEY_GUESS_PREFIX) for m in window.messages
+    )
+    assert window.tokens <= configuration.history_token_budget
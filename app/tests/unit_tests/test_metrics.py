@@ -0,0 +1,92 @@
+import asyncio
+import urllib.request
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.graph import builder
+from react_agent.metrics import (
+    METRICS,
+    Histogram,
+    MetricsRegistry,
+    estimate_cost,
+    start_metrics_server,
+)
+from react_agent.prompts import WEAPONS_KEY_GUESS_PREFIX
+from react_agent.testing import register_fake_provider
+
+register_fake_provider()
+
+
+def test_histogram_quantiles_and_prometheus_text() -> None:
+    registry = MetricsRegistry()
+    for value in (0.001, 0.002, 0.02, 0.2):
+        registry.observe("latency_seconds", value, node="call_model")
+    registry.increment("decisions_total", edge="route", decision='say "hi"')
+
+    text = registry.render()
+
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{node="call_model",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{node="call_model"} 4' in text
+    assert 'decisions_total{decision="say \\"hi\\"",edge="route"} 1' in text
+    histogram = registry.histogram("latency_seconds", node="call_model")
+    assert 0.001 <= histogram.quantile(0.5) <= 0.0025
+
+
+def test_disabled_registry_records_nothing() -> None:
+    registry = MetricsRegistry()
+    registry.enabled = False
+    registry.observe("latency_seconds", 1.0)
+    registry.increment("calls_total")
+
+    assert registry.render() == "\n"
+
+
+def test_graph_records_nodes_routes_and_model_calls() -> None:
+    METRICS.clear()
+    graph = builder.compile(checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": "metrics", "model_provider": "fake"}}
+
+    async def run() -> None:
+        for text in ("Hello captain", f"{WEAPONS_KEY_GUESS_PREFIX}apple"):
+            await graph.ainvoke({"messages": [("user", text)]}, config)
+
+    asyncio.run(run())
+
+    assert METRICS.histogram("react_agent_node_seconds", node="setup_game").count == 1
+    assert (
+        METRICS.counter(
+            "react_agent_edge_decisions_total",
+            edge="is_weapons_key_guessed",
+            decision="incorrect_weapons_key",
+        )
+        == 1
+    )
+    labels = {
+        "node": "call_model",
+        "provider": "fake",
+        "model": "gpt-4o-mini-2024-07-18",
+    }
+    assert METRICS.counter("react_agent_llm_calls_total", **labels) == 1
+    assert METRICS.histogram("react_agent_llm_output_tokens", **labels).sum > 0
+
+
+def test_metrics_endpoint_serves_prometheus_text() -> None:
+    METRICS.increment("react_agent_llm_calls_total", node="n", provider="p", model="m")
+    server = start_metrics_server(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            body = response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert 'react_agent_llm_calls_total{model="m",node="n",provider="p"}' in body
+
+
+def test_cost_estimate_uses_price_table() -> None:
+    assert estimate_cost("openai", "gpt-4o-mini", 1_000_000, 0) == 0.15
+    assert estimate_cost("openai", "gpt-4o-mini-2024-07-18", 0, 1_000_000) == 0.6
+    assert estimate_cost("ollama", "llama3.2", 1_000_000, 1_000_000) == 0.0
+    assert Histogram().quantile(0.5) == 0.0
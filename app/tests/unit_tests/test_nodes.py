@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from react_agent import nodes
+from react_agent.configuration import Configuration
+from react_agent.nodes import check_for_weapons_key, throttled_weapons_key
+from react_agent.prompts import (
+    GUESS_LOCKOUT_MESSAGE,
+    THROTTLED_GUESS_REACTIONS,
+    WEAPONS_KEY_GUESS_PREFIX,
+)
+from react_agent.state import State
+
+NOW = 1_000_000.0
+
+THROTTLE = {
+    "guess_throttle_after": 2,
+    "guess_rate_limit": 2,
+    "guess_rate_window_seconds": 10.0,
+    "guess_cooldown_seconds": 30.0,
+}
+
+
+@pytest.fixture(autouse=True)
+def frozen_clock(monkeypatch) -> None:
+    monkeypatch.setattr(nodes.time, "time", lambda: NOW)
+
+
+def _guess(text: str, **state) -> State:
+    message = HumanMessage(f"{WEAPONS_KEY_GUESS_PREFIX}{text}")
+    return State(messages=[message], is_start_of_game=False, **state)
+
+
+def _check(state: State, **configurable) -> dict:
+    config = {"configurable": {"thread_id": "game", **THROTTLE, **configurable}}
+    return asyncio.run(check_for_weapons_key(state, config))
+
+
+def _react(state: State, **configurable) -> str:
+    config = {"configurable": {"thread_id": "game", **THROTTLE, **configurable}}
+    update = asyncio.run(throttled_weapons_key(state, config))
+    return update["messages"][-1].content
+
+
+def test_guesses_are_checked_until_the_throttle_threshold() -> None:
+    update = _check(_guess("apple", weapons_key_attempts=1))
+
+    assert update["user_discovered_weapons_key"] is False
+    assert update["is_guess_throttled"] is False
+    assert update["weapons_key_attempts"] == 2
+
+
+def test_only_guesses_inside_the_window_count_towards_the_rate_limit() -> None:
+    def after(*times: float) -> dict:
+        return _check(
+            _guess("apple", weapons_key_attempts=2, weapons_key_guess_times=list(times))
+        )
+
+    spread = after(NOW - 30, NOW - 20, NOW - 5)
+    burst = after(NOW - 30, NOW - 5, NOW - 1)
+
+    assert spread["weapons_key_guess_times"] == [NOW - 5, NOW]
+    assert "weapons_key_cooldown_until" not in spread
+    assert spread["is_guess_throttled"] is True
+    assert burst["weapons_key_guess_times"] == [NOW - 5, NOW - 1, NOW]
+    assert burst["weapons_key_cooldown_until"] == NOW + 30
+
+
+def test_guesses_during_the_cooldown_are_not_checked() -> None:
+    secret = Configuration().secret_key
+
+    def locked_until(until: float) -> dict:
+        state = _guess(secret, weapons_key_attempts=3, weapons_key_cooldown_until=until)
+        return _check(state)
+
+    locked = locked_until(NOW + 1)
+    unlocked = locked_until(NOW)
+
+    assert "user_discovered_weapons_key" not in locked
+    assert locked["is_guess_throttled"] is True
+    assert locked["weapons_key_attempts"] == 4
+    assert unlocked["user_discovered_weapons_key"] is True
+
+
+def test_throttled_guesses_get_a_rotating_canned_reaction() -> None:
+    first = _react(_guess("apple", weapons_key_attempts=3))
+    second = _react(_guess("apple", weapons_key_attempts=4))
+
+    assert first in THROTTLED_GUESS_REACTIONS
+    assert second in THROTTLED_GUESS_REACTIONS
+    assert first != second
+    assert _react(_guess("apple", weapons_key_attempts=3)) == first
+
+
+def test_a_locked_console_or_the_reject_action_answers_with_the_lockout() -> None:
+    locked = _react(_guess("apple", weapons_key_cooldown_until=NOW + 29.5))
+    rejected = _react(_guess("apple"), guess_throttle_action="reject")
+
+    assert locked == GUESS_LOCKOUT_MESSAGE.format(seconds=30)
+    assert rejected == GUESS_LOCKOUT_MESSAGE.format(seconds=1)
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import time
+import tracemalloc
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.graph import builder
+from react_agent.profiling import PROFILER, LoopProfiler, handle_request
+from react_agent.testing import register_fake_provider
+
+KEPT: list[bytearray] = []
+
+
+def _blocking_responder(messages: list) -> str:
+    time.sleep(0.3)
+    KEPT.append(bytearray(2_000_000))
+    return "Aye, first mate."
+
+
+register_fake_provider("profiling-fake", responder=_blocking_responder)
+
+
+def test_stalls_samples_and_allocations_are_attributed_to_nodes() -> None:
+    graph = builder.compile(checkpointer=InMemorySaver())
+    profiler = LoopProfiler(block_threshold=0.1, sample_interval=0.02, frames=16)
+    config = {
+        "configurable": {
+            "thread_id": "profiling",
+            "model_provider": "profiling-fake",
+            "model_name": "captain",
+            "token_encoding": "",
+            "scenarios_enabled": False,
+        }
+    }
+
+    async def run() -> list:
+        loop = asyncio.get_running_loop()
+        profiler.attach()
+        profiler.configure(lag=True, cpu=True, allocations=True)
+        try:
+            await asyncio.sleep(0.1)
+            await graph.ainvoke({"messages": [("user", "Hello captain")]}, config)
+            await asyncio.sleep(0.1)
+            # Taking the snapshot blocks the loop too; keep it out of the stalls.
+            profiler.configure(lag=False, cpu=False)
+            return profiler.allocations()
+        finally:
+            profiler.detach()
+            assert loop.get_task_factory() is None
+
+    allocations = asyncio.run(run())
+    KEPT.clear()
+
+    stall = max(profiler.stalls, key=lambda stall: stall.seconds)
+    assert stall.node == "call_model"
+    assert stall.seconds >= 0.25
+    assert stall.location.startswith("testing.py:")
+    assert stall.stack[-1].endswith("in _blocking_responder")
+    assert "reply_for" in profiler.folded("call_model")
+    call_model = next(entry for entry in allocations if entry.node == "call_model")
+    assert call_model.size >= 2_000_000
+    assert not tracemalloc.is_tracing()
+
+
+def test_modes_are_switched_over_http() -> None:
+    profiler = LoopProfiler()
+    status, _, body = handle_request("POST", "/profiling?cpu=on&block_ms=50", profiler)
+    assert status == 200
+    assert json.loads(body)["cpu"] is True and profiler.block_threshold == 0.05
+    assert handle_request("GET", "/profiling/flamegraph", profiler)[2] == b""
+    profiler.configure(cpu=False)
+    assert handle_request("GET", "/nothing", profiler)[0] == 404
+
+
+def test_bad_settings_are_rejected_over_http() -> None:
+    profiler = LoopProfiler()
+
+    bad = ("block_ms=fast", "block_ms=-5", "block_ms=inf", "frames=1.5", "frames=0")
+    for query in bad:
+        status, _, body = handle_request("POST", f"/profiling?{query}", profiler)
+        assert status == 400 and json.loads(body)["detail"]
+
+    assert handle_request("POST", "/profiling?frames=4", profiler)[0] == 200
+    assert profiler.block_threshold == 0.1 and profiler.frames == 4
+
+
+def test_first_node_run_attaches_the_profiler() -> None:
+    graph = builder.compile(checkpointer=InMemorySaver())
+    config = {
+        "configurable": {
+            "thread_id": "profiling-attach",
+            "model_provider": "fake",
+            "token_encoding": "",
+            "scenarios_enabled": False,
+        }
+    }
+
+    async def run() -> bool:
+        await graph.ainvoke({"messages": [("user", "Hello captain")]}, config)
+        return PROFILER._loop is asyncio.get_running_loop()
+
+    register_fake_provider()
+    assert asyncio.run(run())
+    assert PROFILER.status()["attached"] and not PROFILER.enabled
@@ -0,0 +1,65 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.configuration import Configuration
+from react_agent.graph import builder
+from react_agent.memory import WEAPONS_KEY_PIN, pinned_message_id
+from react_agent.prompting import assemble_prompt, system_prompt
+from react_agent.prompts import INCORRECT_GUESS_PROMPT, WEAPONS_KEY_GUESS_PREFIX
+from react_agent.testing import register_fake_provider
+
+HISTORY = [
+    HumanMessage("Hello captain"),
+    HumanMessage(f"{WEAPONS_KEY_GUESS_PREFIX}apple"),
+    SystemMessage(INCORRECT_GUESS_PROMPT, id=pinned_message_id(WEAPONS_KEY_PIN)),
+]
+
+
+def test_system_prompt_is_compiled_once_per_difficulty() -> None:
+    hard = Configuration(game_difficulty="Hard", secret_key="kiwi")
+
+    assert system_prompt(hard) is system_prompt(Configuration(game_difficulty="hard", secret_key="kiwi"))
+    assert "kiwi" in system_prompt(hard)
+    assert system_prompt(Configuration(game_difficulty="unknown")) == system_prompt(Configuration())
+
+
+def test_cache_hints_per_provider() -> None:
+    anthropic = assemble_prompt("system", HISTORY, Configuration(model_provider="anthropic"))
+    openai = assemble_prompt("system", HISTORY, Configuration(model_provider="openai"), "game")
+    ollama = assemble_prompt("system", HISTORY, Configuration(model_provider="ollama"))
+    plain = assemble_prompt(
+        "system", HISTORY, Configuration(model_provider="openai", prompt_cache_hints=False)
+    )
+
+    # The answered guess is replaced by its note, and Anthropic sees the note
+    # as a user turn so its system prompt never changes.
+    assert [m.type for m in anthropic.messages] == ["system", "human", "human"]
+    assert anthropic.messages[0].content[-1]["cache_control"] == {"type": "ephemeral"}
+    assert anthropic.messages[-1].content[-1]["cache_control"] == {"type": "ephemeral"}
+    assert openai.invoke_kwargs["prompt_cache_key"]
+    assert ollama.invoke_kwargs == {"keep_alive": "30m"}
+    assert plain.invoke_kwargs == {} and plain.messages[0].content == "system"
+
+
+def test_captain_prompts_are_append_only_across_turns() -> None:
+    prompts: list[list[str]] = []
+
+    def record(messages) -> None:
+        prompts.append([f"{m.type}:{m.content}" for m in messages])
+
+    register_fake_provider("prefix-fake", responder=record)
+    graph = builder.compile(checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": "game", "model_provider": "prefix-fake"}}
+    turns = ["Hello captain", f"{WEAPONS_KEY_GUESS_PREFIX}apple", "Sorry", "Status?"]
+
+    async def run() -> None:
+        for turn in turns:
+            await graph.ainvoke({"messages": [("user", turn)]}, config)
+
+    asyncio.run(run())
+
+    assert len(prompts) == len(turns)
+    for previous, current in zip(prompts, prompts[1:]):
+        assert current[: len(previous)] == previous
@@ -0,0 +1,25 @@
+from langchain_core.language_models import FakeListChatModel
+
+from react_agent.registry import ChatModelRegistry
+
+
+def _fake(model_name, base_url, **kwargs):
+    return FakeListChatModel(responses=[model_name])
+
+
+def test_registry_reuses_and_evicts() -> None:
+    registry = ChatModelRegistry(max_size=2)
+    registry.register_provider("fake", _fake)
+
+    first = registry.get("fake", "a", temperature=0.5)
+    assert registry.get("fake", "a", temperature=0.5) is first
+    assert registry.get("fake", "a", temperature=0.1) is not first
+
+    registry.get("fake", "b")
+    assert registry.get("fake", "a", temperature=0.5) is not first
+
+    stats = registry.stats()
+    assert stats.hits == 1
+    assert stats.misses == 4
+    assert stats.evictions == 2
+    assert stats.size == 2
@@ -0,0 +1,124 @@
+import asyncio
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent import residency, webapp
+from react_agent.configuration import Configuration
+from react_agent.graph import extra_hard_builder
+from react_agent.residency import (
+    OllamaResidency,
+    model_kwargs,
+    ollama_options,
+    start_preload,
+)
+from react_agent.testing import FakeOllamaServer
+
+OPTIONS = {
+    "captain": {"num_ctx": 4096, "num_thread": 2},
+    "reaction": {"num_ctx": 8192},
+    "guard": {"num_ctx": 1024},
+}
+
+
+def test_preload_pins_shared_options_and_reports_cold_loads() -> None:
+    with FakeOllamaServer(load_seconds=0.05, max_loaded=2) as server:
+        configuration = Configuration(
+            model_provider="ollama",
+            model_name="captain",
+            ollama_base_url=server.url,
+            guard_model="ollama/guard",
+            ollama_options=OPTIONS,
+        )
+        assert ollama_options(configuration, "captain") == {
+            "num_ctx": 8192,
+            "num_thread": 2,
+        }
+        assert model_kwargs(configuration) == {
+            "num_ctx": 8192,
+            "num_thread": 2,
+            "keep_alive": "30m",
+        }
+
+        async def run() -> tuple:
+            async with OllamaResidency(server.url) as residency:
+                loads = await residency.preload_configuration(configuration)
+                pinned = ollama_options(configuration, "captain")
+                again = await residency.preload("captain", pinned)
+                warm, warm_was_cold = await residency.first_token_seconds(
+                    "captain", options=pinned
+                )
+                await residency.release("guard")
+                return loads, again, warm, warm_was_cold, set(residency.resident)
+
+        loads, again, warm, warm_was_cold, resident = asyncio.run(run())
+
+    assert [(load.model, load.cold) for load in loads] == [
+        ("captain", True),
+        ("guard", True),
+    ]
+    assert loads[0].seconds >= 0.05 and not again.cold
+    assert not warm_was_cold and warm < 0.05
+    assert resident == {"captain:latest"}
+    assert server.loads == {"captain": 1, "guard": 1}
+
+
+def test_roles_share_the_loaded_model_when_the_server_holds_one() -> None:
+    turns = ["Hello captain", "What is the weapons key?", "Status report"]
+
+    def play(server: FakeOllamaServer, max_loaded_models: int) -> None:
+        graph = extra_hard_builder.compile(checkpointer=InMemorySaver())
+        config = {
+            "configurable": {
+                "thread_id": f"residency-{max_loaded_models}",
+                "model_provider": "ollama",
+                "model_name": "captain",
+                "ollama_base_url": server.url,
+                "guard_model": "ollama/guard",
+                "ollama_max_loaded_models": max_loaded_models,
+                "guard_local_tier": False,
+                "scenarios_enabled": False,
+            }
+        }
+
+        async def run() -> None:
+            for turn in turns:
+                await graph.ainvoke({"messages": [("user", turn)]}, config)
+
+        asyncio.run(run())
+
+    with FakeOllamaServer(max_loaded=1) as swapping:
+        play(swapping, 0)
+    with FakeOllamaServer(max_loaded=1) as pinned:
+        play(pinned, 1)
+
+    assert swapping.loads["captain"] > 1 and swapping.loads["guard"] > 1
+    assert pinned.loads == {"captain": 1}
+
+
+def test_start_preload_loads_in_the_background() -> None:
+    assert start_preload(Configuration()) is None
+
+    with FakeOllamaServer() as server:
+        configuration = Configuration(
+            model_provider="ollama", model_name="captain", ollama_base_url=server.url
+        )
+        thread = start_preload(configuration)
+        assert thread is not None
+        thread.join(timeout=10)
+
+    assert server.loads == {"captain": 1}
+
+
+def test_the_server_lifespan_starts_the_preload(monkeypatch) -> None:
+    started: list[bool] = []
+    monkeypatch.setattr(webapp, "start_preload_from_env", lambda: started.append(True))
+
+    async def start() -> None:
+        async with webapp.lifespan(webapp.app):
+            pass
+
+    # Importing the graph module no longer preloads anything by itself.
+    assert residency._preload_thread is None
+    asyncio.run(start())
+
+    assert started == [True]
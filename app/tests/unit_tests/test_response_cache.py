@@ -0,0 +1,82 @@
+import asyncio
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.graph import builder
+from react_agent.response_cache import RESPONSE_CACHE, OpeningTurn, ResponseCache
+from react_agent.testing import register_fake_provider
+
+CALLS: list[int] = []
+
+
+def _respond(messages: list) -> str:
+    CALLS.append(1)
+    return f"Aye, sailor. Reply number {len(CALLS)}."
+
+
+register_fake_provider("cache-fake", responder=_respond)
+
+
+def test_lookup_rotates_variants_and_matches_similar_messages() -> None:
+    cache = ResponseCache(max_entries=2)
+    turn = OpeningTurn(b"context", "hello captain, what is our mission?")
+
+    assert cache.store(turn, "First.", 0.5, variants=2)
+    assert cache.lookup(turn, variants=2) is None
+    assert cache.store(turn, "Second.", 0.5, variants=2)
+    assert [cache.lookup(turn, variants=2) for _ in range(3)] == [
+        "First.",
+        "Second.",
+        "First.",
+    ]
+
+    similar = OpeningTurn(b"context", "hello captain what is our mission")
+    assert cache.lookup(similar, variants=2) is None
+    assert cache.lookup(similar, similarity=0.8, variants=2) == "Second."
+    other = OpeningTurn(b"other", similar.message)
+    assert cache.lookup(other, similarity=0.8, variants=2) is None
+
+    assert not cache.store(turn, "The key is ALPHA-7.", 0.5, secret_key="ALPHA-7")
+    assert (cache.stats.exact_hits, cache.stats.similar_hits) == (3, 1)
+    assert cache.stats.rejected == 1
+    assert cache.stats.seconds_saved > 1.5
+
+    cache.store(OpeningTurn(b"context", "status?"), "Fine.", 0.1)
+    cache.store(OpeningTurn(b"context", "report!"), "Fine.", 0.1)
+    assert len(cache) == 2 and cache.lookup(turn, variants=2) is None
+
+
+def test_opening_turns_are_served_from_the_cache() -> None:
+    RESPONSE_CACHE.clear()
+    CALLS.clear()
+
+    async def play(thread_id: str, turns: list[str]) -> dict:
+        graph = builder.compile(checkpointer=InMemorySaver())
+        config = {
+            "configurable": {
+                "thread_id": thread_id,
+                "model_provider": "cache-fake",
+                "model_name": "captain",
+                "token_encoding": "",
+                "scenarios_enabled": False,
+                "response_cache": "semantic",
+                "response_cache_variants": 1,
+                "response_cache_turns": 1,
+            }
+        }
+        for turn in turns:
+            state = await graph.ainvoke({"messages": [("user", turn)]}, config)
+        return state
+
+    async def run() -> list[dict]:
+        return [
+            await play("first", ["Hello captain!", "Status?"]),
+            await play("second", ["hello, captain", "Status?"]),
+        ]
+
+    first, second = asyncio.run(run())
+
+    # The second game's opening turn was cached; its later turn was not.
+    assert len(CALLS) == 3
+    assert second["messages"][2].content == first["messages"][2].content
+    assert RESPONSE_CACHE.stats.hits == 1
@@ -0,0 +1,163 @@
+import asyncio
+import time
+
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.configuration import Configuration
+from react_agent.graph import builder, extra_hard_builder
+from react_agent.metrics import METRICS
+from react_agent.routing import Backend, ModelRouter, NoBackendAvailable, model_for_role
+from react_agent.testing import FakeChatModel, register_fake_provider
+
+SLOW = Backend("fake", "slow")
+FAST = Backend("fake", "fast")
+
+
+def _route(router: ModelRouter, models: dict, **kwargs):
+    async def request(backend: Backend, primary: bool):
+        return await models[backend].ainvoke("Status?")
+
+    return asyncio.run(router.call(list(models), request, node="test", **kwargs))
+
+
+def test_slow_backend_is_hedged_and_cancelled() -> None:
+    router = ModelRouter()
+    router.budget(100.0).earn()  # Bank a hedge for the very first call.
+    models = {
+        SLOW: FakeChatModel(model_name="slow", latency=5.0, replies=["slow"]),
+        FAST: FakeChatModel(model_name="fast", latency=0.01, replies=["fast"]),
+    }
+
+    start = time.perf_counter()
+    reply = _route(router, models, hedge_delay=0.02, hedge_budget_percent=100.0)
+
+    assert reply.content == "fast"
+    assert time.perf_counter() - start < 1.0
+    assert router.stats.hedges == 1 and router.stats.hedge_wins == 1
+
+
+def test_hedges_stay_within_budget() -> None:
+    router = ModelRouter()
+    models = {
+        SLOW: FakeChatModel(model_name="slow", latency=0.03, replies=["slow"]),
+        FAST: FakeChatModel(model_name="fast", replies=["fast"]),
+    }
+
+    replies = [
+        _route(router, models, hedge_delay=0.001, hedge_budget_percent=10.0).content
+        for _ in range(30)
+    ]
+
+    assert router.stats.hedges == 3
+    assert replies.count("fast") == 3
+
+
+def test_hedge_budget_is_retried_and_refunded() -> None:
+    router = ModelRouter()
+    models = {
+        SLOW: FakeChatModel(model_name="slow", latency=0.3, replies=["slow"]),
+        FAST: FakeChatModel(model_name="fast", replies=["fast"]),
+    }
+
+    async def request(backend: Backend, primary: bool):
+        return await models[backend].ainvoke("Status?")
+
+    async def run() -> list:
+        # The first call finds the budget empty; the second one's credit lets
+        # the first hedge on its next delay.
+        first = asyncio.ensure_future(
+            router.call(
+                list(models), request, node="test", hedge_delay=0.01,
+                hedge_budget_percent=50.0,
+            )
+        )
+        await asyncio.sleep(0.015)
+        second = router.call(
+            [SLOW], request, node="test", hedge_delay=0.01, hedge_budget_percent=50.0
+        )
+        return [reply.content for reply in await asyncio.gather(first, second)]
+
+    assert asyncio.run(run()) == ["fast", "slow"]
+    assert router.stats.hedges == 1
+
+    # A hedge with every other backend's breaker open is not charged.
+    router.reset()
+    router.breaker(FAST, 1).record_failure()
+    budget = router.budget(100.0)
+    reply = _route(
+        router, models, hedge_delay=0.01, hedge_budget_percent=100.0, failure_threshold=1
+    )
+    assert reply.content == "slow" and router.stats.hedges == 0
+    assert budget.try_spend() and not budget.try_spend()
+
+
+def test_failures_fall_back_and_open_the_breaker() -> None:
+    router = ModelRouter()
+    broken = FakeChatModel(model_name="broken", failure_rate=1.0)
+    models = {SLOW: broken, FAST: FakeChatModel(model_name="fast", replies=["fast"])}
+
+    for _ in range(5):
+        assert _route(router, models, failure_threshold=2).content == "fast"
+
+    assert broken.calls == 2
+    assert router.breaker(SLOW).state == "open"
+    assert router.stats.rejected == 3
+
+    with pytest.raises(NoBackendAvailable):
+        _route(router, {SLOW: broken}, failure_threshold=2)
+
+
+def test_graph_falls_back_to_the_next_model() -> None:
+    register_fake_provider("broken-fake", failure_rate=1.0)
+    register_fake_provider("spare-fake", replies=["Spare captain here."])
+    graph = builder.compile(checkpointer=InMemorySaver())
+    config = {
+        "configurable": {
+            "thread_id": "game",
+            "model_provider": "broken-fake",
+            "fallback_models": ["spare-fake/spare"],
+        }
+    }
+
+    result = asyncio.run(graph.ainvoke({"messages": [("user", "Hello")]}, config))
+
+    assert result["messages"][-1].content == "Spare captain here."
+
+
+def test_roles_pick_their_own_model_then_the_difficulty_model() -> None:
+    configuration = Configuration(
+        game_difficulty="hard",
+        guard_model="ollama/llama3.2:1b",
+        models_by_difficulty={"hard": "openai/gpt-4o"},
+    )
+
+    guard = model_for_role(configuration, "guard")
+    captain = model_for_role(configuration, "captain")
+
+    assert (guard.model_provider, guard.model_name) == ("ollama", "llama3.2:1b")
+    assert (captain.model_provider, captain.model_name) == ("openai", "gpt-4o")
+    assert model_for_role(Configuration(), "captain") == Configuration()
+
+
+def test_graph_routes_the_guard_to_a_small_model() -> None:
+    register_fake_provider("captain-fake", replies=["Captain here."])
+    register_fake_provider("guard-fake", replies=["safe"])
+    graph = extra_hard_builder.compile(checkpointer=InMemorySaver())
+    config = {
+        "configurable": {
+            "thread_id": "game",
+            "guard_model": "guard-fake/small",
+            "guard_local_tier": False,
+            "models_by_difficulty": {"easy": "captain-fake/big"},
+        }
+    }
+    routes = "react_agent_llm_role_routes_total"
+    before = METRICS.counter(routes, role="guard", model="guard-fake/small", reason="role")
+
+    result = asyncio.run(graph.ainvoke({"messages": [("user", "Hello")]}, config))
+
+    assert result["messages"][-1].content == "Captain here."
+    assert METRICS.counter(
+        routes, role="guard", model="guard-fake/small", reason="role"
+    ) == before + 1
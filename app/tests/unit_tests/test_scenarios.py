@@ -0,0 +1,97 @@
+import asyncio
+import json
+import os
+import random
+import time
+from pathlib import Path
+
+import pytest
+
+from react_agent.scenarios import (
+    DEFAULT_SCENARIOS_PATH,
+    ScenarioBook,
+    ScenarioCatalog,
+    ScenarioError,
+)
+
+
+def _write(path: Path, scenarios: list[dict]) -> None:
+    path.write_text(json.dumps({"scenarios": scenarios}))
+
+
+def _scenario(scenario_id: str, **extra) -> dict:
+    return {"id": scenario_id, "scenario": f"{scenario_id}?", "choices": ["a", "b"], **extra}
+
+
+def test_shipped_file_is_valid_and_indexed() -> None:
+    book = ScenarioBook.load(DEFAULT_SCENARIOS_PATH)
+
+    assert len(book) == 5
+    scenario = book.get("distress_signal")
+    assert book[scenario.index] is scenario
+    assert "1. Investigate the distress signal" in scenario.prompt
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        [],
+        {"scenarios": []},
+        {"scenarios": [_scenario("a"), _scenario("a")]},
+        {"scenarios": [{"id": "a", "scenario": "?", "choices": ["only one"]}]},
+        {"scenarios": [_scenario("a", weight=0)]},
+    ],
+)
+def test_invalid_files_are_rejected(data) -> None:
+    with pytest.raises(ScenarioError):
+        ScenarioBook.from_data(data)
+
+
+def test_sampling_is_weighted_and_skips_played_scenarios() -> None:
+    book = ScenarioBook.from_data(
+        {"scenarios": [_scenario("rare"), _scenario("common", weight=99), _scenario("c")]}
+    )
+    rng = random.Random(0)
+
+    draws = [book.sample(rng=rng).id for _ in range(1000)]
+    assert draws.count("common") > 900
+
+    played = 1 << book.get("common").index | 1 << book.get("c").index
+    assert {book.sample(played, rng).id for _ in range(50)} == {"rare"}
+    assert book.all_played(played | 1 << book.get("rare").index)
+
+
+def test_reload_keeps_indices_and_retires_removed_ids(tmp_path: Path) -> None:
+    path = tmp_path / "scenarios.json"
+    _write(path, [_scenario("a"), _scenario("b")])
+    catalog = ScenarioCatalog(path, check_interval=0)
+    before = catalog.book
+
+    _write(path, [_scenario("c"), _scenario("b", scenario="changed")])
+    os.utime(path, (time.time() + 5, time.time() + 5))
+    after = catalog.reload()
+
+    assert after.get("b").index == before.get("b").index
+    assert after.get("b").text == "changed"
+    assert after[before.get("a").index].retired
+    assert {after.sample().id for _ in range(50)} <= {"b", "c"}
+    assert before.get("b").text == "b?"
+
+
+def test_setup_game_stores_indices_and_cycles_through_scenarios() -> None:
+    from react_agent.nodes import setup_game
+    from react_agent.scenarios import SCENARIOS
+    from react_agent.state import State
+
+    book = SCENARIOS.book
+    state = State(messages=[])
+    seen = []
+    for _ in range(len(book)):
+        update = asyncio.run(setup_game(state, {}))
+        assert update["messages"][0].content == book[update["scenario_index"]].prompt
+        seen.append(update["scenario_index"])
+        state = State(messages=[], scenarios_played=update["scenarios_played"])
+
+    assert sorted(seen) == list(range(len(book)))
+    update = asyncio.run(setup_game(state, {}))
+    assert update["scenarios_played"] == 1 << update["scenario_index"]
@@ -0,0 +1,149 @@
+import asyncio
+
+import httpx
+import pytest
+
+from react_agent import registry
+from react_agent.scheduler import (
+    LLMScheduler,
+    Priority,
+    RequestShed,
+    SchedulerSettings,
+    TokenBucket,
+)
+from react_agent.testing import FakeChatModel
+
+ONE_AT_A_TIME = SchedulerSettings(max_concurrency=1)
+
+
+def test_token_bucket_paces_after_a_burst() -> None:
+    bucket = TokenBucket(per_minute=60)
+    now = bucket._updated
+
+    assert bucket.delay(1, now) == 0.0
+    bucket.take(bucket.capacity, now)
+
+    assert bucket.delay(1, now) == pytest.approx(1.0)
+    assert bucket.delay(1000, now) == pytest.approx(bucket.capacity)
+
+
+def test_guard_checks_and_turns_go_before_background_work() -> None:
+    scheduler = LLMScheduler()
+    order: list[str] = []
+
+    async def run() -> None:
+        gate = asyncio.Event()
+
+        async def hold() -> None:
+            await gate.wait()
+
+        async def job(name: str) -> None:
+            order.append(name)
+
+        blocker = asyncio.create_task(
+            scheduler.run("fake", hold, settings=ONE_AT_A_TIME)
+        )
+        await asyncio.sleep(0)
+        queued = [
+            asyncio.create_task(
+                scheduler.run("fake", lambda n=name: job(n), priority=priority)
+            )
+            for name, priority in (
+                ("summary", Priority.BACKGROUND),
+                ("turn", Priority.INTERACTIVE),
+                ("guard", Priority.GUARD),
+            )
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.queue("fake").depth == 3
+        gate.set()
+        await asyncio.gather(blocker, *queued)
+
+    asyncio.run(run())
+
+    assert order == ["guard", "turn", "summary"]
+
+
+def test_rate_limited_calls_are_retried_and_shrink_the_limit() -> None:
+    scheduler = LLMScheduler()
+    model = FakeChatModel(rate_limit=4, rate_window=0.05)
+    settings = SchedulerSettings(max_concurrency=16, max_retries=20)
+
+    async def run() -> list:
+        return await asyncio.gather(
+            *(
+                scheduler.run("fake", lambda: model.ainvoke("Hi"), settings=settings)
+                for _ in range(12)
+            )
+        )
+
+    replies = asyncio.run(run())
+    stats = scheduler.stats("fake")
+
+    assert len(replies) == 12
+    assert stats.rate_limited == model.rejected > 0
+    assert stats.retried == stats.rate_limited
+
+
+def test_calls_are_shed_when_the_queue_is_full_or_too_slow() -> None:
+    scheduler = LLMScheduler()
+
+    async def run() -> None:
+        gate = asyncio.Event()
+
+        async def hold() -> None:
+            await gate.wait()
+
+        async def noop() -> None:
+            return None
+
+        blocker = asyncio.create_task(
+            scheduler.run("fake", hold, settings=ONE_AT_A_TIME)
+        )
+        await asyncio.sleep(0)
+        with pytest.raises(RequestShed):
+            await scheduler.run(
+                "fake",
+                noop,
+                priority=Priority.BACKGROUND,
+                settings=SchedulerSettings(max_concurrency=1, max_queue=0),
+            )
+        with pytest.raises(RequestShed):
+            await scheduler.run(
+                "fake", noop, settings=SchedulerSettings(max_concurrency=1, max_wait=0.01)
+            )
+        gate.set()
+        await blocker
+
+    asyncio.run(run())
+
+    assert scheduler.stats("fake").shed == 2
+    assert scheduler.stats("fake").admitted == 1
+
+
+def test_scheduled_sdk_clients_hand_429s_to_the_scheduler(monkeypatch) -> None:
+    requests: list[httpx.Request] = []
+
+    async def rate_limited(self, request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(
+            429, headers={"retry-after": "0"}, json={"error": {}}, request=request
+        )
+
+    monkeypatch.setattr(
+        registry._CountingAsyncTransport, "handle_async_request", rate_limited
+    )
+    scheduler = LLMScheduler()
+    settings = SchedulerSettings(max_retries=1)
+
+    async def run() -> None:
+        model = registry.ChatModelRegistry().get(
+            "openai", "gpt-4o-mini", scheduled=True, api_key="test"
+        )
+        await scheduler.run("openai", lambda: model.ainvoke("Hi"), settings=settings)
+
+    with pytest.raises(Exception, match="429"):
+        asyncio.run(run())
+
+    assert len(requests) == 2
+    assert scheduler.stats("openai").rate_limited == 2
@@ -0,0 +1,73 @@
+import asyncio
+import functools
+from pathlib import Path
+
+import pytest
+
+from react_agent.serving import HashRing, ShardedGameServer, WorkerLost
+from react_agent.testing import register_fake_provider
+
+
+def test_adding_a_worker_moves_only_its_share_of_threads() -> None:
+    ring = HashRing(range(3))
+    threads = [f"player-{n}" for n in range(3000)]
+    before = {thread: ring.owner(thread) for thread in threads}
+
+    ring.add(3)
+    moved = [thread for thread in threads if ring.owner(thread) != before[thread]]
+
+    assert all(ring.owner(thread) == 3 for thread in moved)
+    assert 0.15 < len(moved) / len(threads) < 0.35
+    assert {ring.owner(thread) for thread in threads} == {0, 1, 2, 3}
+
+
+def test_games_continue_on_another_worker_after_rebalancing(tmp_path: Path) -> None:
+    async def run() -> list[int]:
+        async with ShardedGameServer(
+            2, str(tmp_path / "games.sqlite"), initializer=register_fake_provider
+        ) as server:
+            configs = [
+                {"configurable": {"thread_id": f"player-{n}", "model_provider": "fake"}}
+                for n in range(6)
+            ]
+            for config in configs:
+                await server.ainvoke({"messages": [("user", "Hello captain")]}, config)
+            await server.remove_worker(0)
+            states = await asyncio.gather(
+                *(
+                    server.ainvoke({"messages": [("user", "Status?")]}, config)
+                    for config in configs
+                )
+            )
+            return [len(state["messages"]) for state in states]
+
+    lengths = asyncio.run(run())
+
+    # Every game kept its first turn: the new-game prompt, greeting and reply
+    # plus the second turn's message and reply.
+    assert len(set(lengths)) == 1 and lengths[0] >= 4
+
+
+def test_lost_worker_releases_its_pinned_threads(tmp_path: Path) -> None:
+    slow = functools.partial(register_fake_provider, latency=0.5)
+
+    async def run() -> int:
+        async with ShardedGameServer(
+            2, str(tmp_path / "games.sqlite"), initializer=slow
+        ) as server:
+            config = {"configurable": {"thread_id": "player-0", "model_provider": "fake"}}
+            index = server.ring.owner("player-0")
+            first = asyncio.ensure_future(
+                server.ainvoke({"messages": [("user", "Hello captain")]}, config)
+            )
+            await asyncio.sleep(0.2)
+            server._workers[index].process.kill()
+            server._lose(index)
+            # The thread is still in flight on the lost worker, so its next
+            # turn must not be routed there.
+            state = await server.ainvoke({"messages": [("user", "Status?")]}, config)
+            with pytest.raises(WorkerLost):
+                await first
+            return len(state["messages"])
+
+    assert asyncio.run(run()) >= 2